@@ -1,45 +1,117 @@
-import json
+import argparse
 import sys
 from pathlib import Path
 sys.path.append('src')
 
+from ingestion.chunk_io import iter_chunks, find_chunks_file, is_chunk_store, open_chunk_store, DEFAULT_CHUNKS_PATH
+from retrieval.chunk_store import ChunkStore
 from retrieval.hybrid import HybridSearch
+from retrieval.sharded import build_shards
+from retrieval.vector_search import INDEX_TYPES, SCALAR_QUANTIZERS
+from evaluation.test_set import TestSetGenerator
 
-print("\n" + "="*60)
-print("🚀 BUILDING SEARCH INDICES")
-print("="*60)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build hybrid search indices")
+    parser.add_argument('--chunks', default=str(DEFAULT_CHUNKS_PATH),
+                        help="ingestion output: columnar chunk store, .jsonl, or a legacy chunks.json array")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat',
+                        help="FAISS index type (flat = exact, hnsw/ivf_* = approximate)")
+    parser.add_argument('--rescore-factor', type=int, default=4,
+                        help="sq8/sq_fp16: candidates per result re-scored against full-precision vectors")
+    parser.add_argument('--compress-chunks', action='store_true',
+                        help="zlib-compress chunk text in the chunk store")
+    parser.add_argument('--embedding-cache', default='data/embeddings/embedding_cache',
+                        help="directory of cached chunk embeddings reused across builds ('' to disable)")
+    parser.add_argument('--embed-workers', type=int, default=0,
+                        help="embedding worker processes (0 = one per CPU, 1 = in-process)")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="build N document-partitioned shards in data/embeddings/sharded_index instead")
+    return parser.parse_args()
 
-print("\n📂 Loading chunks from disk...")
-with open('data/processed/chunks.json') as f:
-    chunks = json.load(f)
-print(f"✅ Loaded {len(chunks)} chunks")
 
-print(f"\n⏰ Starting index build...")
-print("   This takes ~10-15 minutes on CPU")
-print("   Perfect time for a coffee break! ☕")
-print()
+def main():
+    args = parse_args()
 
-hybrid = HybridSearch(vector_weight=0.7, keyword_weight=0.3)
-hybrid.build_index(chunks)
+    print("\n" + "="*60)
+    print("🚀 BUILDING SEARCH INDICES")
+    print("="*60)
 
-print("\n💾 Saving indices to disk...")
-hybrid.save('data/embeddings/hybrid_index')
+    index_path = Path('data/embeddings/hybrid_index' if args.shards == 1 else 'data/embeddings/sharded_index')
 
-print("\n🔍 Testing search with sample query...")
-print("-"*60)
-results = hybrid.search("machine learning models", k=3)
+    chunks_path = find_chunks_file(args.chunks)
+    if is_chunk_store(chunks_path):
+        # Columnar store: mapped as-is, nothing is parsed up front
+        print(f"\n📂 Mapping chunk store {chunks_path}...")
+        chunks = open_chunk_store(chunks_path)
+    else:
+        # Text formats: stream into a chunk store, then build from the mapping
+        print(f"\n📂 Streaming chunks from {chunks_path}...")
+        store_path = index_path / 'chunk_store' if args.shards == 1 else index_path / 'source_chunks'
+        chunks = ChunkStore.write(iter_chunks(chunks_path), store_path, compress=args.compress_chunks)
+    print(f"✅ Loaded {len(chunks)} chunks")
 
-for i, (chunk, score) in enumerate(results, 1):
-    print(f"\n{i}. Score: {score:.3f}")
-    print(f"   Doc: {chunk['doc_title'][:50]}...")
-    print(f"   Text: {chunk['content'][:100]}...")
+    print(f"\n⏰ Starting index build...")
+    print("   This takes ~10-15 minutes on CPU for a cold embedding cache")
+    print("   Perfect time for a coffee break! ☕")
+    print()
 
-print("\n" + "="*60)
-print("✅ ALL INDICES BUILT SUCCESSFULLY!")
-print("="*60)
-print("\n📊 Summary:")
-print(f"   Total chunks indexed: {len(chunks)}")
-print(f"   Vector dimensions: 384")
-print(f"   Storage location: data/embeddings/hybrid_index/")
-print()
+    if args.shards > 1:
+        build_shards(
+            chunks,
+            str(index_path),
+            args.shards,
+            index_type=args.index_type,
+            index_params={'rescore_factor': args.rescore_factor},
+            embedding_cache_dir=args.embedding_cache or None,
+            embed_workers=args.embed_workers,
+            compress_chunks=args.compress_chunks
+        )
+    else:
+        hybrid = HybridSearch(
+            vector_weight=0.7,
+            keyword_weight=0.3,
+            index_type=args.index_type,
+            index_params={'rescore_factor': args.rescore_factor},
+            embedding_cache_dir=args.embedding_cache or None,
+            embed_workers=args.embed_workers
+        )
+        hybrid.build_index(chunks)
+
+        if args.index_type in SCALAR_QUANTIZERS:
+            vector_search = hybrid.vector_search
+            questions = [q['question'] for q in TestSetGenerator().get_test_set()]
+            report = vector_search.memory_report()
+            recall = vector_search.recall_vs_flat(vector_search.encode_queries(questions), k=10)
+            print(f"\n📉 {args.index_type}: {report['saved_bytes'] / 2**20:.1f} MB of vector RAM saved "
+                  f"({report['saved_ratio']:.0%}), recall@10 vs flat {recall:.3f} "
+                  f"over {len(questions)} test questions")
+
+        print("\n💾 Saving indices to disk...")
+        hybrid.save(str(index_path), compress_chunks=args.compress_chunks)
+
+        print("\n🔍 Testing search with sample query...")
+        print("-"*60)
+        results = hybrid.search("machine learning models", k=3)
+
+        for i, (chunk, score) in enumerate(results, 1):
+            print(f"\n{i}. Score: {score:.3f}")
+            print(f"   Doc: {chunk['doc_title'][:50]}...")
+            print(f"   Text: {chunk['content'][:100]}...")
+
+    print("\n" + "="*60)
+    print("✅ ALL INDICES BUILT SUCCESSFULLY!")
+    print("="*60)
+    print("\n📊 Summary:")
+    print(f"   Total chunks indexed: {len(chunks)}")
+    print(f"   Vector dimensions: 384")
+    print(f"   Index type: {args.index_type}")
+    if args.shards > 1:
+        print(f"   Shards: {args.shards}")
+    print(f"   Storage location: {index_path}/")
+    print()
+
+
+# Embedding and shard workers are spawned processes that re-import this module
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,99 @@
 from pathlib import Path
-import json
+import argparse
 import sys
 sys.path.append('src')
 
 from ingestion.loader import DocumentLoader
 from ingestion.chunker import DocumentChunker
+from ingestion.chunk_io import write_chunks_jsonl, write_chunk_store, DEFAULT_CHUNKS_PATH, JSONL_CHUNKS_PATH
+from ingestion.parallel import ParallelIngestor
+from ingestion.dedup import MinHashDeduplicator, DEDUP_MODES
 
-print("🚀 Starting document ingestion...")
 
-print("\n📂 Loading documents...")
-loader = DocumentLoader('data/raw/arxiv')
-documents = loader.load_all()
-print(f"✅ Loaded {len(documents)} documents")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load, chunk and save raw documents")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for loading and chunking (1 = serial, 0 = one per CPU)")
+    parser.add_argument('--format', choices=('columnar', 'jsonl'), default='columnar',
+                        help="binary columnar chunk store (default) or JSON Lines")
+    parser.add_argument('--compress', action='store_true',
+                        help="zlib-compress chunk text in the columnar store")
+    parser.add_argument('--dedup', action='store_true',
+                        help="remove near-duplicate chunks (MinHash/LSH) before writing")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="estimated Jaccard similarity at which a chunk counts as a duplicate")
+    parser.add_argument('--dedup-mode', choices=DEDUP_MODES, default='drop',
+                        help="drop duplicates, or drop them and record clusters in data/processed/duplicate_clusters.json")
+    return parser.parse_args()
 
-print("\n✂️ Chunking documents...")
-chunker = DocumentChunker(chunk_size=1024, chunk_overlap=128)
-chunks = chunker.chunk_documents(documents)
-print(f"✅ Created {len(chunks)} chunks")
 
-output_path = Path('data/processed/chunks.json')
-output_path.parent.mkdir(parents=True, exist_ok=True)
+def main():
+    args = parse_args()
 
-with open(output_path, 'w') as f:
-    json.dump(chunks, f, indent=2)
+    print("🚀 Starting document ingestion...")
 
-print(f"\n💾 Saved to {output_path}")
+    # Documents are loaded, chunked and written one at a time; nothing holds the whole corpus
+    stats = {'documents': 0, 'chunks': 0, 'words': 0}
 
-total_chars = sum(c['metadata']['char_count'] for c in chunks)
-total_words = sum(c['metadata']['word_count'] for c in chunks)
+    def counted(documents):
+        for doc in documents:
+            stats['documents'] += 1
+            yield doc
 
-print("\n📊 Statistics:")
-print(f"  Documents: {len(documents)}")
-print(f"  Chunks: {len(chunks)}")
-print(f"  Avg chunks/doc: {len(chunks)/len(documents):.1f}")
-print(f"  Total words: {total_words:,}")
-print(f"  Avg words/chunk: {total_words/len(chunks):.0f}")
-print("\n✅ Ingestion complete!")
\ No newline at end of file
+    dedup = MinHashDeduplicator(threshold=args.dedup_threshold, mode=args.dedup_mode) if args.dedup else None
+
+    def tracked(chunks):
+        if dedup is not None:
+            chunks = dedup.filter(chunks)
+        for chunk in chunks:
+            stats['chunks'] += 1
+            stats['words'] += chunk['metadata']['word_count']
+            yield chunk
+
+    if args.format == 'columnar':
+        output_path = Path(DEFAULT_CHUNKS_PATH)
+        write_chunks = lambda chunks: write_chunk_store(chunks, output_path, compress=args.compress)
+    else:
+        output_path = Path(JSONL_CHUNKS_PATH)
+        write_chunks = lambda chunks: write_chunks_jsonl(chunks, output_path)
+
+    if args.workers == 1:
+        print("\n📂 Loading and ✂️ chunking documents (streaming)...")
+        loader = DocumentLoader('data/raw/arxiv')
+        chunker = DocumentChunker(chunk_size=1024, chunk_overlap=128)
+        write_chunks(tracked(chunker.iter_chunks(counted(loader.iter_documents()))))
+    else:
+        ingestor = ParallelIngestor('data/raw/arxiv', workers=args.workers or None, chunk_size=1024, chunk_overlap=128)
+        print(f"\n📂 Loading and ✂️ chunking documents on {ingestor.workers} processes...")
+        write_chunks(tracked(ingestor.iter_chunks()))
+        stats['documents'] = ingestor.num_documents
+        if ingestor.errors:
+            print(f"⚠️ {len(ingestor.errors)} files failed to load (see log)")
+    print(f"✅ Loaded {stats['documents']} documents")
+    print(f"✅ Created {stats['chunks']} chunks")
+
+    print(f"\n💾 Saved to {output_path}")
+
+    if dedup is not None:
+        report = dedup.report()
+        print("\n🧹 Near-duplicate removal:")
+        print(f"  Duplicates removed: {report['duplicates']:,} of {report['chunks_in']:,} chunks ({report['duplicate_ratio']:.1%})")
+        print(f"  Text not indexed: {report['text_chars_saved_ratio']:.1%} of characters")
+        print(f"  Vector index saved: {report['vector_bytes_saved'] / 1e6:.1f} MB (float32, 384 dims)")
+        if args.dedup_mode == 'cluster':
+            clusters_path = output_path.parent / 'duplicate_clusters.json'
+            dedup.save_clusters(clusters_path)
+            print(f"  Clusters: {len(dedup.clusters):,} written to {clusters_path}")
+
+    print("\n📊 Statistics:")
+    print(f"  Documents: {stats['documents']}")
+    print(f"  Chunks: {stats['chunks']}")
+    print(f"  Avg chunks/doc: {stats['chunks']/max(stats['documents'], 1):.1f}")
+    print(f"  Total words: {stats['words']:,}")
+    print(f"  Avg words/chunk: {stats['words']/max(stats['chunks'], 1):.0f}")
+    print("\n✅ Ingestion complete!")
+
+
+# Parallel ingestion workers are spawned processes that re-import this module
+if __name__ == '__main__':
+    main()
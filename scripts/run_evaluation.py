@@ -34,6 +34,13 @@ print(f"✅ Loaded {len(test_questions)} test questions")
 results = []
 total_start = time.time()
 
+# Retrieve context for every question in one batched pass
+print("\n🔍 Retrieving context for all questions...")
+retrieval_start = time.time()
+all_chunks = search.search_batch([item['question'] for item in test_questions], k=5)
+retrieval_time = (time.time() - retrieval_start) / len(test_questions)
+print(f"✅ Retrieved in {retrieval_time * 1000:.0f}ms per question (batched)")
+
 print("\n" + "="*70)
 print("RUNNING EVALUATION")
 print("="*70)
@@ -44,10 +51,7 @@ for i, test_item in enumerate(test_questions, 1):
     print(f"\n[{i}/{len(test_questions)}] {question}")
     print("-"*70)
     
-    # Retrieve
-    retrieval_start = time.time()
-    chunks = search.search(question, k=5)
-    retrieval_time = time.time() - retrieval_start
+    chunks = all_chunks[i - 1]
     
     # Generate
     generation_start = time.time()
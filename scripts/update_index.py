@@ -0,0 +1,43 @@
+import argparse
+import sys
+sys.path.append('src')
+
+from ingestion.loader import DocumentLoader
+from ingestion.chunker import DocumentChunker
+from retrieval.hybrid import HybridSearch
+
+parser = argparse.ArgumentParser(description="Apply document changes to the hybrid index without a rebuild")
+parser.add_argument('--upsert-dir', help="directory of new or changed raw JSON documents")
+parser.add_argument('--delete', nargs='*', default=[], help="document ids to remove")
+parser.add_argument('--index', default='data/embeddings/hybrid_index')
+parser.add_argument('--merge', action='store_true',
+                    help="fold the keyword delta, deleted rows and chunk segments back in (rewrites the index)")
+args = parser.parse_args()
+
+print("\n" + "="*60)
+print("🔄 UPDATING SEARCH INDEX")
+print("="*60)
+
+print("\n📂 Loading search index...")
+hybrid = HybridSearch()
+hybrid.load(args.index)
+
+if args.upsert_dir:
+    print(f"\n📥 Loading documents from {args.upsert_dir}...")
+    documents = DocumentLoader(args.upsert_dir).load_all()
+    chunks = DocumentChunker(chunk_size=1024, chunk_overlap=128).chunk_documents(documents)
+    row_ids = hybrid.update_documents(chunks)
+    print(f"✅ Upserted {len(documents)} documents ({len(row_ids)} chunks)")
+
+if args.delete:
+    removed = hybrid.delete_documents(args.delete)
+    print(f"🗑️ Deleted {len(args.delete)} documents ({removed} chunks)")
+
+print("\n💾 Merging and saving index..." if args.merge else "\n💾 Saving index...")
+hybrid.save(args.index, merge=args.merge)
+
+print("\n📊 Summary:")
+print(f"   Total rows: {len(hybrid.chunks)}")
+print(f"   Deleted rows: {int(hybrid.deleted.sum())}")
+print(f"   Keyword delta: {hybrid.keyword_search.delta_size} chunks")
+print()
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+
+from retrieval.query_cache import QueryEmbeddingCache
+
+
+class InMemoryRedis:
+    """Minimal asyncio stand-in for redis.asyncio.Redis (get/set with ex/delete/ping).
+
+    Used for tests and single-process runs without a Redis server.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value, ex: Optional[int] = None) -> bool:
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def aclose(self):
+        self._data.clear()
+
+
+class ResponseCache:
+    """Exact-match cache of /query responses: an in-process LRU in front of Redis.
+
+    Keys hash the normalized question, top_k, model, retrieval options and
+    an index token (index id + version). Any index change produces new keys,
+    so stale answers are never served; the local tier is dropped as soon as
+    a new index token is seen and Redis entries age out through their TTL.
+    Redis errors are reported once and the cache carries on with the local
+    tier, so an unavailable Redis never fails a request.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_local: int = 1024,
+        ttl: int = 3600,
+        prefix: str = 'rag:response:'
+    ):
+        self.redis = redis_client
+        self.max_local = max_local
+        self.ttl = ttl
+        self.prefix = prefix
+        self._local: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_token = None
+        self._redis_failed = False
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def index_token(search_engine) -> str:
+        """Identity of the index contents answers were computed from"""
+        return f"{search_engine.index_id}:{getattr(search_engine, 'index_version', 0)}"
+
+    def key(
+        self,
+        question: str,
+        top_k: int,
+        model: str,
+        index_token: str,
+        options: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Cache key for a request; options holds anything else that changes retrieval"""
+        self._check_index(index_token)
+        payload = json.dumps({
+            'question': QueryEmbeddingCache.normalize(question),
+            'top_k': top_k,
+            'model': model,
+            'index': index_token,
+            'options': options or {}
+        }, sort_keys=True, separators=(',', ':'))
+        return self.prefix + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _check_index(self, index_token: str):
+        with self._lock:
+            if index_token != self._index_token:
+                self._local.clear()
+                self._index_token = index_token
+
+    def _redis_error(self, e: Exception):
+        if not self._redis_failed:
+            print(f"❌ Redis response cache unavailable, using the in-process tier only: {e}")
+            self._redis_failed = True
+
+    async def get(self, key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """(cached response, tier it came from: 'local' or 'redis'), or (None, None)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._local.move_to_end(key)
+                    self.local_hits += 1
+                    return entry[1], 'local'
+                del self._local[key]
+
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(key)
+            except Exception as e:
+                self._redis_error(e)
+                data = None
+            if data is not None:
+                value = json.loads(data)
+                self._put_local(key, value)
+                with self._lock:
+                    self.redis_hits += 1
+                return value, 'redis'
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    async def set(self, key: str, value: Dict):
+        self._put_local(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, json.dumps(value), ex=self.ttl)
+                self._redis_failed = False
+            except Exception as e:
+                self._redis_error(e)
+
+    def _put_local(self, key: str, value: Dict):
+        if self.max_local <= 0:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return (self.local_hits + self.redis_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'local_size': len(self._local),
+                'max_local': self.max_local,
+                'local_hits': self.local_hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hit_ratio, 4),
+                'redis': self.redis is not None and not self._redis_failed
+            }
+
+
+def create_response_cache(redis_url: Optional[str], max_local: int = 1024, ttl: int = 3600) -> ResponseCache:
+    """ResponseCache backed by redis_url; 'memory' uses InMemoryRedis, None/'' the local tier only"""
+    if not redis_url:
+        return ResponseCache(None, max_local=max_local, ttl=ttl)
+    if redis_url == 'memory':
+        return ResponseCache(InMemoryRedis(), max_local=max_local, ttl=ttl)
+
+    import redis.asyncio as redis
+    return ResponseCache(redis.Redis.from_url(redis_url), max_local=max_local, ttl=ttl)
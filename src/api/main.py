@@ -1,18 +1,30 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
 import sys
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
 import time
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+import json
 
 # Prometheus imports
-from prometheus_client import Counter, Histogram, generate_latest
+from prometheus_client import Counter, Gauge, Histogram, generate_latest
 from prometheus_fastapi_instrumentator import Instrumentator
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from retrieval.hybrid import HybridSearch
+from retrieval.sharded import ShardedSearch
+from retrieval.filters import MetadataFilter
+from api.cache import ResponseCache, create_response_cache
+from api.semantic_cache import SemanticAnswerCache
+from api.scheduler import RetrievalBatcher
 from generation.generator import AnswerGenerator
 from api.models import QueryRequest, QueryResponse, HealthResponse, StatsResponse, Source
 
@@ -40,6 +52,22 @@ app.add_middleware(
 query_counter = Counter('rag_queries_total', 'Total RAG queries')
 query_latency = Histogram('rag_query_latency_seconds', 'RAG query latency')
 tokens_counter = Counter('rag_tokens_used_total', 'Total tokens used')
+time_to_first_byte = Histogram('rag_time_to_first_byte_seconds', 'Time until /query/stream sends the sources event')
+time_to_first_token = Histogram('rag_time_to_first_token_seconds', 'Time until /query/stream sends the first answer token')
+response_cache_lookups = Counter('rag_response_cache_lookups_total', 'Response cache lookups', ['result'])
+response_cache_hit_ratio = Gauge('rag_response_cache_hit_ratio', 'Fraction of response cache lookups served from cache')
+retrieval_batch_size = Histogram(
+    'rag_retrieval_batch_size',
+    'Requests per micro-batch sent to the retrieval engine',
+    ['operation'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+semantic_cache_lookups = Counter('rag_semantic_cache_lookups_total', 'Semantic answer cache lookups', ['result'])
+semantic_cache_similarity = Histogram(
+    'rag_semantic_cache_similarity',
+    'Best cosine similarity between a question and cached questions',
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.88, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0)
+)
 
 # Instrument app with Prometheus
 Instrumentator().instrument(app).expose(app)
@@ -47,6 +75,15 @@ Instrumentator().instrument(app).expose(app)
 # Global components
 search_engine = None
 generator = None
+# Retrieval is CPU-bound (FAISS and numpy release the GIL); it runs here so the
+# event loop stays free to multiplex LLM calls from concurrent requests
+retrieval_executor = None
+# Groups concurrent requests into batched encode/search calls on that executor
+retrieval_batcher = None
+# Exact-match answers for repeated questions (in-process LRU, optionally backed by Redis)
+response_cache = None
+# Answers for paraphrased questions, matched on the retrieval query embedding
+semantic_cache = None
 
 # Statistics
 stats = {
@@ -58,7 +95,7 @@ stats = {
 @app.on_event("startup")
 async def startup_event():
     """Initialize components on startup"""
-    global search_engine, generator
+    global search_engine, generator, retrieval_executor, retrieval_batcher, response_cache, semantic_cache
     
     print("\n" + "="*60)
     print("🚀 Starting RAG API...")
@@ -67,9 +104,27 @@ async def startup_event():
     # Load search index
     try:
         print("\n📂 Loading search index...")
-        search_engine = HybridSearch()
-        search_engine.load('data/embeddings/hybrid_index')
-        print("✅ Search index loaded")
+        leg_timeout_ms = os.getenv('LEG_TIMEOUT_MS')
+        sharded_index_path = os.getenv('SHARDED_INDEX_PATH')
+        if sharded_index_path:
+            shard_deadline_ms = os.getenv('SHARD_DEADLINE_MS')
+            search_engine = ShardedSearch(
+                query_backend=os.getenv('QUERY_BACKEND', 'torch'),
+                deadline=float(shard_deadline_ms) / 1000 if shard_deadline_ms else None,
+                threads_per_shard=int(os.getenv('THREADS_PER_SHARD', '1'))
+            )
+            search_engine.load(sharded_index_path)
+        else:
+            search_engine = HybridSearch(
+                parallel=os.getenv('PARALLEL_RETRIEVAL', '1') == '1',
+                query_backend=os.getenv('QUERY_BACKEND', 'torch'),
+                leg_timeout=float(leg_timeout_ms) / 1000 if leg_timeout_ms else None
+            )
+            search_engine.load(
+                'data/embeddings/hybrid_index',
+                verify_checksums=os.getenv('VERIFY_INDEX_CHECKSUMS') == '1'
+            )
+        print(f"✅ Search index loaded (id {search_engine.index_id})")
     except Exception as e:
         print(f"❌ Failed to load search index: {e}")
         raise
@@ -77,12 +132,46 @@ async def startup_event():
     # Initialize generator
     try:
         print("🤖 Initializing generator...")
-        generator = AnswerGenerator()
+        generator = AnswerGenerator(max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', '64')))
         print("✅ Generator initialized")
     except Exception as e:
         print(f"❌ Failed to initialize generator: {e}")
         raise
     
+    retrieval_executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv('RETRIEVAL_WORKERS', '4')),
+        thread_name_prefix='retrieval'
+    )
+    if os.getenv('RETRIEVAL_BATCHING', '1') == '1':
+        retrieval_batcher = RetrievalBatcher(
+            search_engine,
+            retrieval_executor,
+            max_batch=int(os.getenv('BATCH_MAX_SIZE', '32')),
+            window_ms=float(os.getenv('BATCH_WINDOW_MS', '2')),
+            on_batch=lambda operation, size: retrieval_batch_size.labels(operation=operation).observe(size)
+        )
+    
+    if os.getenv('RESPONSE_CACHE', '1') == '1':
+        response_cache = create_response_cache(
+            os.getenv('REDIS_URL'),
+            max_local=int(os.getenv('RESPONSE_CACHE_SIZE', '1024')),
+            ttl=int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+        )
+        if response_cache.redis is not None:
+            try:
+                await response_cache.redis.ping()
+                print("✅ Response cache connected to Redis")
+            except Exception as e:
+                print(f"❌ Redis not reachable, response cache is in-process only: {e}")
+                response_cache.redis = None
+    
+    if os.getenv('SEMANTIC_CACHE', '1') == '1':
+        semantic_cache = SemanticAnswerCache(
+            dimension=search_engine.vector_search.dimension,
+            threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92')),
+            max_entries=int(os.getenv('SEMANTIC_CACHE_SIZE', '2048'))
+        )
+    
     print("\n" + "="*60)
     print("✅ RAG API READY!")
     print("="*60)
@@ -92,6 +181,18 @@ async def startup_event():
     print("   Metrics:    http://localhost:8000/metrics")
     print("")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the LLM connection pool, Redis connection, retrieval threads and shard workers"""
+    if generator is not None:
+        await generator.aclose()
+    if response_cache is not None and response_cache.redis is not None:
+        await response_cache.redis.aclose()
+    if retrieval_executor is not None:
+        retrieval_executor.shutdown(wait=False)
+    if isinstance(search_engine, ShardedSearch):
+        search_engine.close()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -113,6 +214,160 @@ async def health_check():
         total_chunks=len(search_engine.vector_search.chunks) if search_engine else 0
     )
 
+def _validate_filters(request: QueryRequest):
+    if request.filters:
+        try:
+            MetadataFilter(request.filters)
+        except (ValueError, TypeError) as e:
+            # Malformed operands must come back as a client error, never a 500
+            raise HTTPException(status_code=400, detail=str(e))
+
+async def _retrieve(request: QueryRequest):
+    """Run retrieval on the retrieval executor, off the event loop (batched with concurrent requests)"""
+    if retrieval_batcher is not None:
+        return await retrieval_batcher.search(
+            request.question,
+            request.top_k,
+            ef_search=request.ef_search,
+            nprobe=request.nprobe,
+            filters=request.filters
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        retrieval_executor,
+        functools.partial(
+            search_engine.search_with_timings,
+            request.question,
+            k=request.top_k,
+            ef_search=request.ef_search,
+            nprobe=request.nprobe,
+            filters=request.filters
+        )
+    )
+
+def _record_query(latency_seconds: float, tokens_used: int):
+    """Update Prometheus metrics and internal stats for a finished query"""
+    query_latency.observe(latency_seconds)
+    tokens_counter.inc(tokens_used)
+    
+    stats['total_queries'] += 1
+    stats['total_latency'] += latency_seconds * 1000
+    stats['total_tokens'] += tokens_used
+
+def _cache_key(request: QueryRequest) -> Optional[str]:
+    if response_cache is None:
+        return None
+    return response_cache.key(
+        request.question,
+        request.top_k,
+        generator.model,
+        ResponseCache.index_token(search_engine),
+        options={'ef_search': request.ef_search, 'nprobe': request.nprobe, 'filters': request.filters}
+    )
+
+async def _cached_response(cache_key: Optional[str], start_time: float) -> Optional[Dict]:
+    """A cached QueryResponse body for this request, with this request's latency, or None"""
+    if cache_key is None:
+        return None
+    cached, tier = await response_cache.get(cache_key)
+    response_cache_lookups.labels(result=tier or 'miss').inc()
+    response_cache_hit_ratio.set(response_cache.hit_ratio)
+    if cached is None:
+        return None
+    
+    latency_seconds = time.time() - start_time
+    _record_query(latency_seconds, 0)
+    return dict(cached, metadata=dict(
+        cached['metadata'],
+        latency_ms=round(latency_seconds * 1000, 2),
+        tokens_used=0,
+        cache=tier
+    ))
+
+def _semantic_scope(request: QueryRequest) -> str:
+    """Everything besides the question that must match for an answer to be reused"""
+    return json.dumps({
+        'top_k': request.top_k,
+        'model': generator.model,
+        'ef_search': request.ef_search,
+        'nprobe': request.nprobe,
+        'filters': request.filters
+    }, sort_keys=True)
+
+async def _semantic_cached_response(
+    request: QueryRequest,
+    start_time: float
+) -> Tuple[Optional[Dict], Optional[np.ndarray]]:
+    """(cached answer to a paraphrase of this question or None, the question embedding).
+
+    The embedding goes through the query-embedding cache, so retrieval
+    after a miss reuses it instead of encoding the question again.
+    """
+    if semantic_cache is None:
+        return None, None
+    if retrieval_batcher is not None:
+        embedding = await retrieval_batcher.encode(request.question)
+    else:
+        loop = asyncio.get_running_loop()
+        embedding = (await loop.run_in_executor(
+            retrieval_executor, search_engine.vector_search.encode_queries, [request.question]
+        ))[0]
+    cached, similarity, result = semantic_cache.lookup(
+        embedding, _semantic_scope(request), ResponseCache.index_token(search_engine)
+    )
+    semantic_cache_lookups.labels(result=result).inc()
+    if similarity is not None:
+        semantic_cache_similarity.observe(similarity)
+    if cached is None:
+        return None, embedding
+    
+    latency_seconds = time.time() - start_time
+    _record_query(latency_seconds, 0)
+    return dict(cached, question=request.question, metadata=dict(
+        cached['metadata'],
+        latency_ms=round(latency_seconds * 1000, 2),
+        tokens_used=0,
+        cache='semantic',
+        similarity=round(similarity, 4),
+        cached_question=cached['question']
+    )), embedding
+
+async def _lookup_caches(
+    request: QueryRequest,
+    start_time: float
+) -> Tuple[Optional[Dict], Optional[str], Optional[np.ndarray]]:
+    """Exact-match cache first, then the semantic cache; (cached body, cache key, question embedding)"""
+    cache_key = _cache_key(request)
+    cached = await _cached_response(cache_key, start_time)
+    if cached is not None:
+        return cached, cache_key, None
+    cached, embedding = await _semantic_cached_response(request, start_time)
+    return cached, cache_key, embedding
+
+async def _store_response(
+    request: QueryRequest,
+    cache_key: Optional[str],
+    embedding: Optional[np.ndarray],
+    body: Dict
+):
+    """Keep a successful answer in the exact-match and semantic caches"""
+    if cache_key is not None:
+        await response_cache.set(cache_key, body)
+    if embedding is not None:
+        semantic_cache.add(embedding, _semantic_scope(request), ResponseCache.index_token(search_engine), body)
+
+def _query_metadata(latency_ms: float, result: Dict, num_sources: int, retrieval_timings: Dict) -> Dict:
+    return {
+        'latency_ms': round(latency_ms, 2),
+        'tokens_used': result['tokens_used'],
+        'num_sources': num_sources,
+        'model': result['model'],
+        'retrieval': {
+            key: round(value, 2) if isinstance(value, float) else value
+            for key, value in retrieval_timings.items()
+        }
+    }
+
 @app.post("/query", response_model=QueryResponse)
 async def query(request: QueryRequest):
     """Query the RAG system with Prometheus metrics"""
@@ -121,26 +376,22 @@ async def query(request: QueryRequest):
     query_counter.inc()
     
     start_time = time.time()
+    _validate_filters(request)
     
     try:
-        # Retrieve context
-        retrieved_chunks = search_engine.search(request.question, k=request.top_k)
-        
-        # Generate answer
-        result = generator.generate(request.question, retrieved_chunks)
+        cached, cache_key, embedding = await _lookup_caches(request, start_time)
+        if cached is not None:
+            return QueryResponse(**cached)
         
-        # Calculate latency
-        latency_ms = (time.time() - start_time) * 1000
-        latency_seconds = (time.time() - start_time)
+        # Retrieve context off the event loop
+        retrieved_chunks, retrieval_timings = await _retrieve(request)
         
-        # Update Prometheus metrics
-        query_latency.observe(latency_seconds)
-        tokens_counter.inc(result['tokens_used'])
+        # Generate answer; other requests proceed while this one awaits the model
+        result = await generator.agenerate(request.question, retrieved_chunks)
         
-        # Update internal stats
-        stats['total_queries'] += 1
-        stats['total_latency'] += latency_ms
-        stats['total_tokens'] += result['tokens_used']
+        # Calculate latency
+        latency_seconds = time.time() - start_time
+        _record_query(latency_seconds, result['tokens_used'])
         
         # Create response
         response_data = {
@@ -155,19 +406,88 @@ async def query(request: QueryRequest):
                 )
                 for s in result['sources']
             ],
-            'metadata': {
-                'latency_ms': round(latency_ms, 2),
-                'tokens_used': result['tokens_used'],
-                'num_sources': len(result['sources']),
-                'model': result['model']
-            }
+            'metadata': _query_metadata(latency_seconds * 1000, result, len(result['sources']), retrieval_timings)
         }
+        response = QueryResponse(**response_data)
+        
+        # Failed generations report no usage and are not worth keeping
+        if result['tokens_used']:
+            await _store_response(request, cache_key, embedding, response.model_dump())
         
-        return QueryResponse(**response_data)
+        return response
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """Stream the answer as server-sent events.
+
+    Events, in order: `sources` (as soon as retrieval finishes), one `token`
+    per text delta from the model, then `done` carrying the same metadata
+    /query returns (or `error` if generation failed).
+    """
+    query_counter.inc()
+    
+    start_time = time.time()
+    _validate_filters(request)
+    
+    try:
+        cached, cache_key, embedding = await _lookup_caches(request, start_time)
+        if cached is None:
+            retrieved_chunks, retrieval_timings = await _retrieve(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def replay():
+        # A cached answer arrives whole: one token event carries all of it
+        time_to_first_byte.observe(time.time() - start_time)
+        yield _sse('sources', {'question': request.question, 'sources': cached['sources']})
+        time_to_first_token.observe(time.time() - start_time)
+        yield _sse('token', {'text': cached['answer']})
+        yield _sse('done', {'metadata': cached['metadata']})
+    
+    async def events():
+        sources = generator.sources(retrieved_chunks)
+        time_to_first_byte.observe(time.time() - start_time)
+        yield _sse('sources', {'question': request.question, 'sources': sources})
+        
+        first_token_seconds = None
+        answer_parts = []
+        async for kind, payload in generator.astream(request.question, retrieved_chunks):
+            if kind == 'token':
+                if first_token_seconds is None:
+                    first_token_seconds = time.time() - start_time
+                    time_to_first_token.observe(first_token_seconds)
+                answer_parts.append(payload)
+                yield _sse('token', {'text': payload})
+            elif kind == 'error':
+                yield _sse('error', {'detail': payload})
+            else:
+                latency_seconds = time.time() - start_time
+                _record_query(latency_seconds, payload['tokens_used'])
+                metadata = _query_metadata(latency_seconds * 1000, payload, len(sources), retrieval_timings)
+                if first_token_seconds is not None:
+                    metadata['time_to_first_token_ms'] = round(first_token_seconds * 1000, 2)
+                if payload['tokens_used']:
+                    await _store_response(request, cache_key, embedding, {
+                        'question': request.question,
+                        'answer': ''.join(answer_parts),
+                        'sources': sources,
+                        'metadata': metadata
+                    })
+                yield _sse('done', {'metadata': metadata})
+    
+    # no-cache / no buffering so proxies pass each event through as it is written
+    return StreamingResponse(
+        replay() if cached is not None else events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.get("/stats", response_model=StatsResponse)
 async def get_stats():
     """Get system statistics"""
@@ -178,7 +498,11 @@ async def get_stats():
         total_queries=stats['total_queries'],
         avg_latency_ms=round(avg_latency, 2),
         total_tokens_used=stats['total_tokens'],
-        avg_tokens_per_query=round(avg_tokens, 2)
+        avg_tokens_per_query=round(avg_tokens, 2),
+        query_embedding_cache=search_engine.vector_search.query_cache.stats() if search_engine else {},
+        response_cache=response_cache.stats() if response_cache else {},
+        semantic_cache=semantic_cache.stats() if semantic_cache else {},
+        retrieval_batching=retrieval_batcher.stats() if retrieval_batcher else {}
     )
 
 if __name__ == "__main__":
@@ -1,10 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any
 
 class QueryRequest(BaseModel):
     """Request model for RAG query"""
     question: str = Field(..., description="The question to answer")
     top_k: int = Field(5, ge=1, le=20, description="Number of chunks to retrieve")
+    ef_search: Optional[int] = Field(None, ge=1, le=4096, description="HNSW search depth (higher = better recall, slower)")
+    nprobe: Optional[int] = Field(None, ge=1, le=65536, description="IVF lists to probe (higher = better recall, slower)")
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        description='Metadata filter, e.g. {"doc_id": ["a", "b"], "metadata.word_count": {"gte": 100}}'
+    )
 
 class Source(BaseModel):
     """Source document metadata"""
@@ -32,4 +38,8 @@ class StatsResponse(BaseModel):
     total_queries: int
     avg_latency_ms: float
     total_tokens_used: int
-    avg_tokens_per_query: float
\ No newline at end of file
+    avg_tokens_per_query: float
+    query_embedding_cache: Dict = Field(default_factory=dict)
+    response_cache: Dict = Field(default_factory=dict)
+    semantic_cache: Dict = Field(default_factory=dict)
+    retrieval_batching: Dict = Field(default_factory=dict)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class RetrievalBatcher:
+    """Micro-batches concurrent retrieval work from the API into single calls.
+
+    Requests with identical retrieval parameters are queued together and
+    run as one search_batch_with_timings call (one embedding forward pass,
+    one multi-row FAISS search, one BM25 pass); question encoding for the
+    semantic cache is batched the same way. A queue is dispatched when the
+    first of these happens:
+        - it holds max_batch requests
+        - window_ms has passed since its first request (the max-wait bound)
+        - no batch is running, so nothing is gained by waiting; the queue
+          goes out on the next event-loop turn with whatever has arrived
+    At low load every request therefore dispatches almost immediately and
+    latency is unchanged; batches only grow while earlier ones are running.
+    """
+
+    def __init__(
+        self,
+        search_engine,
+        executor: Executor,
+        max_batch: int = 32,
+        window_ms: float = 2.0,
+        on_batch: Optional[Callable[[str, int], None]] = None
+    ):
+        if max_batch < 1:
+            raise ValueError(f"❌ max_batch must be at least 1, got {max_batch}")
+        self.search_engine = search_engine
+        self.executor = executor
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        # Called with (operation, batch size) for every dispatched batch
+        self.on_batch = on_batch
+
+        self._queues: Dict[Tuple, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.Handle] = {}
+        self._in_flight = 0
+        self.batches = 0
+        self.requests = 0
+
+    async def search(
+        self,
+        question: str,
+        k: int,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List[Tuple[Dict, float]], Dict]:
+        """search_with_timings for one question, run as part of a batch"""
+        key = ('search', k, ef_search, nprobe, json.dumps(filters, sort_keys=True) if filters else None)
+        return await self._submit(key, question)
+
+    async def encode(self, question: str):
+        """The question's query embedding, encoded as part of a batch"""
+        return await self._submit(('encode',), question)
+
+    def _submit(self, key: Tuple, item: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(key, [])
+        queue.append((item, future))
+        self.requests += 1
+
+        if len(queue) >= self.max_batch:
+            self._flush(key)
+        elif len(queue) == 1:
+            delay = 0 if self._in_flight == 0 else self.window
+            self._timers[key] = loop.call_later(delay, self._flush, key)
+        return future
+
+    def _flush(self, key: Tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(key, None)
+        if not batch:
+            return
+
+        self._in_flight += 1
+        self.batches += 1
+        if self.on_batch is not None:
+            self.on_batch(key[0], len(batch))
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, self._run, key, items)
+        task.add_done_callback(lambda done: self._scatter(done, batch))
+
+    def _run(self, key: Tuple, items: List[str]) -> List[Any]:
+        """Executed on the retrieval executor: one batched call for the whole queue"""
+        if key[0] == 'encode':
+            return list(self.search_engine.vector_search.encode_queries(items))
+
+        _, k, ef_search, nprobe, filters = key
+        start = time.perf_counter()
+        results, timings = self.search_engine.search_batch_with_timings(
+            items, k=k, ef_search=ef_search, nprobe=nprobe,
+            filters=json.loads(filters) if filters else None
+        )
+        timings = dict(timings, batch_size=len(items), batch_ms=(time.perf_counter() - start) * 1000)
+        return [(result, timings) for result in results]
+
+    def _scatter(self, done: asyncio.Future, batch: List[Tuple[Any, asyncio.Future]]):
+        self._in_flight -= 1
+        error = done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                # The request was cancelled (client went away) while waiting
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+        if self._in_flight == 0:
+            # Queues that built up behind the finished batch need not wait out their window
+            for key in list(self._queues):
+                self._flush(key)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'in_flight': self._in_flight,
+            'max_batch': self.max_batch,
+            'window_ms': self.window * 1000
+        }
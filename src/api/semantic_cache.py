@@ -0,0 +1,129 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+
+
+class SemanticAnswerCache:
+    """Answers to past questions, looked up by question-embedding similarity.
+
+    Paraphrases of a question already answered (cosine similarity >=
+    threshold against the same index, top_k, model and retrieval options)
+    reuse the stored answer and skip both retrieval and the LLM. Question
+    embeddings are the ones VectorSearch computes for retrieval anyway.
+
+    Entries live in a fixed (max_entries x dimension) matrix searched by a
+    single matrix-vector product, which at this size beats any ANN index;
+    the least recently used entry is evicted when it is full. Everything is
+    dropped when the index token (index id + version) changes.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.92,
+        near_miss_margin: float = 0.05,
+        max_entries: int = 2048
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"❌ Semantic cache threshold must be in (0, 1], got {threshold}")
+        self.dimension = dimension
+        self.threshold = threshold
+        # Misses within this margin of the threshold are counted as near misses, for tuning
+        self.near_miss_margin = near_miss_margin
+        self.max_entries = max_entries
+
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._scopes = np.full(max_entries, -1, dtype=np.int64)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._scope_ids: Dict[str, int] = {}
+        self._index_token = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_misses = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _check_index(self, index_token: str):
+        if index_token != self._index_token:
+            self._clear()
+            self._index_token = index_token
+
+    def _clear(self):
+        self._entries.clear()
+        self._scopes[:] = -1
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._scope_ids.clear()
+
+    def lookup(
+        self,
+        embedding: np.ndarray,
+        scope: str,
+        index_token: str
+    ) -> Tuple[Optional[Dict], Optional[float], str]:
+        """(cached response or None, best similarity, 'hit' | 'near_miss' | 'miss').
+
+        The similarity is None when nothing comparable is cached yet.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_index(index_token)
+            scope_id = self._scope_ids.get(scope)
+            if scope_id is None or not self._entries:
+                self.misses += 1
+                return None, None, 'miss'
+
+            similarities = self._vectors @ query
+            similarities[self._scopes != scope_id] = -np.inf
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity == -np.inf:
+                self.misses += 1
+                return None, None, 'miss'
+
+            if similarity >= self.threshold:
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return self._entries[slot], similarity, 'hit'
+
+            if similarity >= self.threshold - self.near_miss_margin:
+                self.near_misses += 1
+                return None, similarity, 'near_miss'
+            self.misses += 1
+            return None, similarity, 'miss'
+
+    def add(self, embedding: np.ndarray, scope: str, index_token: str, response: Dict):
+        vector = self._normalize(embedding)
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_index(index_token)
+            if scope not in self._scope_ids and len(self._scope_ids) >= 4 * self.max_entries:
+                # Scope ids are never reused; start over rather than grow without bound
+                self._clear()
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._entries.popitem(last=False)
+            self._vectors[slot] = vector
+            self._scopes[slot] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            self._entries[slot] = response
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.near_misses + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'near_misses': self.near_misses,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -1,14 +1,31 @@
 import os
-from typing import List, Dict, Tuple
-from anthropic import Anthropic
+from typing import List, Dict, Tuple, AsyncIterator
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
 
 class AnswerGenerator:
-    def __init__(self, model: str = "claude-3-haiku-20240307"):
+    def __init__(
+        self,
+        model: str = "claude-3-haiku-20240307",
+        max_connections: int = 64,
+        timeout: float = 60.0
+    ):
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("❌ ANTHROPIC_API_KEY not found in .env file")
         
         self.client = Anthropic(api_key=api_key)
+        # Async client for the API: one pooled connection set shared by all in-flight requests
+        self.async_client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                ),
+                timeout=timeout
+            )
+        )
         self.model = model
         self.system_prompt = """You are a helpful AI assistant that answers questions based on provided context.
 
@@ -27,54 +44,112 @@ Rules:
             context_parts.append(f"[{i}] {chunk['content']}\n")
         return "\n".join(context_parts)
     
-    def generate(
-        self, 
-        question: str, 
-        retrieved_chunks: List[Tuple[Dict, float]],
-        max_tokens: int = 500
-    ) -> Dict:
+    def _user_prompt(self, question: str, retrieved_chunks: List[Tuple[Dict, float]]) -> str:
         context = self._format_context(retrieved_chunks)
         
-        user_prompt = f"""Context:
+        return f"""Context:
 {context}
 
 Question: {question}
 
 Answer using ONLY the context above. Include citations [1], [2], etc."""
-        
+    
+    def sources(self, retrieved_chunks: List[Tuple[Dict, float]]) -> List[Dict]:
+        return [
+            {
+                'chunk_id': chunk['chunk_id'],
+                'doc_title': chunk['doc_title'],
+                'content': chunk['content'][:200] + '...',
+                'score': score
+            }
+            for chunk, score in retrieved_chunks
+        ]
+    
+    def _result(self, question: str, retrieved_chunks: List[Tuple[Dict, float]], response) -> Dict:
+        return {
+            'question': question,
+            'answer': response.content[0].text,
+            'sources': self.sources(retrieved_chunks),
+            'model': self.model,
+            'tokens_used': response.usage.input_tokens + response.usage.output_tokens
+        }
+    
+    def _error_result(self, question: str, error: Exception) -> Dict:
+        return {
+            'question': question,
+            'answer': f"Error: {str(error)}",
+            'sources': [],
+            'model': self.model,
+            'tokens_used': 0
+        }
+    
+    def generate(
+        self, 
+        question: str, 
+        retrieved_chunks: List[Tuple[Dict, float]],
+        max_tokens: int = 500
+    ) -> Dict:
         try:
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 system=self.system_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
+                messages=[{"role": "user", "content": self._user_prompt(question, retrieved_chunks)}]
             )
-            
-            answer = response.content[0].text
-            
-            sources = [
-                {
-                    'chunk_id': chunk['chunk_id'],
-                    'doc_title': chunk['doc_title'],
-                    'content': chunk['content'][:200] + '...',
-                    'score': score
-                }
-                for chunk, score in retrieved_chunks
-            ]
-            
-            return {
-                'question': question,
-                'answer': answer,
-                'sources': sources,
-                'model': self.model,
-                'tokens_used': response.usage.input_tokens + response.usage.output_tokens
-            }
+            return self._result(question, retrieved_chunks, response)
         
         except Exception as e:
-            return {
-                'question': question,
-                'answer': f"Error: {str(e)}",
-                'sources': [],
-                'model': self.model,
-                'tokens_used': 0
-            }
+            return self._error_result(question, e)
+    
+    async def agenerate(
+        self,
+        question: str,
+        retrieved_chunks: List[Tuple[Dict, float]],
+        max_tokens: int = 500
+    ) -> Dict:
+        """generate() without blocking the event loop while the model answers"""
+        try:
+            response = await self.async_client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=self.system_prompt,
+                messages=[{"role": "user", "content": self._user_prompt(question, retrieved_chunks)}]
+            )
+            return self._result(question, retrieved_chunks, response)
+        
+        except Exception as e:
+            return self._error_result(question, e)
+    
+    async def astream(
+        self,
+        question: str,
+        retrieved_chunks: List[Tuple[Dict, float]],
+        max_tokens: int = 500
+    ) -> AsyncIterator[Tuple[str, object]]:
+        """Yield ('token', text) as the model writes the answer, then ('done', usage dict).
+
+        Errors end the stream with ('error', message) instead of raising, like
+        generate() reports them in the answer.
+        """
+        try:
+            async with self.async_client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=self.system_prompt,
+                messages=[{"role": "user", "content": self._user_prompt(question, retrieved_chunks)}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield 'token', text
+                message = await stream.get_final_message()
+        
+        except Exception as e:
+            yield 'error', f"Error: {str(e)}"
+            return
+        
+        yield 'done', {
+            'model': self.model,
+            'tokens_used': message.usage.input_tokens + message.usage.output_tokens
+        }
+    
+    async def aclose(self):
+        await self.async_client.close()
@@ -0,0 +1,74 @@
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+import json
+import os
+from .records import ChunkRecord, to_plain
+
+# Binary columnar store (retrieval.chunk_store.ChunkStore) is the default ingestion output;
+# JSON Lines and the original chunks.json array are still accepted as input
+DEFAULT_CHUNKS_PATH = Path('data/processed/chunk_store')
+JSONL_CHUNKS_PATH = Path('data/processed/chunks.jsonl')
+LEGACY_CHUNKS_PATH = Path('data/processed/chunks.json')
+
+
+def is_chunk_store(path: str) -> bool:
+    return (Path(path) / 'store.json').exists()
+
+
+def open_chunk_store(path: str):
+    """Zero-copy, memory-mapped view of a columnar chunk store"""
+    from retrieval.chunk_store import ChunkStore
+    return ChunkStore(path)
+
+
+def write_chunk_store(chunks: Iterable[Dict], path: str, compress: bool = False) -> int:
+    """Stream chunks into a columnar chunk store; returns the count"""
+    from retrieval.chunk_store import ChunkStore
+    return len(ChunkStore.write(chunks, path, compress=compress))
+
+
+def write_chunks_jsonl(chunks: Iterable[Dict], path: str) -> int:
+    """Stream chunks to a JSON Lines file (one compact record per line); returns the count"""
+    output_path = Path(path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f'.{output_path.name}.tmp')
+
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(json.dumps(to_plain(chunk), ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+
+    # Only replace the previous output once the new one is complete
+    os.replace(tmp_path, output_path)
+    return count
+
+
+def iter_chunks_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield ChunkRecord.from_dict(json.loads(line))
+
+
+def iter_chunks(path: str) -> Iterator[Dict]:
+    """Chunks from a chunk store or .jsonl file, streamed, or from a legacy chunks.json array"""
+    if is_chunk_store(path):
+        yield from open_chunk_store(path)
+    elif Path(path).suffix == '.jsonl':
+        yield from iter_chunks_jsonl(path)
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield from map(ChunkRecord.from_dict, json.load(f))
+
+
+def find_chunks_file(path: str = DEFAULT_CHUNKS_PATH) -> Path:
+    """The requested chunks path; for the default, fall back to older ingestion outputs"""
+    chunks_path = Path(path)
+    if chunks_path == DEFAULT_CHUNKS_PATH and not is_chunk_store(chunks_path):
+        for fallback in (JSONL_CHUNKS_PATH, LEGACY_CHUNKS_PATH):
+            if fallback.exists():
+                return fallback
+    return chunks_path
+
@@ -1,7 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
 import re
 import logging
 from pathlib import Path
+from .records import ChunkRecord, ChunkMetadata
+from .chunk_io import write_chunk_store
 
 logger = logging.getLogger(__name__)
 
@@ -31,52 +33,54 @@ class DocumentChunker:
         
         return chunks
     
-    def chunk_document(self, document: Dict) -> List[Dict]:
+    def chunk_document(self, document: Dict) -> List[ChunkRecord]:
         content = document.get('content', '')
         text_chunks = self.chunk_text(content)
         
         chunk_docs = []
         for idx, chunk_text in enumerate(text_chunks):
-            chunk_doc = {
-                'chunk_id': f"{document['id']}_chunk_{idx}",
-                'doc_id': document['id'],
-                'doc_title': document.get('title', ''),
-                'chunk_index': idx,
-                'content': chunk_text,
-                'metadata': {
-                    'total_chunks': len(text_chunks),
-                    'char_count': len(chunk_text),
-                    'word_count': len(chunk_text.split())
-                }
-            }
+            chunk_doc = ChunkRecord(
+                chunk_id=f"{document['id']}_chunk_{idx}",
+                doc_id=document['id'],
+                doc_title=document.get('title', ''),
+                chunk_index=idx,
+                content=chunk_text,
+                metadata=ChunkMetadata(
+                    total_chunks=len(text_chunks),
+                    char_count=len(chunk_text),
+                    word_count=len(chunk_text.split())
+                )
+            )
             chunk_docs.append(chunk_doc)
-        
         return chunk_docs
     
-    def chunk_documents(self, documents: List[Dict]) -> List[Dict]:
-        all_chunks = []
+    def iter_chunks(self, documents: Iterable[Dict]) -> Iterator[Dict]:
+        """Lazily chunk a stream of documents, one document in memory at a time"""
+        num_docs = num_chunks = 0
         
         for doc in documents:
-            chunks = self.chunk_document(doc)
-            all_chunks.extend(chunks)
+            num_docs += 1
+            for chunk in self.chunk_document(doc):
+                num_chunks += 1
+                yield chunk
         
-        logger.info(f"✅ Created {len(all_chunks)} chunks from {len(documents)} documents")
-        return all_chunks
+        logger.info(f"✅ Created {num_chunks} chunks from {num_docs} documents")
+    
+    def chunk_documents(self, documents: List[Dict]) -> List[Dict]:
+        return list(self.iter_chunks(documents))
+    
+    def write_store(self, documents: Iterable[Dict], path: str, compress: bool = False) -> int:
+        """Chunk documents straight into a binary columnar chunk store; returns the chunk count"""
+        return write_chunk_store(self.iter_chunks(documents), path, compress=compress)
 
 if __name__ == '__main__':
-    from loader import DocumentLoader
-    import json
+    # Run from src/ as: python -m ingestion.chunker
+    from ingestion.loader import DocumentLoader
     
     loader = DocumentLoader('data/raw/arxiv')
-    docs = loader.load_all()
-    
     chunker = DocumentChunker(chunk_size=1024, chunk_overlap=128)
-    chunks = chunker.chunk_documents(docs)
-    
-    output_path = Path('data/processed/chunks.json')
-    output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(output_path, 'w') as f:
-        json.dump(chunks, f, indent=2)
+    output_path = Path('data/processed/chunk_store')
+    count = chunker.write_store(loader.iter_documents(), output_path)
     
-    print(f"✅ Saved {len(chunks)} chunks to {output_path}")
\ No newline at end of file
+    print(f"✅ Saved {count} chunks to {output_path}")
\ No newline at end of file
@@ -0,0 +1,181 @@
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+import json
+import logging
+import re
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ('drop', 'cluster')
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Shingles hashed per vectorized pass: bounds the (num_perm, shingles) uint64
+# working array to ~8 MB at num_perm=128, whatever the batch size
+SIGNATURE_BLOCK_SHINGLES = 8192
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose LSH S-curve midpoint (1/b)^(1/r) is closest below threshold"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class MinHashDeduplicator:
+    """Streaming near-duplicate filter for chunks using MinHash + LSH banding.
+
+    Chunks are shingled into word n-grams and hashed; signatures for a batch
+    are computed in vectorized passes over blocks of chunks (num_perm
+    universal hash functions over the block's shingles, min-reduced per
+    chunk). Each signature is split into
+    bands, and a chunk sharing any band with an earlier kept chunk is
+    compared with it on the full signature; an estimated Jaccard similarity
+    at or above threshold marks it as a duplicate of that chunk.
+
+    mode='drop' discards duplicates; mode='cluster' also discards them from
+    the output but records each one under its representative (see clusters).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        mode: str = 'drop',
+        batch_size: int = 1024,
+        seed: int = 1
+    ):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"❌ Unknown dedup mode '{mode}' (expected one of {DEDUP_MODES})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.mode = mode
+        self.batch_size = batch_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+        self._buckets: List[Dict[bytes, int]] = [{} for _ in range(self.bands)]
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._num_kept = 0
+        self._kept_ids: List[str] = []
+        self.clusters: Dict[str, List[str]] = {}
+        self.stats = {'chunks_in': 0, 'chunks_out': 0, 'duplicates': 0, 'chars_in': 0, 'chars_removed': 0}
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        words = re.findall(r'\w+', text.lower())
+        n = self.shingle_size
+        shingles = {' '.join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1 if words else 0))}
+        return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), num_perm) uint32 MinHash signatures; texts with no words get all-max rows"""
+        hashes = [self._shingle_hashes(text) for text in texts]
+        lengths = np.array([len(h) for h in hashes], dtype=np.int64)
+        signatures = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint64)
+
+        nonempty = np.flatnonzero(lengths)
+        offsets = np.concatenate([[0], np.cumsum(lengths[nonempty])])
+        start = 0
+        while start < len(nonempty):
+            # As many whole chunks as fit in one block (a longer chunk gets a block to itself)
+            end = int(np.searchsorted(offsets, offsets[start] + SIGNATURE_BLOCK_SHINGLES, side='right')) - 1
+            end = max(end, start + 1)
+            rows = nonempty[start:end]
+            flat = np.concatenate([hashes[i] for i in rows])
+            # (num_perm, block shingles) permuted hashes, computed in place, min-reduced per chunk
+            permuted = self._a * flat[None, :]
+            permuted += self._b
+            np.remainder(permuted, _MERSENNE_PRIME, out=permuted)
+            permuted &= _MAX_HASH
+            signatures[rows] = np.minimum.reduceat(permuted, offsets[start:end] - offsets[start], axis=1).T
+            start = end
+        return signatures.astype(np.uint32)
+
+    def _find_duplicate(self, signature: np.ndarray) -> Tuple[Optional[int], List[bytes]]:
+        keys = [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+        candidates = {self._buckets[b][key] for b, key in enumerate(keys) if key in self._buckets[b]}
+        if not candidates:
+            return None, keys
+
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] >= self.threshold:
+            return int(candidates[best]), keys
+        return None, keys
+
+    def _keep(self, signature: np.ndarray, keys: List[bytes], chunk_id: str):
+        row = self._num_kept
+        if row == len(self._signatures):
+            grown = np.zeros((max(2 * row, 1024), self.num_perm), dtype=np.uint32)
+            grown[:row] = self._signatures[:row]
+            self._signatures = grown
+        self._signatures[row] = signature
+        for b, key in enumerate(keys):
+            self._buckets[b].setdefault(key, row)
+        self._kept_ids.append(chunk_id)
+        self._num_kept += 1
+
+    def filter(self, chunks: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield the chunks that are not near-duplicates of an earlier chunk, in order"""
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == self.batch_size:
+                yield from self._filter_batch(batch)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch)
+
+        logger.info(
+            f"✅ Dedup kept {self.stats['chunks_out']} of {self.stats['chunks_in']} chunks "
+            f"({self.stats['duplicates']} near-duplicates removed)"
+        )
+
+    def _filter_batch(self, batch: List[Dict]) -> Iterator[Dict]:
+        signatures = self.signatures([chunk['content'] for chunk in batch])
+        empty = np.all(signatures == np.uint32(_MAX_HASH), axis=1)
+
+        for chunk, signature, is_empty in zip(batch, signatures, empty):
+            self.stats['chunks_in'] += 1
+            self.stats['chars_in'] += len(chunk['content'])
+
+            duplicate_of, keys = (None, []) if is_empty else self._find_duplicate(signature)
+            if duplicate_of is None:
+                if not is_empty:
+                    self._keep(signature, keys, chunk['chunk_id'])
+                self.stats['chunks_out'] += 1
+                yield chunk
+                continue
+
+            self.stats['duplicates'] += 1
+            self.stats['chars_removed'] += len(chunk['content'])
+            if self.mode == 'cluster':
+                self.clusters.setdefault(self._kept_ids[duplicate_of], []).append(chunk['chunk_id'])
+
+    def report(self, dimension: int = 384) -> Dict:
+        """What dedup saved, including the FAISS (float32) and text bytes not indexed"""
+        duplicates = self.stats['duplicates']
+        return {
+            **self.stats,
+            'duplicate_ratio': duplicates / max(self.stats['chunks_in'], 1),
+            'vector_bytes_saved': duplicates * dimension * 4,
+            'text_chars_saved_ratio': self.stats['chars_removed'] / max(self.stats['chars_in'], 1)
+        }
+
+    def save_clusters(self, path: str):
+        output_path = Path(path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump(self.clusters, f, indent=2)
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator
 import json
 import logging
 
@@ -15,22 +15,30 @@ class DocumentLoader:
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def load_all(self) -> List[Dict]:
-        documents = []
+    def files(self) -> List[Path]:
+        """All raw document files, in a stable order"""
+        return sorted(self.data_dir.rglob('*.json'))
+    
+    def iter_documents(self) -> Iterator[Dict]:
+        """Yield documents one at a time so callers never hold the whole corpus"""
+        count = 0
         
-        for filepath in self.data_dir.rglob('*.json'):
+        for filepath in self.files():
             try:
                 doc = self.load_json(filepath)
-                documents.append(doc)
-                
-                if len(documents) % 50 == 0:
-                    logger.info(f"Loaded {len(documents)} documents...")
-            
             except Exception as e:
                 logger.error(f"Error loading {filepath}: {e}")
+                continue
+            
+            count += 1
+            if count % 50 == 0:
+                logger.info(f"Loaded {count} documents...")
+            yield doc
         
-        logger.info(f"✅ Loaded {len(documents)} documents total")
-        return documents
+        logger.info(f"✅ Loaded {count} documents total")
+    
+    def load_all(self) -> List[Dict]:
+        return list(self.iter_documents())
 
 if __name__ == '__main__':
     loader = DocumentLoader('data/raw/arxiv')
@@ -0,0 +1,106 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Iterator, Optional, Tuple
+import logging
+import os
+
+from .loader import DocumentLoader
+from .chunker import DocumentChunker
+
+logger = logging.getLogger(__name__)
+
+# Per-process state set up once by the pool initializer
+_worker_loader: Optional[DocumentLoader] = None
+_worker_chunker: Optional[DocumentChunker] = None
+
+
+def _init_worker(chunk_size: int, chunk_overlap: int):
+    global _worker_loader, _worker_chunker
+    _worker_loader = DocumentLoader()
+    _worker_chunker = DocumentChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _process_files(filepaths: List[str]) -> List[Tuple[str, List[Dict], Optional[str]]]:
+    """Load and chunk a shard of files: (path, chunks, error) per file, in shard order"""
+    results = []
+    for filepath in filepaths:
+        try:
+            doc = _worker_loader.load_json(Path(filepath))
+            results.append((filepath, _worker_chunker.chunk_document(doc), None))
+        except Exception as e:
+            results.append((filepath, [], f"{type(e).__name__}: {e}"))
+    return results
+
+
+class ParallelIngestor:
+    """Load and chunk the raw document tree on a process pool.
+
+    The sorted file list is cut into small shards that workers parse and
+    chunk independently. Shards are collected in submission order with a
+    bounded number in flight, so the chunk stream is identical to a serial
+    run (same order, same chunks) and memory stays bounded by the window.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "data/raw",
+        workers: Optional[int] = None,
+        chunk_size: int = 1024,
+        chunk_overlap: int = 128,
+        files_per_task: int = 16
+    ):
+        self.loader = DocumentLoader(data_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.files_per_task = files_per_task
+        self.errors: List[Tuple[str, str]] = []
+        self.num_documents = 0
+
+    def iter_chunks(self) -> Iterator[Dict]:
+        files = [str(filepath) for filepath in self.loader.files()]
+        shards = [files[i:i + self.files_per_task] for i in range(0, len(files), self.files_per_task)]
+        logger.info(f"Ingesting {len(files)} files with {self.workers} workers ({len(shards)} shards)")
+
+        self.errors = []
+        self.num_documents = 0
+        num_chunks = 0
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.chunk_size, self.chunk_overlap)
+        ) as executor:
+            pending = deque()
+            shard_iter = iter(shards)
+            max_in_flight = self.workers * 2
+
+            def submit_next():
+                shard = next(shard_iter, None)
+                if shard is not None:
+                    pending.append(executor.submit(_process_files, shard))
+
+            for _ in range(max_in_flight):
+                submit_next()
+
+            while pending:
+                results = pending.popleft().result()
+                submit_next()
+
+                for filepath, chunks, error in results:
+                    if error is not None:
+                        logger.error(f"Error loading {filepath}: {error}")
+                        self.errors.append((filepath, error))
+                        continue
+
+                    self.num_documents += 1
+                    if self.num_documents % 50 == 0:
+                        logger.info(f"Loaded {self.num_documents} documents...")
+                    num_chunks += len(chunks)
+                    yield from chunks
+
+        logger.info(
+            f"✅ Created {num_chunks} chunks from {self.num_documents} documents"
+            f" ({len(self.errors)} files failed)"
+        )
@@ -0,0 +1,126 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+import sys
+
+
+class ChunkMetadata(Mapping):
+    """Read-only {'total_chunks', 'char_count', 'word_count'} mapping stored in slots"""
+
+    __slots__ = ('total_chunks', 'char_count', 'word_count')
+
+    def __init__(self, total_chunks: int, char_count: int, word_count: int):
+        self.total_chunks = total_chunks
+        self.char_count = char_count
+        self.word_count = word_count
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class ChunkRecord(Mapping):
+    """Compact chunk that reads like the chunker's chunk dict.
+
+    Fields live in __slots__ instead of a per-chunk dict, doc ids and titles
+    are interned so every chunk of a document shares one string, and the
+    chunk id is only stored when it differs from "<doc_id>_chunk_<index>".
+    Supports chunk['content'], .get, `in`, iteration, ==, dict(chunk) and
+    assignment to existing keys; use to_dict() where a real dict is needed
+    (e.g. JSON).
+    """
+
+    __slots__ = ('doc_id', 'doc_title', 'chunk_index', 'content', 'metadata', '_chunk_id')
+    KEYS = ('chunk_id', 'doc_id', 'doc_title', 'chunk_index', 'content', 'metadata')
+
+    def __init__(
+        self,
+        chunk_id: Optional[str],
+        doc_id: str,
+        doc_title: str,
+        chunk_index: int,
+        content: str,
+        metadata: ChunkMetadata
+    ):
+        self.doc_id = sys.intern(doc_id) if type(doc_id) is str else doc_id
+        self.doc_title = sys.intern(doc_title) if type(doc_title) is str else doc_title
+        self.chunk_index = chunk_index
+        self.content = content
+        self.metadata = metadata
+        self._chunk_id = None
+        if chunk_id is not None:
+            self.chunk_id = chunk_id
+
+    @property
+    def chunk_id(self) -> str:
+        if self._chunk_id is not None:
+            return self._chunk_id
+        return f"{self.doc_id}_chunk_{self.chunk_index}"
+
+    @chunk_id.setter
+    def chunk_id(self, value: str):
+        self._chunk_id = None if value == f"{self.doc_id}_chunk_{self.chunk_index}" else value
+
+    def __getitem__(self, key: str):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in self.KEYS:
+            raise KeyError(f"{key} (chunk records have a fixed set of fields)")
+        chunk_id = self.chunk_id
+        setattr(self, key, value)
+        if key in ('doc_id', 'chunk_index'):
+            # Keep an explicit id explicit once its derivation changes
+            self.chunk_id = chunk_id
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        chunk = {key: getattr(self, key) for key in self.KEYS}
+        if isinstance(self.metadata, ChunkMetadata):
+            chunk['metadata'] = self.metadata.to_dict()
+        return chunk
+
+    @classmethod
+    def from_dict(cls, chunk: Mapping):
+        """A ChunkRecord for a standard chunk dict; anything else is returned unchanged"""
+        if isinstance(chunk, ChunkRecord):
+            return chunk
+        metadata = chunk.get('metadata')
+        if not (
+            list(chunk) == list(cls.KEYS)
+            and isinstance(metadata, Mapping) and list(metadata) == list(ChunkMetadata.__slots__)
+        ):
+            return chunk
+        return cls(
+            chunk['chunk_id'], chunk['doc_id'], chunk['doc_title'], chunk['chunk_index'],
+            chunk['content'], ChunkMetadata(**metadata)
+        )
+
+
+def to_plain(chunk: Mapping) -> Dict:
+    """Chunk as plain dicts all the way down, for serializers"""
+    if isinstance(chunk, ChunkRecord):
+        return chunk.to_dict()
+    return dict(chunk)
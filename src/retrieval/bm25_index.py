@@ -0,0 +1,363 @@
+import numpy as np
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable, Optional
+import json
+import math
+import mmap
+from pathlib import Path
+from .index_format import atomic_path, save_array
+
+ARRAY_NAMES = ('offsets', 'post_docs', 'post_weights', 'idf', 'max_weight', 'doc_len')
+
+
+class TermDictionary:
+    """Read-only term -> id lookup over a memory-mapped, byte-sorted term list.
+
+    Term ids are positions in sorted order, so lookup is a binary search and
+    nothing but the offsets array needs to be paged in at load time.
+    """
+
+    def __init__(self, terms_path: Path, offsets_path: Path):
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        with open(terms_path, 'rb') as f:
+            self._blob = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if terms_path.stat().st_size else b''
+            )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _term(self, term_id: int) -> bytes:
+        return self._blob[int(self.offsets[term_id]):int(self.offsets[term_id + 1])]
+
+    def term(self, term_id: int) -> str:
+        return self._term(term_id).decode('utf-8')
+
+    def get(self, term: str, default=None):
+        key = term.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._term(lo) == key:
+            return lo
+        return default
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def __getitem__(self, term: str) -> int:
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    @staticmethod
+    def write(terms: List[str], terms_path: Path, offsets_path: Path):
+        encoded = [term.encode('utf-8') for term in terms]
+        with atomic_path(terms_path) as tmp_path, open(tmp_path, 'wb') as f:
+            f.write(b''.join(encoded))
+        save_array(offsets_path, np.concatenate([[0], np.cumsum([len(t) for t in encoded])]).astype(np.int64))
+
+
+class CorpusStats:
+    """Corpus-wide document frequencies and lengths for BM25.
+
+    Indexes built over disjoint parts of one corpus (shards) score with these
+    instead of their local statistics, so their scores are directly comparable.
+    """
+
+    def __init__(self, epsilon: float = 0.25):
+        self.epsilon = epsilon
+        self.df: Counter = Counter()
+        self.num_docs = 0
+        self.total_len = 0
+        self._idf_floor = None
+
+    def add(self, tokens: List[str]):
+        self.df.update(set(tokens))
+        self.num_docs += 1
+        self.total_len += len(tokens)
+        self._idf_floor = None
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / self.num_docs if self.num_docs else 0.0
+
+    def _raw_idf(self, df: np.ndarray) -> np.ndarray:
+        return np.log(self.num_docs - df + 0.5) - np.log(df + 0.5)
+
+    @property
+    def idf_floor(self) -> float:
+        if self._idf_floor is None:
+            idf = self._raw_idf(np.fromiter(self.df.values(), dtype=np.float64, count=len(self.df)))
+            self._idf_floor = max(self.epsilon * float(idf.mean()), 0.0) if len(idf) else 0.0
+        return self._idf_floor
+
+    def idf(self, terms: List[str]) -> np.ndarray:
+        idf = self._raw_idf(np.array([self.df[t] for t in terms], dtype=np.float64))
+        return np.where(idf < 0, self.idf_floor, idf).astype(np.float32)
+
+
+class BM25Index:
+    """Inverted-index BM25 (Okapi) with MaxScore-style pruned top-k.
+
+    Postings are stored CSR-style: for term t, post_docs[offsets[t]:offsets[t+1]]
+    are the (sorted, int32) doc ids containing t and post_weights holds the
+    precomputed tf-saturation part of the BM25 formula for each posting. A
+    query score is then sum(idf[t] * weight) over the query terms, and
+    idf[t] * max_weight[t] is an upper bound on what term t can add to any
+    document. Scores match rank_bm25.BM25Okapi.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_weights = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.max_weight = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.avgdl = 0.0
+        self.idf_floor = 0.0
+        self._loaded_from = None
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_len)
+
+    def build(self, tokenized_docs: Iterable[List[str]], corpus_stats: Optional[CorpusStats] = None):
+        """Index tokenized docs; corpus_stats replaces local idf and avgdl (sharded builds)"""
+        term_ids, doc_ids, tfs, doc_len = [], [], [], []
+
+        for doc_id, tokens in enumerate(tokenized_docs):
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        # Renumber terms in UTF-8 byte order so the saved vocabulary is binary-searchable
+        terms = sorted(self.vocab, key=lambda t: t.encode('utf-8'))
+        remap = np.empty(len(terms), dtype=np.int32)
+        remap[[self.vocab[t] for t in terms]] = np.arange(len(terms), dtype=np.int32)
+        self.vocab = {term: i for i, term in enumerate(terms)}
+
+        term_ids = remap[np.array(term_ids, dtype=np.int32)] if term_ids else np.zeros(0, dtype=np.int32)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+        self.doc_len = np.array(doc_len, dtype=np.float32)
+        if corpus_stats is not None:
+            self.avgdl = corpus_stats.avgdl
+        else:
+            self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+        # Group postings by term; the stable sort keeps doc ids ascending inside each list
+        order = np.argsort(term_ids, kind='stable')
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self.offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.post_docs = doc_ids
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_ids] / max(self.avgdl, 1e-9))
+        self.post_weights = (tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        self.max_weight = (
+            np.maximum.reduceat(self.post_weights, self.offsets[:-1])
+            if len(self.post_weights) else np.zeros(len(self.vocab), dtype=np.float32)
+        ).astype(np.float32)
+
+        if corpus_stats is not None:
+            self.idf = corpus_stats.idf(terms)
+            self.idf_floor = corpus_stats.idf_floor
+        else:
+            self.idf = self._compute_idf(df, self.num_docs)
+
+    def _compute_idf(self, df: np.ndarray, num_docs: int) -> np.ndarray:
+        idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+        # Same floor as BM25Okapi for terms in more than half the corpus; clamped at 0
+        # so every term contributes non-negatively, which the pruning relies on
+        self.idf_floor = max(self.epsilon * float(idf.mean()), 0.0) if len(idf) else 0.0
+        return np.where(idf < 0, self.idf_floor, idf).astype(np.float32)
+
+    def df(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return 0
+        return int(self.offsets[term_id + 1] - self.offsets[term_id])
+
+    def term_idf(self, df: int, num_docs: int) -> float:
+        """BM25Okapi idf for externally supplied (e.g. multi-segment) statistics"""
+        idf = math.log(num_docs - df + 0.5) - math.log(df + 0.5)
+        return idf if idf >= 0 else self.idf_floor
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.post_docs[start:end], self.post_weights[start:end]
+
+    def search(
+        self,
+        tokens: List[str],
+        k: int = 5,
+        allowed: Optional[np.ndarray] = None,
+        idf: Optional[Dict[str, float]] = None,
+        allowed_docs: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (doc_ids, scores) for a tokenized query, best first.
+
+        Terms are processed in decreasing upper-bound order. Once the current
+        k-th best score beats the summed upper bounds of all remaining terms,
+        no unseen document can make the cut, so remaining postings are only
+        probed for the surviving candidates instead of being merged in full.
+
+        allowed is an optional boolean mask over doc ids; idf optionally
+        overrides this index's own idf per term (used when several segments
+        share corpus-wide statistics). When the sorted allowed doc ids are
+        also given (a selective filter), only those documents are scored.
+        """
+        query_terms = Counter(t for t in tokens if t in self.vocab)
+        if not query_terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        term_ids = np.array([self.vocab[t] for t in query_terms], dtype=np.int64)
+        term_idf = (
+            self.idf[term_ids] if idf is None
+            else np.array([idf[t] for t in query_terms], dtype=np.float32)
+        )
+        term_weights = term_idf * np.array(list(query_terms.values()), dtype=np.float32)
+        upper_bounds = term_weights * self.max_weight[term_ids]
+
+        if allowed_docs is not None:
+            return self._search_within(term_ids, term_weights, k, allowed, allowed_docs)
+
+        order = np.argsort(-upper_bounds, kind='stable')
+        term_ids, term_weights, upper_bounds = term_ids[order], term_weights[order], upper_bounds[order]
+        remaining = np.concatenate([np.cumsum(upper_bounds[::-1])[::-1], [0.0]])
+
+        cand_docs = np.zeros(0, dtype=np.int32)
+        cand_scores = np.zeros(0, dtype=np.float32)
+        threshold = -np.inf
+
+        for i, (term_id, weight) in enumerate(zip(term_ids, term_weights)):
+            docs, weights = self._postings(term_id)
+            contrib = weight * weights
+            if allowed is not None:
+                keep = allowed[docs]
+                docs, contrib = docs[keep], contrib[keep]
+            if not len(docs):
+                continue
+
+            if len(cand_docs) >= k and threshold >= remaining[i]:
+                # Non-essential term: only candidates already in play can still gain
+                pos = np.searchsorted(docs, cand_docs)
+                pos[pos == len(docs)] = 0
+                hit = docs[pos] == cand_docs
+                cand_scores[hit] += contrib[pos[hit]]
+            else:
+                merged = np.concatenate([cand_docs, docs])
+                cand_docs, inverse = np.unique(merged, return_inverse=True)
+                cand_scores = np.bincount(
+                    inverse,
+                    weights=np.concatenate([cand_scores, contrib]),
+                    minlength=len(cand_docs)
+                ).astype(np.float32)
+                cand_docs = cand_docs.astype(np.int32)
+
+            if len(cand_docs) >= k:
+                threshold = np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k]
+                # Drop candidates that cannot reach the k-th best even with every remaining term
+                keep = cand_scores + remaining[i + 1] >= threshold
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        k_eff = min(k, len(cand_docs))
+        if k_eff == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-cand_scores, k_eff - 1)[:k_eff]
+        top = top[np.argsort(-cand_scores[top], kind='stable')]
+        return cand_docs[top].astype(np.int64), cand_scores[top]
+
+    def _search_within(
+        self,
+        term_ids: np.ndarray,
+        term_weights: np.ndarray,
+        k: int,
+        allowed: np.ndarray,
+        allowed_docs: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Exhaustive scoring restricted to allowed_docs.
+
+        Per term, either the allowed docs are binary-searched in the postings
+        or the postings are masked, whichever touches fewer entries, so the
+        cost follows the filter size rather than the posting list lengths.
+        """
+        scores = np.zeros(len(allowed_docs), dtype=np.float32)
+        matched = np.zeros(len(allowed_docs), dtype=bool)
+        for term_id, weight in zip(term_ids, term_weights):
+            docs, weights = self._postings(term_id)
+            if not len(docs):
+                continue
+            if len(allowed_docs) * 8 < len(docs):
+                pos = np.searchsorted(docs, allowed_docs)
+                pos[pos == len(docs)] = 0
+                hit = docs[pos] == allowed_docs
+                scores[hit] += weight * weights[pos[hit]]
+            else:
+                keep = allowed[docs]
+                hit = np.searchsorted(allowed_docs, docs[keep])
+                scores[hit] += weight * weights[keep]
+            matched[hit] = True
+
+        cand = np.flatnonzero(matched)
+        k_eff = min(k, len(cand))
+        if k_eff == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = cand[np.argpartition(-scores[cand], k_eff - 1)[:k_eff]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return allowed_docs[top].astype(np.int64), scores[top]
+
+    def save(self, path: str):
+        """Write flat .npy arrays and a sorted term list, all loadable with mmap"""
+        save_path = Path(path)
+        save_path.mkdir(parents=True, exist_ok=True)
+        if self._loaded_from == save_path.resolve():
+            # Loaded indexes are immutable and still mapped from these very files
+            return
+
+        for name in ARRAY_NAMES:
+            save_array(save_path / f'bm25_{name}.npy', getattr(self, name))
+
+        if isinstance(self.vocab, dict):
+            terms = sorted(self.vocab, key=self.vocab.get)
+        else:
+            terms = [self.vocab.term(i) for i in range(len(self.vocab))]
+        TermDictionary.write(terms, save_path / 'bm25_terms.bin', save_path / 'bm25_term_offsets.npy')
+
+        with atomic_path(save_path / 'bm25_meta.json') as tmp_path, open(tmp_path, 'w') as f:
+            json.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'epsilon': self.epsilon,
+                'avgdl': self.avgdl,
+                'idf_floor': self.idf_floor
+            }, f)
+
+    def load(self, path: str, mmap_arrays: bool = True):
+        load_path = Path(path)
+
+        with open(load_path / 'bm25_meta.json') as f:
+            meta = json.load(f)
+        self.k1, self.b, self.epsilon = meta['k1'], meta['b'], meta['epsilon']
+        self.avgdl = meta['avgdl']
+        self.idf_floor = meta.get('idf_floor', 0.0)
+
+        mmap_mode = 'r' if mmap_arrays else None
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(load_path / f'bm25_{name}.npy', mmap_mode=mmap_mode))
+        self.vocab = TermDictionary(load_path / 'bm25_terms.bin', load_path / 'bm25_term_offsets.npy')
+        self._loaded_from = load_path.resolve()
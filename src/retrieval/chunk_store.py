@@ -0,0 +1,415 @@
+import numpy as np
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+import json
+import mmap
+import shutil
+import threading
+import zlib
+from pathlib import Path
+from .index_format import atomic_path, save_array
+
+# int32 columns: a top-level chunk field and the counts in the chunk's metadata dict
+INT_COLUMNS = ('chunk_index',)
+META_COLUMNS = ('total_chunks', 'char_count', 'word_count')
+MISSING = -1
+
+
+def _map(filepath: Path):
+    with open(filepath, 'rb') as f:
+        if filepath.stat().st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _is_count(value) -> bool:
+    return type(value) is int and 0 <= value < 2 ** 31
+
+
+class StringTable:
+    """Memory-mapped list of strings: a UTF-8 blob plus int64 offsets"""
+
+    def __init__(self, blob_path: Path, offsets_path: Path):
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self._blob = _map(blob_path)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8')
+
+    @staticmethod
+    def write(strings: Iterable[str], blob_path: Path, offsets_path: Path):
+        offsets = array('q', [0])
+        with atomic_path(blob_path) as tmp_path, open(tmp_path, 'wb') as f:
+            for string in strings:
+                data = string.encode('utf-8')
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+        save_array(offsets_path, np.frombuffer(offsets, dtype=np.int64))
+
+
+class ChunkStore:
+    """Read-only, memory-mapped, columnar chunk storage addressed by integer row id.
+
+    Layout of a store directory:
+        store.json            - chunk count, layout, compression, block size
+        text.bin              - chunk contents (UTF-8), optionally zlib-compressed in blocks
+        text_offsets.npy      - int64 offsets of every chunk in the uncompressed text stream
+        block_offsets.npy     - int64 offsets of every compressed block in text.bin
+        doc_ids.bin, doc_titles.bin (+ _offsets.npy) - one entry per document
+        col_doc.npy           - int32 document number of every chunk
+        col_<field>.npy       - int32 chunk_index and metadata counts (-1 = absent)
+        extra.bin (+ extra_offsets.npy) - JSON for fields outside the columns; empty for ingested chunks
+        segments/<n>/         - rows appended since the last full write, each a store of this layout
+
+    chunk_id is not stored when it is the usual "<doc_id>_chunk_<chunk_index>".
+    Only the offset and column arrays are mapped at open time; a chunk's text
+    is read (and decompressed) when the chunk is requested, so resident
+    memory does not grow with the corpus text. Stores from before the
+    columnar layout (one JSON record per chunk in meta.bin) stay readable.
+
+    Rows added with append() are held in memory after the mapped rows until
+    the store is persisted again, which writes them as a new segment; a full
+    write (compact=True in persist) folds the segments back in.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+        with open(self.path / 'store.json') as f:
+            info = json.load(f)
+        self.num_chunks = info['num_chunks']
+        self.compression = info['compression']
+        self.block_size = info['block_size']
+        self.layout = info.get('layout', 'records')
+
+        self.text_offsets = np.load(self.path / 'text_offsets.npy', mmap_mode='r')
+        self.block_offsets = np.load(self.path / 'block_offsets.npy', mmap_mode='r')
+        self._text = _map(self.path / 'text.bin')
+
+        if self.layout == 'columnar':
+            self.doc_ids = StringTable(self.path / 'doc_ids.bin', self.path / 'doc_id_offsets.npy')
+            self.doc_titles = StringTable(self.path / 'doc_titles.bin', self.path / 'doc_title_offsets.npy')
+            self.extras = StringTable(self.path / 'extra.bin', self.path / 'extra_offsets.npy')
+            self.columns = {
+                name: np.load(self.path / f'col_{name}.npy', mmap_mode='r')
+                for name in ('doc',) + INT_COLUMNS + META_COLUMNS
+            }
+        else:
+            self.meta_offsets = np.load(self.path / 'meta_offsets.npy', mmap_mode='r')
+            self._meta = _map(self.path / 'meta.bin')
+
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        self._blocks_lock = threading.Lock()
+        self._max_cached_blocks = 64
+
+        self.segments = [ChunkStore(self.path / 'segments' / name) for name in info.get('segments', [])]
+        # First row id of every segment, then of the in-memory rows
+        self._segment_starts = [self.num_chunks]
+        for segment in self.segments:
+            self._segment_starts.append(self._segment_starts[-1] + len(segment))
+        self._appended: List[Dict] = []
+
+    @staticmethod
+    def _split(chunk: Dict, doc_numbers: Dict) -> Tuple[List[int], Dict]:
+        """Column values (doc number first) and leftover fields for one chunk"""
+        extra = {
+            key: value for key, value in chunk.items()
+            if key not in ('chunk_id', 'doc_id', 'doc_title', 'content', 'metadata') + INT_COLUMNS
+        }
+        title = chunk.get('doc_title', '')
+        if 'doc_title' not in chunk:
+            extra['_no_title'] = True
+        elif not isinstance(title, str):
+            extra['doc_title'], title = title, ''
+        values = [doc_numbers.setdefault((chunk['doc_id'], title), len(doc_numbers))]
+
+        for name in INT_COLUMNS:
+            value = chunk.get(name, MISSING)
+            if not _is_count(value):
+                if name in chunk:
+                    extra[name] = value
+                value = MISSING
+            values.append(value)
+
+        metadata = chunk.get('metadata')
+        if isinstance(metadata, Mapping):
+            values.extend(metadata[name] if _is_count(metadata.get(name)) else MISSING for name in META_COLUMNS)
+        else:
+            values.extend([MISSING] * len(META_COLUMNS))
+        if 'metadata' not in chunk:
+            extra['_no_metadata'] = True
+        elif not (
+            isinstance(metadata, Mapping) and list(metadata) == list(META_COLUMNS)
+            and all(_is_count(metadata[name]) for name in META_COLUMNS)
+        ):
+            # Anything the columns cannot reproduce exactly (other keys, order, types) is kept verbatim
+            extra['metadata'] = dict(metadata) if isinstance(metadata, Mapping) else metadata
+
+        if chunk['chunk_id'] != f"{chunk['doc_id']}_chunk_{chunk.get('chunk_index')}":
+            extra['chunk_id'] = chunk['chunk_id']
+        return values, extra
+
+    @classmethod
+    def write(
+        cls,
+        chunks: Iterable[Dict],
+        path: str,
+        compress: bool = False,
+        block_size: int = 64
+    ) -> 'ChunkStore':
+        store_path = Path(path)
+        store_path.mkdir(parents=True, exist_ok=True)
+
+        text_offsets, extra_offsets, block_offsets = array('q', [0]), array('q', [0]), array('q', [0])
+        column_names = ('doc',) + INT_COLUMNS + META_COLUMNS
+        columns = [array('i') for _ in column_names]
+        doc_numbers: Dict[Tuple[str, str], int] = {}
+        block = []
+
+        # Every file is swapped in atomically so a reader still mapping the old store is unaffected
+        with atomic_path(store_path / 'text.bin') as text_tmp, atomic_path(store_path / 'extra.bin') as extra_tmp, \
+                open(text_tmp, 'wb') as text_f, open(extra_tmp, 'wb') as extra_f:
+            def flush_block():
+                data = zlib.compress(b''.join(block)) if compress else b''.join(block)
+                text_f.write(data)
+                block_offsets.append(block_offsets[-1] + len(data))
+                block.clear()
+
+            for chunk in chunks:
+                text = chunk['content'].encode('utf-8')
+                block.append(text)
+                text_offsets.append(text_offsets[-1] + len(text))
+
+                values, extra = cls._split(chunk, doc_numbers)
+                for column, value in zip(columns, values):
+                    column.append(value)
+                data = json.dumps(extra, separators=(',', ':')).encode('utf-8') if extra else b''
+                extra_f.write(data)
+                extra_offsets.append(extra_offsets[-1] + len(data))
+
+                if len(block) == block_size:
+                    flush_block()
+            if block:
+                flush_block()
+
+        StringTable.write((doc_id for doc_id, _ in doc_numbers), store_path / 'doc_ids.bin', store_path / 'doc_id_offsets.npy')
+        StringTable.write((title for _, title in doc_numbers), store_path / 'doc_titles.bin', store_path / 'doc_title_offsets.npy')
+        for name, column in zip(column_names, columns):
+            save_array(store_path / f'col_{name}.npy', np.frombuffer(column, dtype=np.int32))
+        save_array(store_path / 'text_offsets.npy', np.frombuffer(text_offsets, dtype=np.int64))
+        save_array(store_path / 'extra_offsets.npy', np.frombuffer(extra_offsets, dtype=np.int64))
+        save_array(store_path / 'block_offsets.npy', np.frombuffer(block_offsets, dtype=np.int64))
+
+        with atomic_path(store_path / 'store.json') as tmp_path, open(tmp_path, 'w') as f:
+            json.dump({
+                'num_chunks': len(text_offsets) - 1,
+                'layout': 'columnar',
+                'compression': 'zlib' if compress else None,
+                'block_size': block_size
+            }, f, indent=2)
+
+        # Files of an older records-layout store, and segments now folded in, are stale
+        for name in ('meta.bin', 'meta_offsets.npy'):
+            (store_path / name).unlink(missing_ok=True)
+        shutil.rmtree(store_path / 'segments', ignore_errors=True)
+
+        return cls(path)
+
+    @classmethod
+    def persist(
+        cls,
+        chunks: Iterable[Dict],
+        path: str,
+        compress: bool = False,
+        compact: bool = False
+    ) -> 'ChunkStore':
+        """Write chunks to path unless they already are the (unmodified) store at path.
+
+        Rows appended to the store at path are written as a new segment, so
+        saving after an update costs the new rows only; compact rewrites the
+        store as a single segment.
+        """
+        store_path = Path(path)
+        if isinstance(chunks, ChunkStore) and chunks.path.resolve() == store_path.resolve():
+            if compact and (chunks._appended or chunks.segments):
+                return cls._replace_dir(store_path, lambda tmp_path: cls.write(
+                    chunks, tmp_path, compress=chunks.compression is not None, block_size=chunks.block_size
+                ))
+            if not chunks._appended:
+                return chunks
+            if chunks.layout == 'columnar':
+                return chunks._write_segment()
+            return cls._replace_dir(store_path, lambda tmp_path: cls.write(
+                chunks, tmp_path, compress=chunks.compression is not None, block_size=chunks.block_size
+            ))
+
+        if (isinstance(chunks, ChunkStore) and not chunks._appended and chunks.layout == 'columnar'
+                and (chunks.compression is not None) == compress and not compact):
+            # Same layout elsewhere on disk: copy the files rather than re-encode every chunk
+            return cls._replace_dir(store_path, lambda tmp_path: shutil.copytree(chunks.path, tmp_path))
+        return cls.write(chunks, path, compress=compress)
+
+    def _write_segment(self) -> 'ChunkStore':
+        """Write the appended rows as a new segment and reopen the store; existing files are untouched"""
+        name = f"{len(self.segments):06d}"
+        segment_path = self.path / 'segments' / name
+        shutil.rmtree(segment_path, ignore_errors=True)
+        ChunkStore.write(
+            self._appended, segment_path,
+            compress=self.compression is not None, block_size=self.block_size
+        )
+
+        with open(self.path / 'store.json') as f:
+            info = json.load(f)
+        info['segments'] = info.get('segments', []) + [name]
+        # Readers pick up the segment only once store.json lists it
+        with atomic_path(self.path / 'store.json') as tmp_path, open(tmp_path, 'w') as f:
+            json.dump(info, f, indent=2)
+        return ChunkStore(self.path)
+
+    @classmethod
+    def _replace_dir(cls, store_path: Path, fill) -> 'ChunkStore':
+        # Build next to the live store and swap directories; open maps keep the old files
+        tmp_path = store_path.with_name(store_path.name + '.tmp')
+        old_path = store_path.with_name(store_path.name + '.old')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+        fill(tmp_path)
+        if store_path.exists():
+            store_path.rename(old_path)
+        tmp_path.rename(store_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return cls(store_path)
+
+    def append(self, chunks: List[Dict]) -> List[int]:
+        """Add chunks after the existing rows and return their row ids"""
+        start = len(self)
+        self._appended.extend(chunks)
+        return list(range(start, start + len(chunks)))
+
+    def __len__(self) -> int:
+        return self._segment_starts[-1] + len(self._appended)
+
+    def _locate(self, row_id: int) -> Tuple[Optional['ChunkStore'], int]:
+        """(segment, row within it) for a row past the main rows; (None, i) for the i-th in-memory row"""
+        i = bisect_right(self._segment_starts, row_id) - 1
+        if i < len(self.segments):
+            return self.segments[i], row_id - self._segment_starts[i]
+        return None, row_id - self._segment_starts[-1]
+
+    def _block(self, block_id: int) -> bytes:
+        with self._blocks_lock:
+            data = self._blocks.get(block_id)
+            if data is not None:
+                self._blocks.move_to_end(block_id)
+                return data
+
+        start, end = int(self.block_offsets[block_id]), int(self.block_offsets[block_id + 1])
+        data = zlib.decompress(self._text[start:end])
+
+        with self._blocks_lock:
+            self._blocks[block_id] = data
+            while len(self._blocks) > self._max_cached_blocks:
+                self._blocks.popitem(last=False)
+        return data
+
+    def text(self, row_id: int) -> str:
+        if row_id >= self.num_chunks:
+            segment, row = self._locate(row_id)
+            return segment.text(row) if segment is not None else self._appended[row]['content']
+        start, end = int(self.text_offsets[row_id]), int(self.text_offsets[row_id + 1])
+        if self.compression is None:
+            return self._text[start:end].decode('utf-8')
+
+        block_id = row_id // self.block_size
+        block_start = int(self.text_offsets[block_id * self.block_size])
+        return self._block(block_id)[start - block_start:end - block_start].decode('utf-8')
+
+    def _row(self, row_id: int) -> int:
+        row_id = int(row_id)
+        if row_id < 0:
+            row_id += len(self)
+        if not 0 <= row_id < len(self):
+            raise IndexError(f"chunk row {row_id} out of range")
+        return row_id
+
+    def doc_id(self, row_id: int) -> str:
+        """A chunk's doc_id, read from the columns without decoding the rest of the chunk"""
+        row_id = self._row(row_id)
+        if row_id >= self.num_chunks:
+            segment, row = self._locate(row_id)
+            return segment.doc_id(row) if segment is not None else self._appended[row]['doc_id']
+        if self.layout == 'columnar':
+            return self.doc_ids[int(self.columns['doc'][row_id])]
+        return self.fields(row_id)['doc_id']
+
+    def fields(self, row_id: int) -> Dict:
+        """Everything but the content, without touching the text file"""
+        row_id = self._row(row_id)
+        if row_id >= self.num_chunks:
+            segment, row = self._locate(row_id)
+            if segment is not None:
+                return segment.fields(row)
+            return {key: value for key, value in self._appended[row].items() if key != 'content'}
+        if self.layout != 'columnar':
+            start, end = int(self.meta_offsets[row_id]), int(self.meta_offsets[row_id + 1])
+            return json.loads(self._meta[start:end])
+
+        extra_json = self.extras[row_id]
+        extra = json.loads(extra_json) if extra_json else {}
+        doc = int(self.columns['doc'][row_id])
+        doc_id = self.doc_ids[doc]
+
+        record = {'chunk_id': None, 'doc_id': doc_id}
+        if 'doc_title' in extra:
+            record['doc_title'] = extra.pop('doc_title')
+        elif not extra.pop('_no_title', False):
+            record['doc_title'] = self.doc_titles[doc]
+        for name in INT_COLUMNS:
+            value = int(self.columns[name][row_id])
+            if name in extra:
+                record[name] = extra.pop(name)
+            elif value != MISSING:
+                record[name] = value
+        record['chunk_id'] = extra.pop('chunk_id', f"{doc_id}_chunk_{record.get('chunk_index')}")
+
+        if 'metadata' in extra:
+            record['metadata'] = extra.pop('metadata')
+        elif not extra.pop('_no_metadata', False):
+            record['metadata'] = {name: int(self.columns[name][row_id]) for name in META_COLUMNS}
+
+        record.update(extra)
+        return record
+
+    def __getitem__(self, row_id: int) -> Dict:
+        row_id = self._row(row_id)
+        if row_id >= self.num_chunks:
+            segment, row = self._locate(row_id)
+            return segment[row] if segment is not None else dict(self._appended[row])
+
+        # Same key order as the chunker: content sits right before metadata
+        text = self.text(row_id)
+        chunk = {}
+        for key, value in self.fields(row_id).items():
+            if key == 'metadata':
+                chunk['content'] = text
+            chunk[key] = value
+        chunk.setdefault('content', text)
+        return chunk
+
+    def get_many(self, row_ids: Iterable[int]) -> List[Dict]:
+        return [self[row_id] for row_id in row_ids]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row_id in range(len(self)):
+            yield self[row_id]
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return (Path(path) / 'store.json').exists()
@@ -0,0 +1,99 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Callable
+import multiprocessing
+import os
+
+# Per-process model, loaded once by the pool initializer
+_worker_model = None
+
+
+def _init_worker(model_name: str, num_threads: int):
+    global _worker_model
+    # Bound intra-op parallelism so workers don't oversubscribe the cores between them
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_task(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(
+        texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True
+    ).astype(np.float32)
+
+
+class EmbeddingEngine:
+    """Length-bucketed, multi-process embedding for index builds.
+
+    Texts are sorted by token length and cut into consecutive batches, so
+    each batch pads to a length close to that of all its members. Batches are
+    grouped into tasks and fanned out to worker processes, each holding its
+    own model copy and a bounded number of threads; results are scattered
+    back into the original order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: Optional[int] = None,
+        batch_size: int = 32,
+        threads_per_worker: Optional[int] = None,
+        batches_per_task: int = 8,
+        length_fn: Optional[Callable[[List[str]], np.ndarray]] = None
+    ):
+        cpus = os.cpu_count() or 1
+        self.model_name = model_name
+        self.workers = workers or cpus
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.workers)
+        self.batches_per_task = batches_per_task
+        self.length_fn = length_fn
+        self._executor = None
+
+    def _lengths(self, texts: List[str]) -> np.ndarray:
+        if self.length_fn is not None:
+            return np.asarray(self.length_fn(texts))
+        return np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs torch threads can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker)
+            )
+        return self._executor
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        order = np.argsort(self._lengths(texts), kind='stable')
+        task_size = self.batch_size * self.batches_per_task
+        # Never fewer tasks than workers, unless there is less than one batch per worker
+        task_size = max(self.batch_size, min(task_size, -(-len(texts) // self.workers)))
+
+        pool = self._pool()
+        futures = []
+        for start in range(0, len(texts), task_size):
+            rows = order[start:start + task_size]
+            futures.append((rows, pool.submit(_encode_task, [texts[i] for i in rows], self.batch_size)))
+
+        embeddings = None
+        for rows, future in futures:
+            vectors = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[rows] = vectors
+        return embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
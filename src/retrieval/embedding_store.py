@@ -0,0 +1,109 @@
+import numpy as np
+from typing import List, Dict, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+
+class EmbeddingCache:
+    """Persistent chunk-embedding cache keyed by (model name, SHA-1 of chunk text).
+
+    Each model gets its own directory with two append-only files:
+        keys.bin    - 20-byte text digests, one per row
+        vectors.f32 - float32 vectors, `dimension` per row, memory-mapped for reads
+
+    Rows are only ever appended, so a rebuild re-encodes just the chunks
+    whose text it has never seen. A crash between the two appends leaves
+    trailing bytes that are ignored on the next open.
+    """
+
+    KEY_SIZE = 20
+
+    def __init__(self, cache_dir: str, model_name: str, dimension: int):
+        self.path = Path(cache_dir) / re.sub(r'[^A-Za-z0-9._-]+', '_', model_name)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dimension = dimension
+        self._lock = threading.Lock()
+
+        info_path = self.path / 'cache.json'
+        if info_path.exists():
+            with open(info_path) as f:
+                info = json.load(f)
+            if info['dimension'] != dimension:
+                raise ValueError(f"❌ Embedding cache at {self.path} has dimension {info['dimension']}, expected {dimension}")
+        else:
+            with open(info_path, 'w') as f:
+                json.dump({'model_name': model_name, 'dimension': dimension}, f, indent=2)
+
+        self._keys_path = self.path / 'keys.bin'
+        self._vectors_path = self.path / 'vectors.f32'
+        for filepath in (self._keys_path, self._vectors_path):
+            filepath.touch(exist_ok=True)
+
+        row_bytes = dimension * 4
+        num_rows = min(
+            self._keys_path.stat().st_size // self.KEY_SIZE,
+            self._vectors_path.stat().st_size // row_bytes
+        )
+        # Drop a partially written tail so both files agree on the row count
+        for filepath, size in ((self._keys_path, num_rows * self.KEY_SIZE), (self._vectors_path, num_rows * row_bytes)):
+            if filepath.stat().st_size != size:
+                os.truncate(filepath, size)
+
+        with open(self._keys_path, 'rb') as f:
+            data = f.read()
+        self._rows: Dict[bytes, int] = {
+            data[i * self.KEY_SIZE:(i + 1) * self.KEY_SIZE]: i for i in range(num_rows)
+        }
+        self._num_rows = num_rows
+        self._vectors = None
+
+    @staticmethod
+    def text_key(text: str) -> bytes:
+        return hashlib.sha1(text.encode('utf-8')).digest()
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+    def _mapped_vectors(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != self._num_rows:
+            self._vectors = (
+                np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(self._num_rows, self.dimension))
+                if self._num_rows else np.zeros((0, self.dimension), dtype=np.float32)
+            )
+        return self._vectors
+
+    def get(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, found mask) for the given keys; rows for missing keys are zero"""
+        with self._lock:
+            rows = np.array([self._rows.get(key, -1) for key in keys], dtype=np.int64)
+            found = rows >= 0
+            vectors = np.zeros((len(keys), self.dimension), dtype=np.float32)
+            if found.any():
+                vectors[found] = self._mapped_vectors()[rows[found]]
+        return vectors, found
+
+    def put(self, keys: List[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            new, seen = [], set()
+            for i, key in enumerate(keys):
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    new.append(i)
+            if not new:
+                return
+
+            # Vectors first: a key is only trusted once its vector is on disk
+            with open(self._vectors_path, 'ab') as f:
+                f.write(vectors[new].tobytes())
+            with open(self._keys_path, 'ab') as f:
+                f.write(b''.join(keys[i] for i in new))
+
+            for offset, i in enumerate(new):
+                self._rows[keys[i]] = self._num_rows + offset
+            self._num_rows += len(new)
@@ -0,0 +1,282 @@
+import numpy as np
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import threading
+from .chunk_store import ChunkStore, META_COLUMNS, INT_COLUMNS, MISSING
+from .row_filter import RowFilter
+
+# Filterable fields: chunk fields and metadata entries as "metadata.<key>"
+DOC_FIELDS = ('doc_id', 'doc_title')
+OPERATORS = ('eq', 'ne', 'in', 'nin', 'gt', 'gte', 'lt', 'lte', 'range', 'prefix', 'contains')
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_member(value: Any, members: set) -> bool:
+    try:
+        return value in members
+    except TypeError:
+        # A list or dict field value never equals a member
+        return False
+
+
+def _predicate(op: str, operand: Any) -> Callable[[Any], bool]:
+    """Test for one operator against a single (present) field value"""
+    if op == 'eq':
+        return lambda value: value == operand
+    if op == 'ne':
+        return lambda value: value != operand
+    if op in ('in', 'nin'):
+        if not isinstance(operand, list):
+            raise ValueError(f"❌ Filter operator '{op}' expects a list, got {operand!r}")
+        try:
+            members = set(operand)
+        except TypeError:
+            raise ValueError(f"❌ Filter operator '{op}' expects a list of strings or numbers, got {operand!r}")
+        if op == 'in':
+            return lambda value: _is_member(value, members)
+        return lambda value: not _is_member(value, members)
+    if op in ('prefix', 'contains'):
+        if not isinstance(operand, str):
+            raise ValueError(f"❌ Filter operator '{op}' expects a string, got {operand!r}")
+        if op == 'prefix':
+            return lambda value: isinstance(value, str) and value.startswith(operand)
+        return lambda value: isinstance(value, str) and operand in value
+    if op == 'range':
+        if not (isinstance(operand, list) and len(operand) == 2 and all(_is_number(bound) for bound in operand)):
+            raise ValueError(f"❌ Filter operator 'range' expects [low, high] numbers, got {operand!r}")
+        low, high = operand
+        return lambda value: _is_number(value) and low <= value <= high
+
+    if not _is_number(operand):
+        raise ValueError(f"❌ Filter operator '{op}' expects a number, got {operand!r}")
+    compare = {
+        'gt': lambda value: value > operand,
+        'gte': lambda value: value >= operand,
+        'lt': lambda value: value < operand,
+        'lte': lambda value: value <= operand
+    }[op]
+    return lambda value: _is_number(value) and compare(value)
+
+
+def _column_mask(op: str, operand: Any, column: np.ndarray) -> np.ndarray:
+    """Vectorized _predicate over an int32 count column; MISSING entries never match"""
+    present = column != MISSING
+    if op in ('prefix', 'contains'):
+        return np.zeros(len(column), dtype=bool)
+    if op in ('in', 'nin'):
+        members = [v for v in operand if _is_number(v)]
+        hit = np.isin(column, members)
+        return present & (hit if op == 'in' else ~hit)
+    if op == 'range':
+        low, high = operand
+        return present & (column >= low) & (column <= high)
+    if not _is_number(operand):
+        # A count never equals a string; everything present differs from it
+        return present if op == 'ne' else np.zeros(len(column), dtype=bool)
+    compare = {
+        'eq': np.equal, 'ne': np.not_equal,
+        'gt': np.greater, 'gte': np.greater_equal,
+        'lt': np.less, 'lte': np.less_equal
+    }[op]
+    return present & compare(column, operand)
+
+
+def _conditions(field: str, condition: Any) -> Dict[str, Any]:
+    """Normalize a field condition: scalar = eq, list = in, dict = operators"""
+    if isinstance(condition, Mapping):
+        unknown = set(condition) - set(OPERATORS)
+        if unknown or not condition:
+            raise ValueError(f"❌ Unknown filter operators {sorted(unknown)} on '{field}' (expected {OPERATORS})")
+        return dict(condition)
+    if isinstance(condition, list):
+        return {'in': condition}
+    return {'eq': condition}
+
+
+def _lookup(record: Mapping, field: str) -> Tuple[bool, Any]:
+    """(present, value) of a possibly dotted field in a chunk record"""
+    value = record
+    for part in field.split('.'):
+        if not isinstance(value, Mapping) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def _index_text(value) -> str:
+    # Stored chunk_ids embed chunk_index as formatted by the chunker, "None" when absent
+    return 'None' if value == MISSING else str(int(value))
+
+
+class MetadataFilter:
+    """A compiled filter expression over chunk fields.
+
+    Expressions are JSON objects; all top-level entries must match:
+        {"doc_id": ["a", "b"],                      # list = any of
+         "doc_title": {"prefix": "Attention"},
+         "metadata.word_count": {"gte": 100},
+         "$or": [{...}, {...}], "$not": {...}}
+    Operators: eq, ne, in, nin, gt, gte, lt, lte, range ([low, high],
+    inclusive), prefix, contains. A field a chunk does not have matches
+    nothing, not even ne/nin.
+    """
+
+    def __init__(self, expression: Dict):
+        if not isinstance(expression, Mapping):
+            raise ValueError(f"❌ A filter must be an object, got {expression!r}")
+        self.expression = expression
+        self.key = json.dumps(expression, sort_keys=True, separators=(',', ':'))
+        self._clauses = []
+        for field, condition in expression.items():
+            if field == '$or':
+                if not isinstance(condition, list) or not condition:
+                    raise ValueError("❌ '$or' expects a non-empty list of filters")
+                self._clauses.append(('$or', [MetadataFilter(sub) for sub in condition]))
+            elif field == '$not':
+                self._clauses.append(('$not', MetadataFilter(condition)))
+            elif field == 'content':
+                raise ValueError("❌ Chunk content can't be filtered on; use the query instead")
+            else:
+                ops = _conditions(field, condition)
+                self._clauses.append((field, [(op, operand, _predicate(op, operand)) for op, operand in ops.items()]))
+
+    def matches(self, record: Mapping) -> bool:
+        for field, clause in self._clauses:
+            if field == '$or':
+                if not any(sub.matches(record) for sub in clause):
+                    return False
+            elif field == '$not':
+                if clause.matches(record):
+                    return False
+            else:
+                present, value = _lookup(record, field)
+                if not present or not all(test(value) for _, _, test in clause):
+                    return False
+        return True
+
+    def mask(self, chunks) -> np.ndarray:
+        """Boolean mask over every row of chunks (a ChunkStore or a list of chunk dicts)"""
+        if isinstance(chunks, ChunkStore) and chunks.layout == 'columnar':
+            return self._store_mask(chunks)
+        return np.fromiter(
+            (self.matches(chunks[row_id]) for row_id in range(len(chunks))),
+            dtype=bool, count=len(chunks)
+        )
+
+    def _store_mask(self, store: ChunkStore) -> np.ndarray:
+        """Evaluate against the columns; rows the columns can't fully describe are checked one by one"""
+        mask = np.ones(len(store), dtype=bool)
+        mapped = slice(0, store.num_chunks)
+        docs = store.columns['doc']
+        for field, clause in self._clauses:
+            if field == '$or':
+                column = np.zeros(store.num_chunks, dtype=bool)
+                for sub in clause:
+                    column |= sub._store_mask(store)[mapped]
+            elif field == '$not':
+                column = ~clause._store_mask(store)[mapped]
+            elif field == 'chunk_id':
+                # Derived from doc_id and chunk_index for every regular row
+                chunk_index = store.columns['chunk_index']
+                column = np.fromiter(
+                    (
+                        all(
+                            test(f"{store.doc_ids[int(docs[row_id])]}_chunk_{_index_text(chunk_index[row_id])}")
+                            for _, _, test in clause
+                        )
+                        for row_id in range(store.num_chunks)
+                    ),
+                    dtype=bool, count=store.num_chunks
+                )
+            elif field in DOC_FIELDS:
+                # Evaluated once per document, then broadcast to its chunks
+                table = store.doc_ids if field == 'doc_id' else store.doc_titles
+                doc_match = np.fromiter(
+                    (all(test(table[doc]) for _, _, test in clause) for doc in range(len(table))),
+                    dtype=bool, count=len(table)
+                )
+                column = doc_match[docs]
+            else:
+                name = field[len('metadata.'):] if field.startswith('metadata.') else field
+                if (field in INT_COLUMNS) or (field.startswith('metadata.') and name in META_COLUMNS):
+                    column = np.ones(store.num_chunks, dtype=bool)
+                    for op, operand, _ in clause:
+                        column &= _column_mask(op, operand, store.columns[name])
+                else:
+                    # Other fields only exist on rows carrying extras
+                    column = np.zeros(store.num_chunks, dtype=bool)
+            mask[mapped] &= column
+
+        # Rows with extras (non-standard titles, metadata or fields), then segments and appended rows
+        irregular = np.flatnonzero(np.diff(store.extras.offsets) > 0)
+        for row_id in irregular:
+            mask[row_id] = self.matches(store.fields(int(row_id)))
+        start = store.num_chunks
+        for segment in store.segments:
+            mask[start:start + len(segment)] = self._store_mask(segment)
+            start += len(segment)
+        for row_id in range(start, len(store)):
+            mask[row_id] = self.matches(store.fields(row_id))
+        return mask
+
+
+class FilterCache:
+    """LRU of compiled filter bitmaps keyed by (canonical expression, index version).
+
+    A cached RowFilter also keeps its FAISS bitmap and per-segment views, so
+    repeated filters cost nothing to prepare. Entries for an older index
+    version are never hit again and age out.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], RowFilter]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        expression: Dict,
+        version: int,
+        chunks,
+        deleted: Optional[np.ndarray] = None
+    ) -> RowFilter:
+        """RowFilter for expression over chunks, excluding deleted rows when given"""
+        compiled = MetadataFilter(expression)
+        key = (compiled.key, version)
+        with self._lock:
+            row_filter = self._entries.get(key)
+            if row_filter is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return row_filter
+            self.misses += 1
+
+        mask = compiled.mask(chunks)
+        if deleted is not None:
+            mask &= ~deleted
+        row_filter = RowFilter(mask)
+        with self._lock:
+            self._entries[key] = row_filter
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return row_filter
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,78 @@
+import numpy as np
+from typing import List, Tuple
+
+FUSION_STRATEGIES = ('weighted', 'rrf', 'zscore')
+
+
+def minmax_normalize(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores.astype(np.float64)
+    min_s, max_s = scores.min(), scores.max()
+    if max_s == min_s:
+        return np.ones(len(scores))
+    return (scores - min_s) / (max_s - min_s)
+
+
+def zscore_normalize(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores.astype(np.float64)
+    std = scores.std()
+    if std == 0:
+        # Nothing to tell apart: count every result like min-max does, rather than not at all
+        return np.ones(len(scores))
+    return (scores - scores.mean()) / std
+
+
+def shifted_zscore(scores: np.ndarray) -> np.ndarray:
+    # Chunks missing from a leg get 0 from it, so the leg's lowest z-score must be 0 too;
+    # unshifted, 0 is the leg mean and an absent chunk would outrank every below-mean hit
+    z = zscore_normalize(scores)
+    if len(z) == 0 or scores.std() == 0:
+        return z
+    return z - z.min()
+
+
+def reciprocal_rank(scores: np.ndarray, rrf_k: int = 60) -> np.ndarray:
+    # Leg results arrive best first, so position is rank
+    return 1.0 / (rrf_k + np.arange(1, len(scores) + 1))
+
+
+def fuse(
+    legs: List[Tuple[np.ndarray, np.ndarray]],
+    weights: List[float],
+    k: int,
+    strategy: str = 'weighted',
+    rrf_k: int = 60
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-leg (row ids, scores) into the top-k (row ids, fused scores), best first.
+
+    weighted: weighted sum of min-max normalized scores
+    rrf:      weighted reciprocal-rank fusion, sum of w / (rrf_k + rank)
+    zscore:   weighted sum of z-scores, shifted so each leg's lowest result scores 0
+    A chunk missing from a leg gets nothing from that leg.
+    """
+    if strategy == 'weighted':
+        normalize = minmax_normalize
+    elif strategy == 'zscore':
+        normalize = shifted_zscore
+    elif strategy == 'rrf':
+        normalize = lambda scores: reciprocal_rank(scores, rrf_k)
+    else:
+        raise ValueError(f"❌ Unknown fusion strategy '{strategy}' (expected one of {FUSION_STRATEGIES})")
+
+    ids = np.concatenate([np.asarray(leg_ids, dtype=np.int64) for leg_ids, _ in legs])
+    if len(ids) == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    contributions = np.concatenate([
+        weight * normalize(np.asarray(leg_scores, dtype=np.float64))
+        for (_, leg_scores), weight in zip(legs, weights)
+    ])
+
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions, minlength=len(unique_ids))
+
+    k_eff = min(k, len(unique_ids))
+    top = np.argpartition(-fused, k_eff - 1)[:k_eff]
+    top = top[np.argsort(-fused[top], kind='stable')]
+    return unique_ids[top], fused[top]
@@ -1,71 +1,421 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Any
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import time
+import numpy as np
 from .vector_search import VectorSearch
 from .keyword_search import KeywordSearch
+from .query_cache import QueryEmbeddingCache
+from .chunk_store import ChunkStore
+from .index_format import write_manifest, read_manifest, atomic_path
+from .fusion import fuse, FUSION_STRATEGIES
+from .row_filter import RowFilter
+from .filters import FilterCache
+
+_leg_executor = None
+_leg_executor_lock = threading.Lock()
+
+
+def _get_leg_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for running retrieval legs concurrently"""
+    global _leg_executor
+    with _leg_executor_lock:
+        if _leg_executor is None:
+            _leg_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hybrid-leg')
+        return _leg_executor
+
+
+class _ReadWriteLock:
+    """Any number of concurrent searches, or one index mutation (writers go first)"""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
 
 class HybridSearch:
-    def __init__(self, vector_weight: float = 0.7, keyword_weight: float = 0.3):
-        self.vector_search = VectorSearch()
+    def __init__(
+        self,
+        vector_weight: float = 0.7,
+        keyword_weight: float = 0.3,
+        index_type: str = 'flat',
+        index_params: Optional[Dict] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        parallel: bool = False,
+        leg_timeout: Optional[float] = None,
+        fusion: str = 'weighted',
+        candidate_depth: Optional[int] = None,
+        rrf_k: int = 60,
+        merge_threshold: int = 10000,
+        embedding_cache_dir: Optional[str] = None,
+        embed_workers: int = 1,
+        query_backend: str = 'torch'
+    ):
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"❌ Unknown fusion strategy '{fusion}' (expected one of {FUSION_STRATEGIES})")
+        
+        self.vector_search = VectorSearch(
+            index_type=index_type,
+            query_cache=query_cache,
+            embedding_cache_dir=embedding_cache_dir,
+            embed_workers=embed_workers,
+            query_backend=query_backend,
+            **(index_params or {})
+        )
         self.keyword_search = KeywordSearch()
         self.vector_weight = vector_weight
         self.keyword_weight = keyword_weight
+        # Run both legs concurrently; a leg slower than leg_timeout seconds is dropped
+        self.parallel = parallel
+        self.leg_timeout = leg_timeout
+        self.fusion = fusion
+        # Candidates pulled from each leg before fusion; None means 2*k
+        self.candidate_depth = candidate_depth
+        self.rrf_k = rrf_k
+        self.manifest = None
+        
+        # Incremental updates: deleted rows are tombstoned and excluded at query time;
+        # the keyword delta is merged in the background after merge_threshold changes
+        self.merge_threshold = merge_threshold
+        self.deleted = np.zeros(0, dtype=bool)
+        self.index_version = 0
+        self._live_filter = None
+        # Compiled metadata filters, keyed by expression and index_version
+        self.filter_cache = FilterCache()
+        self._doc_rows = None
+        self._changes_since_merge = 0
+        self._merge_thread = None
+        self._rw_lock = _ReadWriteLock()
+    
+    @property
+    def chunks(self):
+        """Chunk storage shared by both legs, addressed by row id"""
+        return self.vector_search.chunks
     
     def build_index(self, chunks: List[Dict]):
         print("\n🔧 Building hybrid search index...")
         print("="*60)
         self.vector_search.build_index(chunks)
         self.keyword_search.build_index(chunks)
+        self._reset_tombstones(np.zeros(len(chunks), dtype=bool))
         print("="*60)
         print("✅ Hybrid index complete!")
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
-        vector_results = self.vector_search.search(query, k=k*2)
-        keyword_results = self.keyword_search.search(query, k=k*2)
-        
-        vector_scores = self._normalize([s for _, s in vector_results])
-        keyword_scores = self._normalize([s for _, s in keyword_results])
-        
-        combined = {}
-        
-        for (chunk, _), norm_score in zip(vector_results, vector_scores):
-            cid = chunk['chunk_id']
-            combined[cid] = {
-                'chunk': chunk,
-                'score': self.vector_weight * norm_score
-            }
-        
-        for (chunk, _), norm_score in zip(keyword_results, keyword_scores):
-            cid = chunk['chunk_id']
-            if cid in combined:
-                combined[cid]['score'] += self.keyword_weight * norm_score
-            else:
-                combined[cid] = {
-                    'chunk': chunk,
-                    'score': self.keyword_weight * norm_score
-                }
-        
-        sorted_results = sorted(
-            combined.values(),
-            key=lambda x: x['score'],
-            reverse=True
-        )[:k]
-        
-        return [(item['chunk'], item['score']) for item in sorted_results]
-    
-    def _normalize(self, scores: List[float]) -> List[float]:
-        if not scores:
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[Dict, float]]:
+        return self.search_batch([query], k=k, ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+    
+    def search_with_timings(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List[Tuple[Dict, float]], Dict]:
+        results, timings = self.search_batch_with_timings(
+            [query], k=k, ef_search=ef_search, nprobe=nprobe, filters=filters
+        )
+        return results[0], timings
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[Dict, float]]]:
+        """Search many queries at once: one embedding pass, one FAISS call, one BM25 pass.
+
+        filters restricts results to chunks matching a metadata filter
+        expression (see MetadataFilter); it is applied inside both legs, so
+        k results come back whenever k matching chunks exist.
+        """
+        return self.search_batch_with_timings(queries, k=k, ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+    
+    def search_batch_with_timings(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List[List[Tuple[Dict, float]]], Dict]:
+        depth = max(self.candidate_depth or k*2, k)
+        allowed = self._live_filter
+        filter_timings = {}
+        if filters:
+            filter_start = time.perf_counter()
+            allowed = self._row_filter(filters)
+            filter_timings = {'filter_ms': (time.perf_counter() - filter_start) * 1000, 'filter_rows': allowed.count}
+            if not allowed.count:
+                return [[] for _ in queries], dict(filter_timings, dropped_legs=[])
+        
+        leg_results, timings = self._run_legs({
+            'vector': lambda: self.vector_search.search_ids_batch(
+                queries, k=depth, ef_search=ef_search, nprobe=nprobe, allowed=allowed
+            ),
+            'keyword': lambda: self.keyword_search.search_ids_batch(queries, k=depth, allowed=allowed)
+        })
+        
+        # A dropped leg contributes nothing; results are served from the other leg alone
+        empty = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))] * len(queries)
+        vector_batch = leg_results.get('vector', empty)
+        keyword_batch = leg_results.get('keyword', empty)
+        
+        fusion_start = time.perf_counter()
+        results = [
+            self._fuse(vector_results, keyword_results, k)
+            for vector_results, keyword_results in zip(vector_batch, keyword_batch)
+        ]
+        timings['fusion_ms'] = (time.perf_counter() - fusion_start) * 1000
+        timings.update(filter_timings)
+        
+        return results, timings
+    
+    def _row_filter(self, filters: Dict) -> RowFilter:
+        """Cached bitmap of live rows matching a filter expression"""
+        with self._rw_lock.read():
+            deleted = self.deleted if self.deleted.any() else None
+            return self.filter_cache.get(filters, self.index_version, self.chunks, deleted=deleted)
+    
+    def _run_legs(self, legs: Dict[str, Callable[[], Any]]) -> Tuple[Dict, Dict]:
+        """Run retrieval legs, sequentially or on the shared executor, timing each one"""
+        timings = {}
+        
+        def timed(name: str, fn: Callable[[], Any]):
+            start = time.perf_counter()
+            with self._rw_lock.read():
+                result = fn()
+            timings[f'{name}_ms'] = (time.perf_counter() - start) * 1000
+            return result
+        
+        if not self.parallel:
+            results = {name: timed(name, fn) for name, fn in legs.items()}
+            return results, dict(timings, dropped_legs=[])
+        
+        executor = _get_leg_executor()
+        futures = {executor.submit(timed, name, fn): name for name, fn in legs.items()}
+        done, pending = wait(futures, timeout=self.leg_timeout)
+        if not done:
+            # Every leg blew the deadline: serve whichever finishes first
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        
+        results = {futures[future]: future.result() for future in done}
+        # Copy now: dropped legs keep running and would write into timings later
+        return results, dict(timings, dropped_legs=sorted(futures[f] for f in pending))
+    
+    def _fuse(
+        self,
+        vector_results: Tuple[np.ndarray, np.ndarray],
+        keyword_results: Tuple[np.ndarray, np.ndarray],
+        k: int
+    ) -> List[Tuple[Dict, float]]:
+        # Both legs index the same chunk store, so row ids identify chunks across legs
+        ids, scores = fuse(
+            [vector_results, keyword_results],
+            [self.vector_weight, self.keyword_weight],
+            k,
+            strategy=self.fusion,
+            rrf_k=self.rrf_k
+        )
+        
+        # Only the final top-k chunks are read from the store
+        return [(self.chunks[idx], float(score)) for idx, score in zip(ids, scores)]
+    
+    def _reset_tombstones(self, deleted: np.ndarray):
+        self.deleted = deleted
+        self._live_filter = RowFilter(~deleted) if deleted.any() else None
+        self.filter_cache.clear()
+        self._doc_rows = None
+        self._changes_since_merge = 0
+        self.index_version = 0
+    
+    def _rows_by_doc(self) -> Dict[str, List[int]]:
+        """doc_id -> live row ids, built on first use by scanning the doc_id column"""
+        if self._doc_rows is None:
+            doc_rows = {}
+            for row_id in range(len(self.chunks)):
+                if self.deleted[row_id]:
+                    continue
+                doc_id = self.chunks.doc_id(row_id) if isinstance(self.chunks, ChunkStore) else self.chunks[row_id]['doc_id']
+                doc_rows.setdefault(doc_id, []).append(row_id)
+            self._doc_rows = doc_rows
+        return self._doc_rows
+    
+    def _append_rows(self, chunks: List[Dict], embeddings: np.ndarray) -> List[int]:
+        # Built (if needed) before the new rows exist, so they are recorded exactly once
+        doc_rows = self._rows_by_doc()
+        if isinstance(self.chunks, ChunkStore):
+            row_ids = self.chunks.append(chunks)
+        else:
+            row_ids = list(range(len(self.chunks), len(self.chunks) + len(chunks)))
+            self.chunks.extend(chunks)
+        
+        self.vector_search.add(chunks, row_ids, embeddings=embeddings)
+        self.keyword_search.add(chunks, row_ids)
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(chunks), dtype=bool)])
+        
+        for chunk, row_id in zip(chunks, row_ids):
+            doc_rows.setdefault(chunk['doc_id'], []).append(row_id)
+        return row_ids
+    
+    def _delete_rows(self, doc_ids: List[str]) -> int:
+        doc_rows = self._rows_by_doc()
+        rows = [row_id for doc_id in doc_ids for row_id in doc_rows.pop(doc_id, [])]
+        if rows:
+            self.deleted[rows] = True
+            self.vector_search.remove(rows)
+        return len(rows)
+    
+    def _after_mutation(self, num_changes: int):
+        self._live_filter = RowFilter(~self.deleted) if self.deleted.any() else None
+        self.index_version += 1
+        self._changes_since_merge += num_changes
+        if self._changes_since_merge >= self.merge_threshold:
+            self.merge(background=True)
+    
+    def add_documents(self, chunks: List[Dict]) -> List[int]:
+        """Index chunks (as produced by DocumentChunker) without a rebuild; returns their row ids"""
+        if not chunks:
             return []
-        min_s = min(scores)
-        max_s = max(scores)
-        if max_s == min_s:
-            return [1.0] * len(scores)
-        return [(s - min_s) / (max_s - min_s) for s in scores]
-    
-    def save(self, path: str):
-        self.vector_search.save(path)
-        self.keyword_search.save(path)
-        print(f"💾 Saved complete hybrid index to {path}")
-    
-    def load(self, path: str):
-        self.vector_search.load(path)
-        self.keyword_search.load(path)
-        print(f"✅ Loaded complete hybrid index from {path}")
\ No newline at end of file
+        # Embedding is the slow part and needs no lock; searches keep running meanwhile
+        embeddings = self.vector_search.create_embeddings(chunks)
+        with self._rw_lock.write():
+            row_ids = self._append_rows(chunks, embeddings)
+            self._after_mutation(len(chunks))
+        return row_ids
+    
+    def update_documents(self, chunks: List[Dict]) -> List[int]:
+        """Replace every chunk of the documents these chunks belong to"""
+        if not chunks:
+            return []
+        embeddings = self.vector_search.create_embeddings(chunks)
+        with self._rw_lock.write():
+            deleted = self._delete_rows(list(dict.fromkeys(chunk['doc_id'] for chunk in chunks)))
+            row_ids = self._append_rows(chunks, embeddings)
+            self._after_mutation(deleted + len(chunks))
+        return row_ids
+    
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """Remove all chunks of the given documents; returns the number of chunks removed"""
+        with self._rw_lock.write():
+            deleted = self._delete_rows(doc_ids)
+            if deleted:
+                self._after_mutation(deleted)
+        return deleted
+    
+    def merge(self, background: bool = False):
+        """Fold the keyword delta segment and deleted rows into a new main BM25 segment"""
+        if background:
+            if self._merge_thread is None or not self._merge_thread.is_alive():
+                self._merge_thread = threading.Thread(target=self.merge, name='bm25-merge', daemon=True)
+                self._merge_thread.start()
+            return
+        
+        self._changes_since_merge = 0
+        self.keyword_search.rebuild(self.deleted.copy())
+    
+    def save(self, path: str, compress_chunks: bool = False, merge: bool = False):
+        """Persist the index; saving over the loaded index writes only what changed.
+
+        The keyword delta segment and appended chunks are stored as they are,
+        so an incremental update costs the changed rows rather than the corpus.
+        merge folds them and the deleted rows back into single segments first,
+        rewriting the keyword index and chunk store.
+        """
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+        if merge and (self.keyword_search.delta_size or self._changes_since_merge):
+            self.merge()
+        
+        # Chunks are written once and shared by both legs instead of pickled per leg
+        store = ChunkStore.persist(
+            self.chunks, Path(path) / 'chunk_store', compress=compress_chunks, compact=merge
+        )
+        self.vector_search.chunks = store
+        self.keyword_search.chunks = store
+        
+        self.vector_search.save(path, save_chunks=False)
+        self.keyword_search.save(path, save_chunks=False)
+        
+        tombstones_path = Path(path) / 'tombstones.npy'
+        if self.deleted.any():
+            with atomic_path(tombstones_path) as tmp_path, open(tmp_path, 'wb') as f:
+                np.save(f, self.deleted)
+        elif tombstones_path.exists():
+            tombstones_path.unlink()
+        
+        self.manifest = write_manifest(path, components={
+            'num_chunks': len(store),
+            'num_deleted': int(self.deleted.sum()),
+            'vector': {
+                'model_name': self.vector_search.model_name,
+                'dimension': self.vector_search.dimension,
+                'index_type': self.vector_search.index_type
+            },
+            'keyword': {
+                'num_terms': len(self.keyword_search.bm25.vocab),
+                'delta_docs': self.keyword_search.delta_size
+            },
+            'chunk_store': {'compression': store.compression, 'segments': len(store.segments)}
+        })
+        print(f"💾 Saved complete hybrid index to {path} (id {self.manifest['index_id']})")
+    
+    def load(self, path: str, verify_checksums: bool = False):
+        # Indexes written before manifests existed load without integrity checks
+        self.manifest = read_manifest(path, verify_checksums=verify_checksums)
+        
+        store_path = Path(path) / 'chunk_store'
+        store = ChunkStore(store_path) if ChunkStore.exists(store_path) else None
+        
+        self.vector_search.load(path, chunk_store=store)
+        self.keyword_search.load(path, chunk_store=self.vector_search.chunks)
+        
+        tombstones_path = Path(path) / 'tombstones.npy'
+        deleted = np.load(tombstones_path) if tombstones_path.exists() else np.zeros(len(self.chunks), dtype=bool)
+        self._reset_tombstones(deleted)
+        print(f"✅ Loaded complete hybrid index from {path}")
+    
+    @property
+    def index_id(self) -> Optional[str]:
+        return self.manifest['index_id'] if self.manifest else None
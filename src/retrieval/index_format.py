@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Dict, Optional, Iterator
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# Bump when the on-disk layout changes incompatibly
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+@contextmanager
+def atomic_path(filepath: Path) -> Iterator[Path]:
+    """Yield a temp path that replaces filepath once written.
+
+    Readers that still have the old file memory-mapped keep seeing the old
+    inode instead of a file truncated underneath them.
+    """
+    filepath = Path(filepath)
+    tmp_path = filepath.with_name(f'.{filepath.name}.tmp')
+    try:
+        yield tmp_path
+        os.replace(tmp_path, filepath)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def save_array(filepath: Path, array: np.ndarray):
+    with atomic_path(filepath) as tmp_path, open(tmp_path, 'wb') as f:
+        np.save(f, array)
+
+
+def _sha256(filepath: Path) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(path: str, components: Optional[Dict] = None) -> Dict:
+    """Record format version, per-file sizes and checksums for an index directory.
+
+    Checksums of files whose size and mtime match the previous manifest are
+    reused, so rewriting the manifest after an incremental save only reads
+    the files that changed.
+    """
+    index_path = Path(path)
+    previous = {}
+    if (index_path / MANIFEST_NAME).exists():
+        with open(index_path / MANIFEST_NAME) as f:
+            previous = json.load(f).get('files', {})
+
+    files = {}
+    for filepath in sorted(index_path.rglob('*')):
+        if filepath.is_file() and filepath.name != MANIFEST_NAME and not filepath.name.startswith('.'):
+            name = filepath.relative_to(index_path).as_posix()
+            stat = filepath.stat()
+            known = previous.get(name, {})
+            unchanged = known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns
+            files[name] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': known['sha256'] if unchanged else _sha256(filepath)
+            }
+
+    # Content-derived id: identical indexes get the same id, any change gets a new one
+    index_id = hashlib.sha256(
+        json.dumps({name: info['sha256'] for name, info in files.items()}, sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'index_id': index_id,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'components': components or {},
+        'files': files
+    }
+    with atomic_path(index_path / MANIFEST_NAME) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str, verify_checksums: bool = False) -> Optional[Dict]:
+    """Load and check an index manifest; None for indexes written before manifests existed.
+
+    File presence and sizes are always checked (cheap). Checksums are only
+    recomputed when verify_checksums is set, since that reads every byte and
+    would defeat mmap-based fast startup.
+    """
+    index_path = Path(path)
+    manifest_path = index_path / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    version = manifest.get('format_version')
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            f"❌ Index at {path} has format version {version}, expected {FORMAT_VERSION}; rebuild it"
+        )
+
+    for name, info in manifest['files'].items():
+        filepath = index_path / name
+        if not filepath.exists():
+            raise ValueError(f"❌ Index file missing: {filepath}")
+        if filepath.stat().st_size != info['size']:
+            raise ValueError(f"❌ Index file has unexpected size: {filepath}")
+        if verify_checksums and _sha256(filepath) != info['sha256']:
+            raise ValueError(f"❌ Index file checksum mismatch: {filepath}")
+
+    return manifest
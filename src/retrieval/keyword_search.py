@@ -1,50 +1,228 @@
-from rank_bm25 import BM25Okapi
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+import numpy as np
 import pickle
+import threading
 from pathlib import Path
+from .bm25_index import BM25Index, CorpusStats, save_array
+from .chunk_store import ChunkStore
+from .row_filter import RowFilter
 
 class KeywordSearch:
+    """BM25 keyword search over a main segment plus an in-memory delta segment.
+
+    The main segment is the (possibly memory-mapped) index from the last build
+    or merge; chunks added since then go to a small delta segment that is
+    rebuilt on every add. Segments are scored with corpus-wide idf, and
+    rebuild() folds the delta and any deletions back into a new main segment.
+    save() stores only the delta's row ids, so saving after an update does
+    not re-tokenize the corpus; load() re-tokenizes just those rows.
+    """
+    
     def __init__(self):
         self.bm25 = None
         self.chunks = None
+        # Segment doc id -> chunk row id; None means the identity mapping
+        self.main_rows = None
+        self.delta = None
+        self.delta_rows = np.zeros(0, dtype=np.int64)
+        self._delta_tokens: List[List[str]] = []
+        self._segments = []
+        # Directory the current main segment was loaded from, while it is unchanged
+        self._loaded_from = None
+        self._lock = threading.Lock()
         
     
-    def build_index(self, chunks: List[Dict]):
+    def _tokenize(self, text: str) -> List[str]:
+        return text.lower().split()
+    
+    def _chunk_text(self, row_id: int) -> str:
+        if isinstance(self.chunks, ChunkStore):
+            return self.chunks.text(row_id)
+        return self.chunks[row_id]['content']
+    
+    def _set_main(self, bm25: BM25Index, rows: Optional[np.ndarray]):
+        self.bm25 = bm25
+        self.main_rows = rows
+        self._loaded_from = None
+        self._set_delta([], np.zeros(0, dtype=np.int64))
+    
+    def _set_delta(self, tokens: List[List[str]], rows: np.ndarray):
+        self._delta_tokens = tokens
+        self.delta_rows = rows
+        if tokens:
+            self.delta = BM25Index()
+            self.delta.build(tokens)
+        else:
+            self.delta = None
+        # Searches read this list once, so swapping it is atomic for them
+        self._segments = [(self.bm25, self.main_rows)] + ([(self.delta, self.delta_rows)] if self.delta else [])
+    
+    @property
+    def delta_size(self) -> int:
+        return len(self._delta_tokens)
+    
+    def build_index(self, chunks: List[Dict], corpus_stats: Optional[CorpusStats] = None):
+        """Build the main segment; corpus_stats makes scores comparable across shards"""
         self.chunks = chunks
         
         print(f"🏗️ Building BM25 keyword index...")
-        tokenized_docs = [chunk['content'].lower().split() for chunk in chunks]
-        self.bm25 = BM25Okapi(tokenized_docs)
+        bm25 = BM25Index()
+        bm25.build(
+            (self._tokenize(self._chunk_text(row_id)) for row_id in range(len(chunks))),
+            corpus_stats=corpus_stats
+        )
+        with self._lock:
+            self._set_main(bm25, None)
         
-        print(f"✅ BM25 index built with {len(chunks)} documents")
+        print(f"✅ BM25 index built with {len(chunks)} documents ({len(self.bm25.vocab)} terms)")
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
-        tokenized_query = query.lower().split()
-        scores = self.bm25.get_scores(tokenized_query)
+    def add(self, chunks: List[Dict], row_ids: List[int]):
+        """Index new chunks in the delta segment"""
+        tokens = [self._tokenize(chunk['content']) for chunk in chunks]
+        with self._lock:
+            self._set_delta(
+                self._delta_tokens + tokens,
+                np.concatenate([self.delta_rows, np.asarray(row_ids, dtype=np.int64)])
+            )
+    
+    def rebuild(self, deleted: Optional[np.ndarray] = None):
+        """Merge the delta segment into a new main segment, dropping deleted rows.
+
+        Safe to run in a background thread: searches keep using the old
+        segments until the swap, and chunks added meanwhile stay in the delta.
+        """
+        with self._lock:
+            merged = len(self._delta_tokens)
+            main_rows = (
+                self.main_rows if self.main_rows is not None
+                else np.arange(self.bm25.num_docs, dtype=np.int64)
+            )
+            rows = np.concatenate([main_rows, self.delta_rows[:merged]])
+        
+        if deleted is not None:
+            # Rows added after the deleted snapshot was taken are live by definition
+            in_range = rows < len(deleted)
+            rows = rows[~(in_range & deleted[np.where(in_range, rows, 0)])]
         
-        top_k_indices = scores.argsort()[-k:][::-1]
+        bm25 = BM25Index()
+        bm25.build(self._tokenize(self._chunk_text(row)) for row in rows)
+        identity = np.array_equal(rows, np.arange(len(rows)))
         
-        results = []
-        for idx in top_k_indices:
-            results.append((self.chunks[idx], float(scores[idx])))
+        with self._lock:
+            pending_tokens = self._delta_tokens[merged:]
+            pending_rows = self.delta_rows[merged:]
+            self.bm25 = bm25
+            self.main_rows = None if identity else rows
+            self._loaded_from = None
+            self._set_delta(pending_tokens, pending_rows)
+    
+    def _global_idf(self, segments: List, tokens: List[str]) -> Dict[str, float]:
+        num_docs = sum(index.num_docs for index, _ in segments)
+        main = segments[0][0]
+        return {
+            term: main.term_idf(sum(index.df(term) for index, _ in segments), num_docs)
+            for term in set(tokens)
+        }
+    
+    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
+        return self.search_batch([query], k=k)[0]
+    
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Tuple[Dict, float]]]:
+        return [
+            [(self.chunks[idx], float(score)) for idx, score in zip(ids, scores)]
+            for ids, scores in self.search_ids_batch(queries, k=k)
+        ]
+    
+    def search_ids_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        allowed: Optional[RowFilter] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per query, (chunk row ids, BM25 scores) best first, without materializing chunks"""
+        segments = self._segments
+        batch_results = []
+        
+        for query in queries:
+            tokens = self._tokenize(query)
+            # A single segment already carries exact corpus statistics
+            idf = self._global_idf(segments, tokens) if len(segments) > 1 else None
+            
+            all_ids, all_scores = [], []
+            for index, rows in segments:
+                mask, allowed_docs = None, None
+                if allowed is not None:
+                    mask = allowed.prefix(index.num_docs) if rows is None else allowed.for_rows(rows)
+                    if allowed.selective:
+                        allowed_docs = allowed.positions(rows, index.num_docs)
+                doc_ids, scores = index.search(tokens, k=k, allowed=mask, idf=idf, allowed_docs=allowed_docs)
+                all_ids.append(doc_ids if rows is None else rows[doc_ids])
+                all_scores.append(scores)
+            
+            ids, scores = np.concatenate(all_ids), np.concatenate(all_scores)
+            if len(segments) > 1 and len(ids) > k:
+                top = np.argsort(-scores, kind='stable')[:k]
+                ids, scores = ids[top], scores[top]
+            batch_results.append((ids, scores))
         
-        return results
+        return batch_results
     
-    def save(self, path: str):
+    def save(self, path: str, save_chunks: bool = True, compact: bool = False):
+        """Write the main segment (skipped when unchanged) and the delta's row ids.
+
+        compact merges the delta into the main segment first and rewrites the
+        chunk store as a single segment.
+        """
         save_path = Path(path)
         save_path.mkdir(parents=True, exist_ok=True)
         
-        with open(save_path / 'bm25.pkl', 'wb') as f:
-            pickle.dump({'bm25': self.bm25, 'chunks': self.chunks}, f)
+        if compact and self.delta_size:
+            self.rebuild()
+        with self._lock:
+            bm25, main_rows, delta_rows = self.bm25, self.main_rows, self.delta_rows
+            main_saved = self._loaded_from == save_path.resolve()
+        
+        files = [('bm25_delta_rows.npy', delta_rows if len(delta_rows) else None)]
+        if not main_saved:
+            bm25.save(path)
+            files.append(('bm25_rows.npy', main_rows))
+        for name, rows in files:
+            rows_path = save_path / name
+            if rows is not None:
+                save_array(rows_path, np.asarray(rows))
+            elif rows_path.exists():
+                rows_path.unlink()
+        
+        if save_chunks:
+            self.chunks = ChunkStore.persist(self.chunks, save_path / 'chunk_store', compact=compact)
         
         print(f"✅ Saved keyword index to {path}")
     
-    def load(self, path: str):
+    def load(self, path: str, chunk_store: Optional[ChunkStore] = None):
         load_path = Path(path)
         
-        with open(load_path / 'bm25.pkl', 'rb') as f:
-            data = pickle.load(f)
-            self.bm25 = data['bm25']
-            self.chunks = data['chunks']
+        if not (load_path / 'bm25_meta.json').exists() and (load_path / 'bm25.pkl').exists():
+            # Index saved by the rank_bm25 implementation: rebuild postings from its chunks
+            print(f"🔄 Converting legacy rank_bm25 index...")
+            with open(load_path / 'bm25.pkl', 'rb') as f:
+                legacy_chunks = pickle.load(f)['chunks']
+            self.build_index(legacy_chunks)
+            if chunk_store is not None:
+                self.chunks = chunk_store
+            return
+        
+        bm25 = BM25Index()
+        bm25.load(path)
+        rows_path = load_path / 'bm25_rows.npy'
+        rows = np.load(rows_path, mmap_mode='r') if rows_path.exists() else None
+        self.chunks = chunk_store if chunk_store is not None else ChunkStore(load_path / 'chunk_store')
+        
+        delta_path = load_path / 'bm25_delta_rows.npy'
+        delta_rows = np.load(delta_path) if delta_path.exists() else np.zeros(0, dtype=np.int64)
+        delta_tokens = [self._tokenize(self._chunk_text(int(row))) for row in delta_rows]
+        with self._lock:
+            self._set_main(bm25, rows)
+            self._set_delta(delta_tokens, delta_rows)
+            self._loaded_from = load_path.resolve()
         
-        print(f"✅ Loaded keyword index with {len(self.chunks)} documents")
\ No newline at end of file
+        print(f"✅ Loaded keyword index with {len(self.chunks)} documents")
@@ -0,0 +1,196 @@
+import numpy as np
+from typing import List, Optional
+import json
+import os
+from pathlib import Path
+
+# onnx / onnxruntime are optional (requirements-onnx.txt): only needed for query_backend='onnx'
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+except ImportError:
+    ort = None
+
+
+class OnnxQueryEncoder:
+    """Int8-quantized ONNX Runtime version of a SentenceTransformer for query encoding.
+
+    The transformer is exported once to ONNX, dynamically quantized to int8
+    weights, checked against the PyTorch model and cached on disk; pooling and
+    normalization (the remaining SentenceTransformer modules) run in numpy.
+    encode() mirrors SentenceTransformer.encode for the arguments the
+    retrieval code uses.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        tokenizer,
+        pooling: str = 'mean',
+        normalize: bool = True,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None
+    ):
+        if ort is None:
+            raise ImportError("❌ query_backend='onnx' requires onnxruntime (pip install -r requirements-onnx.txt)")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or min(4, os.cpu_count() or 1)
+        self.session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = tokenizer
+        self.pooling = pooling
+        self.normalize = normalize
+        self.max_seq_length = max_seq_length
+        # Smallest cosine vs the PyTorch model, set once parity_check has passed
+        self.parity_cosine = None
+
+        # First run allocates buffers and picks kernels; do it now, not on the first request
+        self.dimension = self.encode(["warm up query"]).shape[1]
+
+    @classmethod
+    def from_sentence_transformer(
+        cls,
+        model,
+        export_dir: str,
+        parity_texts: List[str],
+        min_cosine: float = 0.99,
+        num_threads: Optional[int] = None
+    ) -> 'OnnxQueryEncoder':
+        """Export + quantize model into export_dir, check it against model and load it.
+
+        The tokenizer and the parity result are saved next to the ONNX file, so
+        later starts can serve from load() without the PyTorch model.
+        """
+        export_path = Path(export_dir)
+        export_path.mkdir(parents=True, exist_ok=True)
+        quantized_path = export_path / 'model.int8.onnx'
+        config = cls._export(model, export_path / 'model.onnx', quantized_path)
+        model.tokenizer.save_pretrained(str(export_path / 'tokenizer'))
+
+        encoder = cls(
+            quantized_path,
+            model.tokenizer,
+            pooling=config['pooling'],
+            normalize=config['normalize'],
+            max_seq_length=config['max_seq_length'],
+            num_threads=num_threads
+        )
+        # Written only once the check passes: a diverging export is never served from disk
+        config['parity_cosine'] = encoder.parity_check(model, parity_texts, min_cosine)
+        encoder.parity_cosine = config['parity_cosine']
+        with open(export_path / 'encoder.json', 'w') as f:
+            json.dump(config, f, indent=2)
+        return encoder
+
+    @classmethod
+    def load(cls, export_dir: str, num_threads: Optional[int] = None) -> Optional['OnnxQueryEncoder']:
+        """Load a parity-checked export from export_dir, or None if there isn't one"""
+        export_path = Path(export_dir)
+        config_path = export_path / 'encoder.json'
+        if not config_path.exists():
+            return None
+        with open(config_path) as f:
+            config = json.load(f)
+        # Exports from before parity results were recorded have no saved tokenizer either
+        if 'parity_cosine' not in config:
+            return None
+
+        from transformers import AutoTokenizer
+
+        encoder = cls(
+            export_path / 'model.int8.onnx',
+            AutoTokenizer.from_pretrained(str(export_path / 'tokenizer')),
+            pooling=config['pooling'],
+            normalize=config['normalize'],
+            max_seq_length=config['max_seq_length'],
+            num_threads=num_threads
+        )
+        encoder.parity_cosine = config['parity_cosine']
+        return encoder
+
+    @staticmethod
+    def _export(model, onnx_path: Path, quantized_path: Path) -> dict:
+        if ort is None:
+            raise ImportError("❌ query_backend='onnx' requires onnxruntime (pip install -r requirements-onnx.txt)")
+
+        import torch
+        from sentence_transformers.models import Pooling, Normalize
+
+        print(f"📦 Exporting query encoder to ONNX ({onnx_path})...")
+        transformer = model[0].auto_model.eval()
+        pooling_module = next((m for m in model if isinstance(m, Pooling)), None)
+        pooling = 'cls' if pooling_module is not None and pooling_module.pooling_mode_cls_token else 'mean'
+
+        input_names = [
+            name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+            if name in model.tokenizer.model_input_names
+        ]
+        sample = model.tokenizer(["an example query"], return_tensors='pt')
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                str(onnx_path),
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+        print("🗜️ Quantizing ONNX weights to int8...")
+        quantize_dynamic(str(onnx_path), str(quantized_path), weight_type=QuantType.QInt8)
+        onnx_path.unlink()
+
+        return {
+            'pooling': pooling,
+            'normalize': any(isinstance(m, Normalize) for m in model),
+            'max_seq_length': model.max_seq_length
+        }
+
+    def encode(self, texts: List[str], batch_size: int = 64, **kwargs) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feeds = {name: batch[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(['last_hidden_state'], feeds)[0]
+
+            if self.pooling == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                mask = batch['attention_mask'][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+
+        if not outputs:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.vstack(outputs)
+
+    def parity_check(self, model, texts: List[str], min_cosine: float = 0.99) -> float:
+        """Smallest cosine similarity between this encoder and the PyTorch model on texts.
+
+        Raises ValueError when it falls below min_cosine, since the index was
+        built with the PyTorch vectors and retrieval quality would silently drop.
+        """
+        reference = model.encode(texts, convert_to_numpy=True).astype(np.float32)
+        candidate = self.encode(texts)
+        reference /= np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+        candidate /= np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+        worst = float((reference * candidate).sum(axis=1).min())
+        if worst < min_cosine:
+            raise ValueError(
+                f"❌ ONNX query encoder diverges from PyTorch (min cosine {worst:.4f} < {min_cosine})"
+            )
+        return worst
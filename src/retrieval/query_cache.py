@@ -0,0 +1,77 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings keyed on (model name, normalized query).
+
+    Thread-safe, so one instance can be shared by every VectorSearch in the
+    process (see get_shared_query_cache).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        # The default MiniLM model is uncased, so case and spacing don't change the embedding
+        return ' '.join(query.lower().split())
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, model_name: str, query: str, embedding: np.ndarray):
+        if self.max_size <= 0:
+            return
+        embedding = np.array(embedding, dtype='float32')
+        embedding.setflags(write=False)
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+_shared_cache: Optional[QueryEmbeddingCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_query_cache() -> QueryEmbeddingCache:
+    """Process-wide cache used by VectorSearch unless one is passed explicitly"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryEmbeddingCache()
+        return _shared_cache
@@ -0,0 +1,82 @@
+import faiss
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+
+# Filters allowing at most this fraction of rows are searched by scoring just those rows
+SELECTIVE_RATIO = 1 / 16
+
+
+class RowFilter:
+    """Boolean mask over chunk row ids (True = row may be returned).
+
+    Wraps the mask with the derived forms the retrieval legs need, each built
+    once and reused: a packed bitmap for FAISS ID selectors and per-segment
+    views for the keyword index.
+    """
+
+    def __init__(self, mask: np.ndarray):
+        self.mask = np.asarray(mask, dtype=bool)
+        self._packed: Dict[int, Tuple[Optional[np.ndarray], np.ndarray]] = {}
+        self._views: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._positions: Dict[int, Tuple[Optional[np.ndarray], np.ndarray]] = {}
+        self.count = int(self.mask.sum())
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    @property
+    def selectivity(self) -> float:
+        """Fraction of rows allowed"""
+        return self.count / len(self.mask) if len(self.mask) else 0.0
+
+    @property
+    def selective(self) -> bool:
+        return self.selectivity <= SELECTIVE_RATIO
+
+    def rows(self) -> np.ndarray:
+        """Sorted allowed row ids"""
+        return self.positions(None, len(self.mask))
+
+    def positions(self, rows: Optional[np.ndarray], n: int) -> np.ndarray:
+        """Sorted allowed positions within a segment: of `rows` when given, else of row ids 0..n-1"""
+        key = id(rows) if rows is not None else -n - 1
+        cached = self._positions.get(key)
+        if cached is None or cached[0] is not rows:
+            local = self.prefix(n) if rows is None else self.for_rows(rows)
+            cached = (rows, np.flatnonzero(local).astype(np.int32))
+            self._positions[key] = cached
+        return cached[1]
+
+    def faiss_selector(self, rows: Optional[np.ndarray] = None) -> Tuple[faiss.IDSelector, np.ndarray]:
+        """ID selector for faiss SearchParameters; keep the returned bitmap alive while searching.
+
+        Selects row ids, or positions of `rows` when given (an id-mapped
+        index's position -> row id map, for searching its wrapped index).
+        """
+        key = id(rows) if rows is not None else -1
+        cached = self._packed.get(key)
+        if cached is None or cached[0] is not rows:
+            local = self.mask if rows is None else self.for_rows(rows)
+            cached = (rows, np.packbits(local, bitorder='little'))
+            self._packed[key] = cached
+        packed = cached[1]
+        # The selector's size is in bytes: ids past the bitmap are never selected
+        return faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed)), packed
+
+    def for_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Mask over positions of `rows` (a segment's local doc id -> row id map)"""
+        view = self._views.get(id(rows))
+        if view is None or view[0] is not rows:
+            in_range = rows < len(self.mask)
+            local = np.zeros(len(rows), dtype=bool)
+            local[in_range] = self.mask[rows[in_range]]
+            view = (rows, local)
+            self._views[id(rows)] = view
+        return view[1]
+
+    def prefix(self, n: int) -> np.ndarray:
+        """Mask over row ids 0..n-1 (rows past the mask are not allowed)"""
+        if n <= len(self.mask):
+            return self.mask[:n]
+        return np.concatenate([self.mask, np.zeros(n - len(self.mask), dtype=bool)])
@@ -0,0 +1,377 @@
+import numpy as np
+from multiprocessing.connection import Connection, wait as wait_connections
+from typing import List, Dict, Tuple, Optional, Iterable
+import hashlib
+import itertools
+import json
+import multiprocessing
+import threading
+import time
+import zlib
+from pathlib import Path
+from .bm25_index import CorpusStats
+from .chunk_store import ChunkStore
+from .filters import FilterCache, MetadataFilter
+from .fusion import fuse, FUSION_STRATEGIES
+from .index_format import atomic_path, write_manifest
+from .keyword_search import KeywordSearch
+from .vector_search import VectorSearch
+
+SHARDS_CONFIG = 'shards.json'
+
+
+def shard_of(doc_id: str, num_shards: int) -> int:
+    """Shard a chunk lives in: all chunks of a document share one shard"""
+    return zlib.crc32(str(doc_id).encode('utf-8')) % num_shards
+
+
+def build_shards(
+    chunks: List[Dict],
+    path: str,
+    num_shards: int,
+    index_type: str = 'flat',
+    index_params: Optional[Dict] = None,
+    embedding_cache_dir: Optional[str] = None,
+    embed_workers: int = 1,
+    compress_chunks: bool = False
+) -> Dict:
+    """Partition chunks by document into num_shards independent hybrid indexes.
+
+    Each shard gets its own chunk store, FAISS index and BM25 index under
+    path/shard_<i>. Chunks are embedded once, and every shard's BM25 index
+    uses corpus-wide idf and average length, so scores from different shards
+    can be merged as if they came from one index.
+    """
+    if num_shards < 1:
+        raise ValueError(f"❌ num_shards must be at least 1, got {num_shards}")
+
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    encoder = VectorSearch(
+        index_type=index_type,
+        embedding_cache_dir=embedding_cache_dir,
+        embed_workers=embed_workers,
+        **(index_params or {})
+    )
+    keyword = KeywordSearch()
+
+    print(f"\n🧩 Partitioning {len(chunks)} chunks into {num_shards} shards...")
+    assignment = np.empty(len(chunks), dtype=np.int32)
+    corpus_stats = CorpusStats()
+    for row_id in range(len(chunks)):
+        chunk = chunks[row_id]
+        assignment[row_id] = shard_of(chunk['doc_id'], num_shards)
+        corpus_stats.add(keyword._tokenize(chunk['content']))
+
+    embeddings = encoder.embed_all(chunks)
+
+    shard_sizes = []
+    for shard in range(num_shards):
+        rows = np.flatnonzero(assignment == shard)
+        shard_path = root / f'shard_{shard}'
+        print(f"\n📦 Shard {shard}: {len(rows)} chunks")
+
+        store = ChunkStore.write((chunks[int(row)] for row in rows), shard_path / 'chunk_store', compress=compress_chunks)
+        vector_search = VectorSearch(
+            model_name=encoder.model_name, index_type=index_type, model=encoder.model, **(index_params or {})
+        )
+        vector_search.build_index(store, embeddings=embeddings[rows])
+        keyword_search = KeywordSearch()
+        keyword_search.build_index(store, corpus_stats=corpus_stats)
+
+        vector_search.save(shard_path, save_chunks=False)
+        keyword_search.save(shard_path, save_chunks=False)
+        write_manifest(shard_path, {
+            'vector': {'index_type': index_type, 'model_name': encoder.model_name},
+            'keyword': {'num_docs': len(rows)},
+            'chunk_store': {'compression': store.compression}
+        })
+        shard_sizes.append(len(rows))
+
+    config = {
+        'num_shards': num_shards,
+        'shard_sizes': shard_sizes,
+        'partition': 'crc32(doc_id) % num_shards',
+        'model_name': encoder.model_name,
+        'index_type': index_type
+    }
+    with atomic_path(root / SHARDS_CONFIG) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"\n✅ Built {num_shards} shards in {path}")
+    return config
+
+
+def _shard_worker(path: str, conn: Connection, num_threads: int):
+    """Serve one shard: load its indexes, then answer search requests until told to stop"""
+    import faiss
+    faiss.omp_set_num_threads(num_threads)
+
+    vector_search = VectorSearch(load_model=False)
+    vector_search.load(path)
+    keyword_search = KeywordSearch()
+    keyword_search.load(path, chunk_store=vector_search.chunks)
+    filter_cache = FilterCache()
+    conn.send(('ready', len(vector_search.chunks)))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        request_id, embeddings, queries, depth, ef_search, nprobe, filters = message
+        try:
+            # Shards are read-only, so a compiled filter stays valid for the worker's lifetime
+            allowed = filter_cache.get(filters, 0, vector_search.chunks) if filters else None
+            vector = vector_search.search_embeddings_batch(
+                embeddings, k=depth, ef_search=ef_search, nprobe=nprobe, allowed=allowed
+            )
+            keyword = keyword_search.search_ids_batch(queries, k=depth, allowed=allowed)
+            conn.send((request_id, vector, keyword, None))
+        except Exception as e:
+            conn.send((request_id, None, None, f"{type(e).__name__}: {e}"))
+
+
+class ShardedChunks:
+    """Read-only view of all shard chunk stores under global row ids"""
+
+    def __init__(self, stores: List[ChunkStore]):
+        self.stores = stores
+        self.offsets = np.concatenate([[0], np.cumsum([len(store) for store in stores])]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, row_id: int) -> Dict:
+        shard = int(np.searchsorted(self.offsets, row_id, side='right')) - 1
+        return self.stores[shard][int(row_id - self.offsets[shard])]
+
+    def __iter__(self) -> Iterable[Dict]:
+        for store in self.stores:
+            yield from store
+
+
+class ShardedSearch:
+    """Coordinator for an index built with build_shards.
+
+    Each shard is served by its own local worker process. A query is encoded
+    once here, fanned out to every shard, and the per-shard candidates of
+    each leg are merged under global row ids before a single fusion pass, so
+    score normalization sees the same candidate set a single index would.
+    Shards that miss the deadline are left out of that query's results (and
+    reported in the timings); their late answers are discarded.
+
+    Requests are sent to the shard pipes one batch at a time; concurrent
+    callers are serialized, so batch queries (search_batch) for throughput.
+    """
+
+    def __init__(
+        self,
+        vector_weight: float = 0.7,
+        keyword_weight: float = 0.3,
+        fusion: str = 'weighted',
+        candidate_depth: Optional[int] = None,
+        rrf_k: int = 60,
+        deadline: Optional[float] = None,
+        threads_per_shard: int = 1,
+        query_backend: str = 'torch'
+    ):
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"❌ Unknown fusion strategy '{fusion}' (expected one of {FUSION_STRATEGIES})")
+        self.vector_weight = vector_weight
+        self.keyword_weight = keyword_weight
+        self.fusion = fusion
+        self.candidate_depth = candidate_depth
+        self.rrf_k = rrf_k
+        self.deadline = deadline
+        self.threads_per_shard = threads_per_shard
+        self.query_backend = query_backend
+
+        self.vector_search = None
+        self.config = None
+        self.index_id = None
+        self._processes: List[multiprocessing.Process] = []
+        self._conns: List[Connection] = []
+        self._alive: List[bool] = []
+        self._request_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def chunks(self) -> ShardedChunks:
+        return self.vector_search.chunks
+
+    def load(self, path: str, startup_timeout: float = 300.0):
+        root = Path(path)
+        with open(root / SHARDS_CONFIG) as f:
+            self.config = json.load(f)
+        self.index_id = hashlib.sha256(
+            b''.join((root / f'shard_{i}' / 'manifest.json').read_bytes() for i in range(self.config['num_shards']))
+        ).hexdigest()[:16]
+
+        # Encoder only: the coordinator embeds queries, shards hold the indexes
+        self.vector_search = VectorSearch(model_name=self.config['model_name'], query_backend=self.query_backend)
+        self.vector_search.chunks = ShardedChunks([
+            ChunkStore(root / f'shard_{i}' / 'chunk_store') for i in range(self.config['num_shards'])
+        ])
+
+        context = multiprocessing.get_context('spawn')
+        for shard in range(self.config['num_shards']):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_worker,
+                args=(str(root / f'shard_{shard}'), child_conn, self.threads_per_shard),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._conns.append(parent_conn)
+
+        for shard, conn in enumerate(self._conns):
+            if not conn.poll(startup_timeout):
+                raise RuntimeError(f"❌ Shard {shard} did not start within {startup_timeout}s")
+            conn.recv()
+        self._alive = [True] * len(self._conns)
+        print(f"✅ {len(self._conns)} shard workers ready ({len(self.chunks)} chunks, index id {self.index_id})")
+
+    def close(self):
+        for conn, alive in zip(self._conns, self._alive):
+            if alive:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes, self._conns, self._alive = [], [], []
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[Dict, float]]:
+        return self.search_batch([query], k=k, ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+
+    def search_with_timings(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List[Tuple[Dict, float]], Dict]:
+        results, timings = self.search_batch_with_timings([query], k=k, ef_search=ef_search, nprobe=nprobe, filters=filters)
+        return results[0], timings
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[Dict, float]]]:
+        return self.search_batch_with_timings(queries, k=k, ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+
+    def search_batch_with_timings(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List[List[Tuple[Dict, float]]], Dict]:
+        depth = max(self.candidate_depth or k*2, k)
+        if filters:
+            # Reject malformed filters here rather than once per shard
+            MetadataFilter(filters)
+
+        encode_start = time.perf_counter()
+        embeddings = self.vector_search.encode_queries(queries)
+        timings = {'encode_ms': (time.perf_counter() - encode_start) * 1000}
+
+        shards_start = time.perf_counter()
+        responses, dropped = self._scatter_gather((embeddings, queries, depth, ef_search, nprobe, filters))
+        timings['shards_ms'] = (time.perf_counter() - shards_start) * 1000
+        timings['dropped_shards'] = dropped
+        timings['dropped_legs'] = []
+
+        fusion_start = time.perf_counter()
+        offsets = self.chunks.offsets
+        results = []
+        for q in range(len(queries)):
+            legs = []
+            for leg in (0, 1):
+                ids = [response[leg][q][0] + offsets[shard] for shard, response in responses.items()]
+                scores = [response[leg][q][1] for shard, response in responses.items()]
+                legs.append(self._top(ids, scores, depth))
+            ids, scores = fuse(
+                legs, [self.vector_weight, self.keyword_weight], k, strategy=self.fusion, rrf_k=self.rrf_k
+            )
+            results.append([(self.chunks[idx], float(score)) for idx, score in zip(ids, scores)])
+        timings['fusion_ms'] = (time.perf_counter() - fusion_start) * 1000
+
+        return results, timings
+
+    @staticmethod
+    def _top(ids: List[np.ndarray], scores: List[np.ndarray], depth: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Global top-depth of one leg across shards, best first"""
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids).astype(np.int64), np.concatenate(scores)
+        top = np.argsort(-scores, kind='stable')[:depth]
+        return ids[top], scores[top]
+
+    def _scatter_gather(self, payload: Tuple) -> Tuple[Dict[int, Tuple], List[int]]:
+        """Send one request to every live shard and collect answers until the deadline"""
+        with self._lock:
+            request_id = next(self._request_ids)
+            pending = {}
+            for shard, conn in enumerate(self._conns):
+                if not self._alive[shard]:
+                    continue
+                try:
+                    conn.send((request_id,) + payload)
+                    pending[conn] = shard
+                except (BrokenPipeError, OSError):
+                    print(f"❌ Shard {shard} worker exited")
+                    self._alive[shard] = False
+
+            responses = {}
+            end = None if self.deadline is None else time.perf_counter() + self.deadline
+            while pending:
+                timeout = None if end is None else max(0.0, end - time.perf_counter())
+                ready = wait_connections(list(pending), timeout)
+                if not ready:
+                    if responses:
+                        break
+                    # Every shard blew the deadline: serve whichever answers first
+                    ready = wait_connections(list(pending))
+
+                for conn in ready:
+                    shard = pending[conn]
+                    try:
+                        message = conn.recv()
+                    except EOFError:
+                        print(f"❌ Shard {shard} worker exited")
+                        self._alive[shard] = False
+                        del pending[conn]
+                        continue
+                    if message[0] != request_id:
+                        # Late answer to a request that already gave up on this shard
+                        continue
+                    del pending[conn]
+                    if message[3] is not None:
+                        print(f"❌ Shard {shard} failed: {message[3]}")
+                        continue
+                    responses[shard] = (message[1], message[2])
+
+            dropped = sorted(set(range(len(self._conns))) - set(responses))
+            return responses, dropped
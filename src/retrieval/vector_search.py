@@ -1,27 +1,196 @@
 from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+import json
+import math
+import os
 import pickle
 from pathlib import Path
+from .query_cache import QueryEmbeddingCache, get_shared_query_cache
+from .chunk_store import ChunkStore
+from .row_filter import RowFilter
+from .index_format import atomic_path, save_array
+from .embedding_store import EmbeddingCache
+from .embedding_engine import EmbeddingEngine
+from .onnx_encoder import OnnxQueryEncoder
+
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivf_flat', 'ivf_pq', 'sq8', 'sq_fp16')
+# Scalar-quantized types keep compact codes in RAM and re-score candidates
+# against the full-precision vectors, memory-mapped from disk
+SCALAR_QUANTIZERS = {
+    'sq8': faiss.ScalarQuantizer.QT_8bit,
+    'sq_fp16': faiss.ScalarQuantizer.QT_fp16
+}
+QUERY_BACKENDS = ('torch', 'onnx')
+# Queries the ONNX encoder must reproduce before it replaces the PyTorch model
+PARITY_QUERIES = [
+    "machine learning models",
+    "What are the main limitations of transformer architectures for long documents?",
+    "graph neural networks",
+    "How does reinforcement learning from human feedback work?",
+    "BM25 vs dense retrieval"
+]
+# Chunks embedded per pass when building from a (possibly streamed) store
+EMBED_BATCH_SIZE = 8192
+# What a memory-mapped load maps rather than reads (resident MB for 300k x 384 float32 vectors).
+# faiss >= 1.8 has IO_FLAG_MMAP_IFC, which maps flat and SQ codes (flat 454 -> 17, sq8 125 -> 17)
+# and IVF inverted lists (457 -> 17). Older faiss, including the pinned 1.7.4, falls back to
+# IO_FLAG_MMAP, which maps only IVF inverted lists (457 -> 15).
+# Everything else, including HNSW graphs and flat/SQ codes on faiss < 1.8, is read into RAM.
+MMAP_IO_FLAGS = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
 
 
 class VectorSearch:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        print(f"📥 Loading embedding model: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        self.dimension = self.model.get_sentence_embedding_dimension()
+    def __init__(
+        self,
+        model_name: str = 'all-MiniLM-L6-v2',
+        index_type: str = 'flat',
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        pq_m: int = 48,
+        pq_nbits: int = 8,
+        rescore_factor: int = 4,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        embedding_cache_dir: Optional[str] = None,
+        embed_workers: int = 1,
+        query_backend: str = 'torch',
+        onnx_dir: Optional[str] = None,
+        model: Optional[SentenceTransformer] = None,
+        load_model: bool = True
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"❌ Unknown index type '{index_type}' (expected one of {INDEX_TYPES})")
+        if query_backend not in QUERY_BACKENDS:
+            raise ValueError(f"❌ Unknown query backend '{query_backend}' (expected one of {QUERY_BACKENDS})")
+        
+        self.model_name = model_name
+        # The ONNX backend serves from a parity-checked export without the PyTorch
+        # model; it is only loaded to export, or later on demand to build
+        onnx_dir = onnx_dir or Path('data/models/onnx') / model_name.replace('/', '_')
+        onnx_encoder = OnnxQueryEncoder.load(onnx_dir) if query_backend == 'onnx' else None
+        # A model can be shared between instances; without one (load_model=False) the
+        # index only answers search_embeddings_batch and its dimension comes from load()
+        loaded_here = model is None and load_model and onnx_encoder is None
+        if loaded_here:
+            print(f"📥 Loading embedding model: {model_name}...")
+            model = SentenceTransformer(model_name)
+            print(f"✅ Model loaded (dimension: {model.get_sentence_embedding_dimension()})")
+        if query_backend == 'onnx' and onnx_encoder is None:
+            onnx_encoder = self._export_onnx_encoder(model, onnx_dir)
+            if loaded_here:
+                # Loaded for the export only; the ONNX session answers queries
+                model = None
+        self.model = model
+        self.dimension = model.get_sentence_embedding_dimension() if model is not None else None
+        if onnx_encoder is not None:
+            self.dimension = onnx_encoder.dimension
+        self.index_type = index_type
+        self.index_params = {
+            'hnsw_m': hnsw_m,
+            'ef_construction': ef_construction,
+            'ef_search': ef_search,
+            'nlist': nlist,
+            'nprobe': nprobe,
+            'pq_m': pq_m,
+            'pq_nbits': pq_nbits,
+            'rescore_factor': rescore_factor
+        }
+        self.query_cache = query_cache if query_cache is not None else get_shared_query_cache()
+        # Chunk embeddings persisted across builds, keyed by text hash
+        self.embedding_cache = (
+            EmbeddingCache(embedding_cache_dir, model_name, self.dimension)
+            if embedding_cache_dir else None
+        )
+        # Worker processes for build-time embedding (0 = one per CPU, 1 = in-process)
+        self.embed_workers = embed_workers
+        self._engine = None
         self.index = None
+        # Full-precision vectors by row id, kept only for scalar-quantized indexes
+        self.full_vectors = None
         self.chunks = None
-        print(f"✅ Model loaded (dimension: {self.dimension})")
+        self._loaded_from = None
+        self._mmapped = False
+        # Row id of each position in an id-mapped index, read back lazily
+        self._id_map = None
+        
+        self.query_backend = query_backend
+        self.query_encoder = self.model
+        self._query_cache_key = model_name
+        if onnx_encoder is not None:
+            print(f"✅ ONNX int8 query encoder ready (min cosine vs PyTorch: {onnx_encoder.parity_cosine:.4f})")
+            self.query_encoder = onnx_encoder
+            # Keep ONNX vectors apart from PyTorch ones in the shared query cache
+            self._query_cache_key = f"{model_name}:onnx-int8"
+    
+    @staticmethod
+    def _export_onnx_encoder(model: Optional[SentenceTransformer], export_dir: Path) -> OnnxQueryEncoder:
+        if model is None:
+            raise ValueError(f"❌ No parity-checked ONNX export in {export_dir} and no model to export")
+        return OnnxQueryEncoder.from_sentence_transformer(model, export_dir, PARITY_QUERIES)
     
+    def _embedding_model(self) -> SentenceTransformer:
+        """PyTorch model for chunk embeddings, loaded on first use when serving without it"""
+        if self.model is None:
+            print(f"📥 Loading embedding model: {self.model_name}...")
+            self.model = SentenceTransformer(self.model_name)
+        return self.model
     
     def create_embeddings(self, chunks: List[Dict]) -> np.ndarray:
         texts = [chunk['content'] for chunk in chunks]
         
+        if self.embedding_cache is None:
+            return self._encode_texts(texts)
+        
+        keys = [EmbeddingCache.text_key(text) for text in texts]
+        embeddings, found = self.embedding_cache.get(keys)
+        missing = np.flatnonzero(~found)
+        print(f"♻️ Reusing {int(found.sum())} cached embeddings, {len(missing)} chunks need encoding")
+        
+        if len(missing):
+            encoded = self._encode_texts([texts[i] for i in missing])
+            embeddings[missing] = encoded
+            self.embedding_cache.put([keys[i] for i in missing], encoded)
+        
+        return embeddings
+    
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        tokenizer = getattr(self._embedding_model(), 'tokenizer', None)
+        if tokenizer is None:
+            return np.array([len(text) for text in texts], dtype=np.int64)
+        encoded = tokenizer(texts, add_special_tokens=False, truncation=True)['input_ids']
+        return np.array([len(ids) for ids in encoded], dtype=np.int64)
+    
+    def _embedding_engine(self) -> Optional[EmbeddingEngine]:
+        if self.embed_workers == 1 or (self.embed_workers == 0 and (os.cpu_count() or 1) == 1):
+            return None
+        if self._engine is None:
+            self._engine = EmbeddingEngine(
+                self.model_name,
+                workers=self.embed_workers or None,
+                length_fn=self._token_lengths
+            )
+        return self._engine
+    
+    def close_embedding_engine(self):
+        """Shut down build-time embedding workers (they are restarted on demand)"""
+        if self._engine is not None:
+            self._engine.close()
+            self._engine = None
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
         print(f"🔢 Generating embeddings for {len(texts)} chunks...")
+        engine = self._embedding_engine() if texts else None
+        if engine is not None:
+            print(f"⚙️ Using {engine.workers} worker processes x {engine.threads_per_worker} threads, length-bucketed")
+            return engine.encode(texts)
+        
         print("⏰ This takes ~10-15 minutes on CPU...")
-        embeddings = self.model.encode(
+        embeddings = self._embedding_model().encode(
             texts,
             show_progress_bar=True,
             batch_size=32,
@@ -30,43 +199,408 @@ class VectorSearch:
         
         return embeddings.astype('float32')
     
-    def build_index(self, chunks: List[Dict]):
+    def _create_index(self, num_vectors: int) -> faiss.Index:
+        """Create an empty FAISS index of the configured type, sized for num_vectors"""
+        params = self.index_params
+        
+        if self.index_type == 'flat':
+            return faiss.IndexFlatL2(self.dimension)
+        
+        if self.index_type in SCALAR_QUANTIZERS:
+            return faiss.IndexScalarQuantizer(
+                self.dimension, SCALAR_QUANTIZERS[self.index_type], faiss.METRIC_L2
+            )
+        
+        if self.index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(self.dimension, params['hnsw_m'])
+            index.hnsw.efConstruction = params['ef_construction']
+            index.hnsw.efSearch = params['ef_search']
+            return index
+        
+        # IVF: ~4*sqrt(N) lists by default, capped so every list gets enough training points
+        nlist = params['nlist'] or int(4 * math.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // 39))
+        quantizer = faiss.IndexFlatL2(self.dimension)
+        
+        if self.index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist)
+        else:
+            if self.dimension % params['pq_m'] != 0:
+                raise ValueError(f"❌ pq_m={params['pq_m']} must divide dimension {self.dimension}")
+            nbits = max(1, min(params['pq_nbits'], int(math.log2(max(num_vectors, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, params['pq_m'], nbits)
+        
+        index.nprobe = min(params['nprobe'], nlist)
+        return index
+    
+    def embed_all(self, chunks: List[Dict]) -> np.ndarray:
+        """Embed every chunk, in batches so only one batch of chunk text is
+        materialized at a time (chunks may be a memory-mapped ChunkStore)"""
+        embeddings = np.empty((len(chunks), self.dimension), dtype=np.float32)
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+            end = min(start + EMBED_BATCH_SIZE, len(chunks))
+            embeddings[start:end] = self.create_embeddings([chunks[i] for i in range(start, end)])
+        self.close_embedding_engine()
+        return embeddings
+    
+    def build_index(self, chunks: List[Dict], embeddings: Optional[np.ndarray] = None):
         self.chunks = chunks
-        embeddings = self.create_embeddings(chunks)
+        if embeddings is None:
+            embeddings = self.embed_all(chunks)
         
-        print(f"🏗️ Building FAISS index...")
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.index.add(embeddings)
+        print(f"🏗️ Building FAISS index ({self.index_type})...")
+        # Vectors are stored under their chunk row ids so rows can be added and removed later
+        self.index = faiss.IndexIDMap2(self._create_index(len(embeddings)))
+        self._loaded_from = None
+        self._mmapped = False
+        self._id_map = None
+        if not self.index.is_trained:
+            print(f"🎯 Training index on {len(embeddings)} vectors...")
+            self.index.train(embeddings)
+        self.index.add_with_ids(embeddings, np.arange(len(embeddings), dtype=np.int64))
+        self.full_vectors = embeddings if self.index_type in SCALAR_QUANTIZERS else None
         
         print(f"✅ Index built with {self.index.ntotal} vectors")
+        if self.full_vectors is not None:
+            report = self.memory_report()
+            print(f"   Vector RAM: {report['index_bytes'] / 2**20:.1f} MB "
+                  f"(flat: {report['flat_bytes'] / 2**20:.1f} MB, saved {report['saved_ratio']:.0%})")
+    
+    def _ensure_writable(self):
+        """Swap a read-only memory-mapped index for an in-memory copy before mutating it"""
+        if self._mmapped:
+            self.index = faiss.read_index(str(self._loaded_from / 'faiss.index'))
+            self._mmapped = False
+        if isinstance(self.full_vectors, np.memmap):
+            self.full_vectors = np.array(self.full_vectors)
+        self._loaded_from = None
+        self._id_map = None
+    
+    def _is_id_mapped(self) -> bool:
+        return isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+    
+    def _row_ids(self) -> Optional[np.ndarray]:
+        """Row id of each position in the wrapped index; None when positions are row ids"""
+        if not self._is_id_mapped():
+            return None
+        if self._id_map is None:
+            self._id_map = faiss.vector_to_array(self.index.id_map)
+        return self._id_map
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
-        query_embedding = self.model.encode([query]).astype('float32')
-        distances, indices = self.index.search(query_embedding, k)
+    def add(self, chunks: List[Dict], row_ids: List[int], embeddings: Optional[np.ndarray] = None):
+        """Index new chunks under the given row ids (embedding them unless embeddings are given)"""
+        if embeddings is None:
+            embeddings = self.create_embeddings(chunks)
+        ids = np.asarray(row_ids, dtype=np.int64)
+        self._ensure_writable()
+        if self.full_vectors is not None and len(ids):
+            size = max(len(self.full_vectors), int(ids.max()) + 1)
+            if size > len(self.full_vectors):
+                grown = np.zeros((size, self.dimension), dtype=np.float32)
+                grown[:len(self.full_vectors)] = self.full_vectors
+                self.full_vectors = grown
+            self.full_vectors[ids] = embeddings
         
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            similarity = 1 / (1 + dist)
-            results.append((self.chunks[idx], similarity))
+        if self._is_id_mapped():
+            self.index.add_with_ids(embeddings, ids)
+            self._id_map = None
+        elif len(ids) and ids[0] == self.index.ntotal and np.all(np.diff(ids) == 1):
+            # Indexes built before id mapping use sequential ids, which still line up with rows
+            self.index.add(embeddings)
+        else:
+            raise ValueError("❌ This index stores vectors by position; rebuild it to add non-sequential rows")
+    
+    def remove(self, row_ids: List[int]) -> int:
+        """Physically drop vectors where the index type allows it; returns how many were removed.
+
+        Only flat and scalar-quantized indexes compact their storage the way
+        IndexIDMap2 compacts its id map. HNSW graphs can't remove vectors, and
+        removing from IVF lists leaves the id map pointing at the wrong rows,
+        so those keep deleted vectors; callers must keep excluding deleted
+        rows at query time either way.
+        """
+        if not self._is_id_mapped() or not len(row_ids):
+            return 0
+        if self.index_type != 'flat' and self.index_type not in SCALAR_QUANTIZERS:
+            return 0
+        self._ensure_writable()
+        self._id_map = None
+        return self.index.remove_ids(np.asarray(row_ids, dtype=np.int64))
+    
+    def _base_index(self) -> faiss.Index:
+        return faiss.downcast_index(self.index.index) if self._is_id_mapped() else self.index
+    
+    def _search_params(
+        self,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        selector: Optional[faiss.IDSelector] = None
+    ) -> Optional[faiss.SearchParameters]:
+        """Per-query recall/latency knobs and ID selector for the base index; None keeps its defaults.
+
+        HNSW and IVF indexes only accept their own parameter classes, so those
+        are used even when only a selector is set.
+        """
+        extra = {'sel': selector} if selector is not None else {}
+        
+        if self.index_type == 'hnsw' and (ef_search is not None or extra):
+            ef_search = ef_search or self._base_index().hnsw.efSearch
+            return faiss.SearchParametersHNSW(efSearch=ef_search, **extra)
+        if self.index_type in ('ivf_flat', 'ivf_pq') and (nprobe is not None or extra):
+            nprobe = nprobe or faiss.extract_index_ivf(self._base_index()).nprobe
+            return faiss.SearchParametersIVF(nprobe=nprobe, **extra)
+        if extra:
+            return faiss.SearchParameters(**extra)
+        return None
+    
+    def _search_index(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        allowed: Optional[RowFilter] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(distances, row ids) of the k nearest vectors, -1 padded.
+
+        IndexIDMap rejects search parameters (faiss 1.7), so id-mapped indexes
+        are searched through their wrapped index, with the row filter
+        translated to its positions and the labels mapped back to row ids.
+        """
+        row_ids = self._row_ids()
+        selector, _bitmap = allowed.faiss_selector(row_ids) if allowed is not None else (None, None)
+        params = self._search_params(ef_search, nprobe, selector)
+        distances, labels = self._base_index().search(query_embeddings, k, params=params)
+        if row_ids is not None and len(row_ids):
+            labels = np.where(labels >= 0, row_ids[np.maximum(labels, 0)], -1)
+        return distances, labels
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries, serving repeats from the cache and encoding the rest in one forward pass"""
+        embeddings = [self.query_cache.get(self._query_cache_key, query) for query in queries]
+        
+        normalize = self.query_cache.normalize
+        missing = {}
+        for query, embedding in zip(queries, embeddings):
+            if embedding is None:
+                missing.setdefault(normalize(query), query)
         
-        return results
+        if missing:
+            encoded = self.query_encoder.encode(
+                list(missing.values()), batch_size=64, convert_to_numpy=True
+            ).astype('float32')
+            fresh = dict(zip(missing.keys(), encoded))
+            for query, embedding in zip(missing.values(), encoded):
+                self.query_cache.put(self._query_cache_key, query, embedding)
+            embeddings = [
+                e if e is not None else fresh[normalize(q)]
+                for q, e in zip(queries, embeddings)
+            ]
+        
+        return np.vstack(embeddings).astype('float32')
+    
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[Dict, float]]:
+        return self.search_batch([query], k=k, ef_search=ef_search, nprobe=nprobe)[0]
     
-    def save(self, path: str):
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[Dict, float]]]:
+        return [
+            [(self.chunks[idx], float(score)) for idx, score in zip(ids, scores)]
+            for ids, scores in self.search_ids_batch(queries, k=k, ef_search=ef_search, nprobe=nprobe)
+        ]
+    
+    def search_ids_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        allowed: Optional[RowFilter] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per query, (chunk row ids, similarities) best first, without materializing chunks"""
+        if not queries:
+            return []
+        return self.search_embeddings_batch(
+            self.encode_queries(queries), k=k, ef_search=ef_search, nprobe=nprobe, allowed=allowed
+        )
+    
+    def search_embeddings_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        allowed: Optional[RowFilter] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search_ids_batch for already-encoded queries"""
+        if len(query_embeddings) == 0:
+            return []
+        
+        if allowed is not None and allowed.selective:
+            exact = self._search_within(query_embeddings, k, allowed.rows())
+            if exact is not None:
+                return exact
+        
+        if self.full_vectors is not None:
+            # Over-fetch from the quantized codes, then re-rank exactly
+            depth = k * max(1, self.index_params['rescore_factor'])
+            _, indices = self._search_index(query_embeddings, depth, ef_search, nprobe, allowed)
+            return [
+                self._rescore(query, row_indices, k)
+                for query, row_indices in zip(query_embeddings, indices)
+            ]
+        
+        distances, indices = self._search_index(query_embeddings, k, ef_search, nprobe, allowed)
+        
+        batch_results = []
+        for row_distances, row_indices in zip(distances, indices):
+            # Approximate indexes pad with -1 when fewer than k neighbours are found
+            found = row_indices >= 0
+            similarities = 1 / (1 + row_distances[found])
+            batch_results.append((row_indices[found], similarities))
+        
+        return batch_results
+    
+    def _search_within(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        rows: np.ndarray
+    ) -> Optional[List[Tuple[np.ndarray, np.ndarray]]]:
+        """Exact search over just the given rows, for filters that allow few of them.
+
+        Cheaper than walking the whole index with an ID selector, and exact
+        even on HNSW. None when the index can't hand back its vectors.
+        """
+        if not len(rows):
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))] * len(query_embeddings)
+        if self.full_vectors is not None:
+            vectors = np.asarray(self.full_vectors[rows], dtype=np.float32)
+        elif self.index_type in ('flat', 'hnsw') and self._is_id_mapped():
+            try:
+                vectors = self.index.reconstruct_batch(rows.astype(np.int64))
+            except RuntimeError:
+                return None
+        else:
+            return None
+        
+        distances = faiss.pairwise_distances(query_embeddings, vectors)
+        batch_results = []
+        for row_distances in distances:
+            top = np.argsort(row_distances, kind='stable')[:k]
+            batch_results.append((rows[top].astype(np.int64), 1 / (1 + row_distances[top])))
+        return batch_results
+    
+    def _rescore(self, query: np.ndarray, row_indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact L2 re-ranking of quantized candidates against the full-precision vectors"""
+        candidates = row_indices[row_indices >= 0]
+        # Sorted reads keep page faults on the memory-mapped vectors sequential
+        candidates = np.sort(candidates)
+        distances = ((self.full_vectors[candidates] - query) ** 2).sum(axis=1)
+        top = np.argsort(distances, kind='stable')[:k]
+        return candidates[top], 1 / (1 + distances[top])
+    
+    def memory_report(self) -> Dict:
+        """Bytes held by the index's vector codes against a flat float32 index of the same size"""
+        num_vectors = self.index.ntotal
+        flat_bytes = num_vectors * self.dimension * 4
+        base = self._base_index()
+        code_size = base.sa_code_size() if hasattr(base, 'sa_code_size') else self.dimension * 4
+        index_bytes = num_vectors * code_size
+        return {
+            'num_vectors': num_vectors,
+            'flat_bytes': flat_bytes,
+            'index_bytes': index_bytes,
+            'saved_bytes': flat_bytes - index_bytes,
+            'saved_ratio': 1 - index_bytes / flat_bytes if flat_bytes else 0.0,
+            'full_vectors_on_disk': self.full_vectors is not None
+        }
+    
+    def recall_vs_flat(self, query_embeddings: np.ndarray, k: int = 10, batch_size: int = 256) -> float:
+        """recall@k of this index against exact search over the full-precision vectors"""
+        if self.full_vectors is None:
+            raise ValueError("❌ Recall against flat needs the full-precision vectors (scalar-quantized index types)")
+        # Ground truth covers only rows still in the index
+        row_ids = self._row_ids()
+        live = np.sort(row_ids) if row_ids is not None else np.arange(self.index.ntotal)
+        exact_vectors = np.ascontiguousarray(self.full_vectors[live], dtype=np.float32)
+        hits = 0
+        for start in range(0, len(query_embeddings), batch_size):
+            batch = np.ascontiguousarray(query_embeddings[start:start + batch_size], dtype=np.float32)
+            _, exact = faiss.knn(batch, exact_vectors, k)
+            found = self.search_embeddings_batch(batch, k=k)
+            for exact_rows, (rows, _) in zip(exact, found):
+                hits += len(set(live[exact_rows].tolist()) & set(rows.tolist()))
+        return hits / (len(query_embeddings) * k) if len(query_embeddings) else 1.0
+    
+    def save(self, path: str, save_chunks: bool = True):
         save_path = Path(path)
         save_path.mkdir(parents=True, exist_ok=True)
         
-        faiss.write_index(self.index, str(save_path / 'faiss.index'))
+        # A loaded index may be memory-mapped from this very file and is unchanged
+        if self._loaded_from != save_path.resolve():
+            with atomic_path(save_path / 'faiss.index') as tmp_path:
+                faiss.write_index(self.index, str(tmp_path))
+            if self.full_vectors is not None:
+                save_array(save_path / 'vectors.f32.npy', np.asarray(self.full_vectors, dtype=np.float32))
         
-        with open(save_path / 'chunks.pkl', 'wb') as f:
-            pickle.dump(self.chunks, f)
+        with open(save_path / 'vector_config.json', 'w') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'dimension': self.dimension,
+                'index_type': self.index_type,
+                'index_params': self.index_params
+            }, f, indent=2)
+        
+        if save_chunks:
+            self.chunks = ChunkStore.persist(self.chunks, save_path / 'chunk_store')
         
         print(f"✅ Saved vector index to {path}")
     
-    def load(self, path: str):
+    def load(self, path: str, chunk_store: Optional[ChunkStore] = None, mmap: bool = True):
         load_path = Path(path)
-        self.index = faiss.read_index(str(load_path / 'faiss.index'))
+        # Only the parts MMAP_IO_FLAGS covers stay on disk; the full vectors, BM25
+        # arrays and chunk store are memory-mapped separately, for every index type
+        io_flags = MMAP_IO_FLAGS if mmap else 0
+        self.index = faiss.read_index(str(load_path / 'faiss.index'), io_flags)
+        self._loaded_from = load_path.resolve()
+        self._mmapped = mmap
+        self._id_map = None
+        
+        # Indexes saved before index types existed have no config and are flat
+        config_path = load_path / 'vector_config.json'
+        if config_path.exists():
+            with open(config_path) as f:
+                config = json.load(f)
+            self.index_type = config['index_type']
+            self.index_params.update(config['index_params'])
+            self.dimension = config['dimension']
+        else:
+            self.index_type = 'flat'
+        
+        self.full_vectors = None
+        if self.index_type in SCALAR_QUANTIZERS:
+            # Only re-scored candidates are read, so the full vectors stay on disk
+            self.full_vectors = np.load(load_path / 'vectors.f32.npy', mmap_mode='r' if mmap else None)
         
-        with open(load_path / 'chunks.pkl', 'rb') as f:
-            self.chunks = pickle.load(f)
+        if chunk_store is not None:
+            self.chunks = chunk_store
+        elif ChunkStore.exists(load_path / 'chunk_store'):
+            self.chunks = ChunkStore(load_path / 'chunk_store')
+        else:
+            # Indexes saved before the chunk store pickled the chunk list
+            with open(load_path / 'chunks.pkl', 'rb') as f:
+                self.chunks = pickle.load(f)
         
-        print(f"✅ Loaded index with {self.index.ntotal} vectors")
\ No newline at end of file
+        print(f"✅ Loaded {self.index_type} index with {self.index.ntotal} vectors")
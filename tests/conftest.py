@@ -0,0 +1,62 @@
+import sys
+import zlib
+from pathlib import Path
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+WORDS = [f"w{i}" for i in range(300)]
+
+
+class HashingEncoder:
+    """Stand-in for SentenceTransformer: L2-normalized hashed bag of words, no model download"""
+
+    def __init__(self, model_name: str = 'hashing', dimension: int = 32):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                vectors[i, zlib.crc32(token.encode('utf-8')) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def make_chunks(num_docs: int = 120, chunks_per_doc: int = 5, seed: int = 0):
+    """Chunk dicts shaped like DocumentChunker output, with Zipf-distributed words"""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for doc in range(num_docs):
+        doc_id = f"doc{doc}"
+        for index in range(chunks_per_doc):
+            ids = np.minimum(rng.zipf(1.3, int(rng.integers(20, 80))) - 1, len(WORDS) - 1)
+            content = " ".join(WORDS[j] for j in ids)
+            chunks.append({
+                'chunk_id': f"{doc_id}_chunk_{index}",
+                'doc_id': doc_id,
+                'doc_title': f"Title {doc}",
+                'chunk_index': index,
+                'content': content,
+                'metadata': {
+                    'total_chunks': chunks_per_doc,
+                    'char_count': len(content),
+                    'word_count': len(content.split())
+                }
+            })
+    return chunks
+
+
+@pytest.fixture(autouse=True)
+def hashing_encoder(monkeypatch):
+    import retrieval.vector_search as vector_search
+    monkeypatch.setattr(vector_search, 'SentenceTransformer', HashingEncoder)
+
+
+@pytest.fixture
+def chunks():
+    return make_chunks()
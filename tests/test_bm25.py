@@ -0,0 +1,83 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from conftest import make_chunks
+from retrieval.bm25_index import BM25Index
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    docs = [chunk['content'].split() for chunk in make_chunks(num_docs=200)]
+    index = BM25Index()
+    index.build(docs)
+    return docs, index
+
+
+def exhaustive_scores(index, docs, tokens):
+    """Okapi BM25 of every document, scored directly from the token lists"""
+    avgdl = np.mean([len(doc) for doc in docs])
+    scores = np.zeros(len(docs))
+    for term, count in Counter(tokens).items():
+        if term not in index.vocab:
+            continue
+        idf = index.idf[index.vocab[term]]
+        for doc_id, doc in enumerate(docs):
+            tf = doc.count(term)
+            norm = index.k1 * (1 - index.b + index.b * len(doc) / avgdl)
+            scores[doc_id] += count * idf * tf * (index.k1 + 1) / (tf + norm)
+    return scores
+
+
+def assert_top_k(ids, scores, reference, k, allowed=None):
+    candidates = reference if allowed is None else np.where(allowed, reference, -np.inf)
+    expected = np.sort(candidates[candidates > 0])[::-1][:k]
+    np.testing.assert_allclose(scores, expected, rtol=1e-4)
+    # Ties may come back in any order, but every returned doc must carry its true score
+    np.testing.assert_allclose(reference[ids], scores, rtol=1e-4)
+
+
+QUERIES = ['w0 w1', 'w3 w17 w60', 'w120 w250', 'w0 w0 w5', 'w299 w2 w40 w7 w11', 'w1']
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('k', [1, 5, 50])
+def test_pruned_search_matches_exhaustive_scoring(corpus, query, k):
+    docs, index = corpus
+    tokens = query.split()
+    ids, scores = index.search(tokens, k=k)
+    assert_top_k(ids, scores, exhaustive_scores(index, docs, tokens), k)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_pruned_search_with_mask_matches_exhaustive_scoring(corpus, query):
+    docs, index = corpus
+    tokens = query.split()
+    allowed = np.random.default_rng(1).random(len(docs)) < 0.5
+    reference = exhaustive_scores(index, docs, tokens)
+
+    ids, scores = index.search(tokens, k=10, allowed=allowed)
+    assert allowed[ids].all()
+    assert_top_k(ids, scores, reference, 10, allowed)
+
+    # The selective path scores only the listed documents
+    ids, scores = index.search(tokens, k=10, allowed=allowed, allowed_docs=np.flatnonzero(allowed).astype(np.int32))
+    assert_top_k(ids, scores, reference, 10, allowed)
+
+
+def test_unknown_terms_return_nothing(corpus):
+    _, index = corpus
+    ids, scores = index.search(['nope'], k=5)
+    assert len(ids) == 0 and len(scores) == 0
+
+
+def test_save_load_keeps_scores(corpus, tmp_path):
+    docs, index = corpus
+    index.save(str(tmp_path))
+    loaded = BM25Index()
+    loaded.load(str(tmp_path))
+    for query in QUERIES:
+        expected, got = index.search(query.split(), k=10), loaded.search(query.split(), k=10)
+        np.testing.assert_array_equal(got[0], expected[0])
+        np.testing.assert_allclose(got[1], expected[1])
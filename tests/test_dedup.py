@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import ingestion.dedup as dedup
+from ingestion.dedup import MinHashDeduplicator
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+def text(seed: int, length: int = 200) -> str:
+    rng = np.random.default_rng(seed)
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), length))
+
+
+def chunk(chunk_id: str, content: str) -> dict:
+    return {'chunk_id': chunk_id, 'content': content}
+
+
+def kept_ids(deduplicator, chunks):
+    return [c['chunk_id'] for c in deduplicator.filter(chunks)]
+
+
+def test_exact_and_near_duplicates_are_dropped():
+    original = text(0)
+    words = original.split()
+    words[100] = 'changed'
+    chunks = [chunk('a', original), chunk('b', text(1)), chunk('a_copy', original), chunk('a_near', ' '.join(words))]
+
+    deduplicator = MinHashDeduplicator(threshold=0.8)
+    assert kept_ids(deduplicator, chunks) == ['a', 'b']
+    assert deduplicator.stats['duplicates'] == 2
+    assert deduplicator.stats['chunks_out'] == 2
+
+
+def test_overlap_below_threshold_is_kept():
+    # The second half is new: ~1/3 of shingles shared, well under 0.8
+    first, second = text(0).split(), text(1).split()
+    half = ' '.join(first[:100] + second[100:])
+    chunks = [chunk('a', text(0)), chunk('half', half), chunk('other', text(2))]
+    assert kept_ids(MinHashDeduplicator(threshold=0.8), chunks) == ['a', 'half', 'other']
+
+
+def test_cluster_mode_records_duplicates_under_their_representative(tmp_path):
+    chunks = [
+        chunk('a', text(0)), chunk('b', text(1)), chunk('a2', text(0)),
+        chunk('b2', text(1)), chunk('a3', text(0))
+    ]
+    deduplicator = MinHashDeduplicator(mode='cluster', batch_size=2)
+    assert kept_ids(deduplicator, chunks) == ['a', 'b']
+    assert deduplicator.clusters == {'a': ['a2', 'a3'], 'b': ['b2']}
+
+    # Drop mode removes the same chunks without recording them
+    dropping = MinHashDeduplicator(mode='drop')
+    assert kept_ids(dropping, chunks) == ['a', 'b']
+    assert dropping.clusters == {}
+
+
+def test_chunks_without_words_are_kept():
+    chunks = [chunk('a', text(0)), chunk('empty', ''), chunk('punct', '...'), chunk('empty2', '')]
+    assert kept_ids(MinHashDeduplicator(), chunks) == ['a', 'empty', 'punct', 'empty2']
+
+
+@pytest.mark.parametrize('block', [1, 150, 1000])
+def test_blocked_signatures_match_one_pass(monkeypatch, block):
+    texts = [text(seed, length) for seed, length in enumerate([200, 0, 5, 400, 1, 90])]
+    deduplicator = MinHashDeduplicator()
+    monkeypatch.setattr(dedup, 'SIGNATURE_BLOCK_SHINGLES', 10 ** 9)
+    expected = deduplicator.signatures(texts)
+    monkeypatch.setattr(dedup, 'SIGNATURE_BLOCK_SHINGLES', block)
+    np.testing.assert_array_equal(deduplicator.signatures(texts), expected)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from conftest import make_chunks
+from retrieval.chunk_store import ChunkStore
+from retrieval.filters import MetadataFilter
+
+
+@pytest.fixture
+def store(tmp_path):
+    chunks = make_chunks(num_docs=20)
+    chunks[3]['metadata'] = dict(chunks[3]['metadata'], tags=['a', 'b'])
+    return ChunkStore.write(chunks, tmp_path / 'store')
+
+
+@pytest.mark.parametrize('expression', [
+    {'doc_id': {'in': [[1]]}},
+    {'doc_id': {'nin': [{'a': 1}]}},
+    {'metadata.word_count': {'range': [10]}},
+    {'metadata.word_count': {'range': [10, 'x']}},
+    {'metadata.word_count': {'gte': '10'}},
+    {'doc_id': {'between': [1, 2]}},
+    {'$or': {'doc_id': 'doc1'}}
+])
+def test_malformed_filters_raise_value_error(expression):
+    with pytest.raises(ValueError):
+        MetadataFilter(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    {'metadata.word_count': {'range': [30, 50]}},
+    {'chunk_index': {'range': [1, 2]}, 'doc_id': {'nin': ['doc1', 'doc2']}},
+    {'doc_title': {'prefix': 'Title 1'}, '$not': {'chunk_index': 0}},
+    {'metadata.tags': {'in': ['a', 'c']}},
+    {'metadata.tags': {'nin': ['a']}}
+])
+def test_store_mask_matches_record_by_record(expression, store):
+    compiled = MetadataFilter(expression)
+    expected = np.array([compiled.matches(store[row]) for row in range(len(store))])
+    assert (compiled.mask(store) == expected).all()
+
+
+def test_range_is_inclusive(store):
+    mask = MetadataFilter({'metadata.word_count': {'range': [30, 50]}}).mask(store)
+    counts = np.array([store[row]['metadata']['word_count'] for row in range(len(store))])
+    assert (mask == ((counts >= 30) & (counts <= 50))).all()
+    assert mask.any()
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from retrieval.fusion import FUSION_STRATEGIES, fuse, zscore_normalize
+
+
+def test_zscore_of_constant_scores_is_neutral_positive():
+    np.testing.assert_array_equal(zscore_normalize(np.array([2.5, 2.5, 2.5])), np.ones(3))
+    np.testing.assert_array_equal(zscore_normalize(np.array([4.0])), np.ones(1))
+
+
+@pytest.mark.parametrize('strategy', FUSION_STRATEGIES)
+def test_single_result_leg_still_contributes(strategy):
+    # A one-result leg has zero spread; its chunk must still gain from it
+    vector = (np.array([1, 2, 3]), np.array([0.9, 0.8, 0.1]))
+    keyword = (np.array([3]), np.array([7.0]))
+    alone = dict(zip(*fuse([vector], [0.5], k=3, strategy=strategy)))
+    fused = dict(zip(*fuse([vector, keyword], [0.5, 0.5], k=3, strategy=strategy)))
+    assert fused[3] > alone[3]
+    assert fused[1] == pytest.approx(alone[1])
+
+
+def test_fuse_returns_top_k_best_first():
+    vector = (np.array([1, 2, 3, 4]), np.array([0.9, 0.7, 0.5, 0.1]))
+    keyword = (np.array([4, 2]), np.array([3.0, 1.0]))
+    ids, scores = fuse([vector, keyword], [0.7, 0.3], k=2)
+    assert len(ids) == 2
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_zscore_missing_chunk_never_beats_a_returned_one():
+    vector = (np.array([1, 2, 3]), np.array([0.9, 0.5, 0.1]))
+    keyword = (np.array([3, 4, 5]), np.array([9.0, 5.0, 1.0]))
+    ids, scores = fuse([vector, keyword], [0.7, 0.3], k=5, strategy='zscore')
+    fused = dict(zip(ids, scores))
+    # Chunk 3 is the top keyword hit and in both legs: it must beat the keyword-only chunks
+    assert fused[3] > fused[4] > fused[5]
+    assert fused[2] > fused[4]
+    assert np.all(scores >= 0)
+    assert list(ids) == [1, 2, 3, 4, 5]
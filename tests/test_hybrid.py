@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from conftest import make_chunks
+from retrieval.hybrid import HybridSearch
+from retrieval.vector_search import INDEX_TYPES
+
+INDEX_PARAMS = {'ivf_pq': {'pq_m': 8}}
+
+
+def build(index_type, chunks):
+    hybrid = HybridSearch(index_type=index_type, index_params=INDEX_PARAMS.get(index_type))
+    hybrid.build_index(chunks)
+    return hybrid
+
+
+def assert_exact_lookups(hybrid, rows):
+    """Every row's own text finds that row first in the vector leg, and nothing deleted comes back"""
+    queries = [hybrid.chunks[int(row)]['content'] for row in rows]
+    results = hybrid.vector_search.search_ids_batch(queries, k=5, allowed=hybrid._live_filter)
+    for row, (ids, _) in zip(rows, results):
+        assert ids[0] == row
+        assert not hybrid.deleted[ids].any()
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+def test_add_update_delete_then_search(index_type):
+    chunks = make_chunks(num_docs=100)
+    hybrid = build(index_type, chunks[:400])
+    extra = make_chunks(num_docs=100, seed=1)[400:]
+
+    added = hybrid.add_documents(extra[:25])
+    assert added == list(range(400, 425))
+    assert_exact_lookups(hybrid, added)
+
+    assert hybrid.delete_documents([f"doc{i}" for i in range(10)]) == 50
+    assert_exact_lookups(hybrid, np.flatnonzero(~hybrid.deleted)[:40])
+
+    # Replace doc80 (rows 400-404) with new text, then add and delete more
+    replaced = [dict(chunk, doc_id='doc80') for chunk in extra[25:30]]
+    updated = hybrid.update_documents(replaced)
+    assert hybrid.deleted[400:405].all()
+    hybrid.add_documents(extra[30:40])
+    assert hybrid.delete_documents(['doc81']) == 5
+    assert hybrid.deleted[405:410].all()
+
+    live = np.flatnonzero(~hybrid.deleted)
+    assert_exact_lookups(hybrid, updated)
+    assert_exact_lookups(hybrid, live[::10])
+    for chunk, _ in hybrid.search(extra[5]['content'], k=10):
+        assert chunk['doc_id'] not in {'doc81'} | {f"doc{i}" for i in range(10)}
+
+    keyword_ids, _ = hybrid.keyword_search.search_ids_batch([replaced[0]['content']], k=10, allowed=hybrid._live_filter)[0]
+    assert updated[0] in keyword_ids
+    assert not hybrid.deleted[keyword_ids].any()
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+def test_remove_only_compacts_flat_code_indexes(index_type, chunks):
+    hybrid = build(index_type, chunks)
+    hybrid.delete_documents(['doc0'])
+    physical = index_type in ('flat', 'sq8', 'sq_fp16')
+    assert hybrid.vector_search.index.ntotal == len(chunks) - (5 if physical else 0)
+
+
+def search_rows(hybrid, queries, k=5):
+    return [
+        [chunk['chunk_id'] for chunk, _ in results]
+        for results in hybrid.search_batch(queries, k=k)
+    ]
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+def test_save_load_round_trip(index_type, chunks, tmp_path):
+    hybrid = build(index_type, chunks)
+    hybrid.save(str(tmp_path))
+    loaded = HybridSearch(index_type=index_type)
+    loaded.load(str(tmp_path), verify_checksums=True)
+
+    assert loaded.vector_search.index_type == index_type
+    assert len(loaded.chunks) == len(chunks)
+    assert loaded.chunks[7] == chunks[7]
+    queries = [chunks[row]['content'] for row in range(0, 500, 50)]
+    assert search_rows(loaded, queries) == search_rows(hybrid, queries)
+    assert loaded.index_id == hybrid.index_id
+
+
+def test_incremental_save_writes_only_the_changes(chunks, tmp_path):
+    hybrid = build('flat', chunks[:400])
+    hybrid.save(str(tmp_path))
+
+    hybrid = HybridSearch()
+    hybrid.load(str(tmp_path))
+    main_files = ['bm25_post_docs.npy', 'chunk_store/text.bin', 'chunk_store/col_doc.npy']
+    before = {name: (tmp_path / name).stat().st_mtime_ns for name in main_files}
+    hybrid.update_documents([dict(chunk, doc_id='doc3') for chunk in chunks[400:405]])
+    hybrid.add_documents(chunks[405:420])
+    hybrid.delete_documents(['doc5'])
+    hybrid.save(str(tmp_path))
+
+    assert {name: (tmp_path / name).stat().st_mtime_ns for name in main_files} == before
+    assert (tmp_path / 'chunk_store' / 'segments' / '000000').is_dir()
+    assert len(np.load(tmp_path / 'bm25_delta_rows.npy')) == 20
+
+    loaded = HybridSearch()
+    loaded.load(str(tmp_path), verify_checksums=True)
+    assert len(loaded.chunks) == 420
+    assert loaded.chunks[410]['content'] == chunks[410]['content']
+    assert loaded.keyword_search.delta_size == 20
+    expected = np.array([chunk['doc_id'] == 'doc3' for chunk in loaded.chunks]) & ~loaded.deleted
+    assert (loaded._row_filter({'doc_id': 'doc3'}).mask == expected).all()
+    assert loaded.delete_documents(['doc3']) == 5
+    queries = [chunks[row]['content'] for row in (410, 419)]
+    for query in queries:
+        assert any(chunk['content'] == query for chunk, _ in loaded.search(query, k=5))
+    assert all(chunk['doc_id'] != 'doc5' for chunk, _ in loaded.search(chunks[25]['content'], k=10))
+
+    loaded.save(str(tmp_path), merge=True)
+    assert not (tmp_path / 'chunk_store' / 'segments').exists()
+    assert not (tmp_path / 'bm25_delta_rows.npy').exists()
+    merged = HybridSearch()
+    merged.load(str(tmp_path), verify_checksums=True)
+    assert merged.keyword_search.delta_size == 0
+    assert len(merged.chunks) == 420
+    assert merged.chunks[419]['content'] == chunks[419]['content']
+    for query in queries:
+        assert any(chunk['content'] == query for chunk, _ in merged.search(query, k=5))
@@ -0,0 +1,93 @@
+import json
+import pytest
+
+from ingestion.records import ChunkMetadata, ChunkRecord, to_plain
+
+
+def chunk_dict(chunk_id='doc1_chunk_2', doc_id='doc1', chunk_index=2) -> dict:
+    return {
+        'chunk_id': chunk_id,
+        'doc_id': doc_id,
+        'doc_title': 'Title 1',
+        'chunk_index': chunk_index,
+        'content': 'some chunk text',
+        'metadata': {'total_chunks': 5, 'char_count': 15, 'word_count': 3}
+    }
+
+
+def test_record_equals_its_dict_and_round_trips():
+    chunk = chunk_dict()
+    record = ChunkRecord.from_dict(chunk)
+    assert isinstance(record, ChunkRecord)
+    assert record == chunk and chunk == record
+    assert record != dict(chunk, content='other text')
+    assert dict(record) == chunk
+    assert list(record) == list(chunk) and len(record) == len(chunk)
+    assert record['metadata']['word_count'] == 3 and record.get('missing') is None
+    assert 'content' in record and 'missing' not in record
+
+    plain = to_plain(record)
+    assert type(plain) is dict and type(plain['metadata']) is dict
+    assert json.loads(json.dumps(plain)) == chunk
+    assert ChunkRecord.from_dict(json.loads(json.dumps(plain))) == record
+
+
+def test_non_standard_chunks_are_left_as_dicts():
+    extra_field = dict(chunk_dict(), source='arxiv')
+    extra_metadata = dict(chunk_dict(), metadata={'total_chunks': 5, 'page': 3})
+    assert ChunkRecord.from_dict(extra_field) is extra_field
+    assert ChunkRecord.from_dict(extra_metadata) is extra_metadata
+    assert to_plain(extra_field) == extra_field
+
+
+def test_assignment_to_existing_keys_only():
+    record = ChunkRecord.from_dict(chunk_dict())
+    record['content'] = 'new text'
+    record['metadata'] = {'total_chunks': 1, 'char_count': 8, 'word_count': 2}
+    assert record['content'] == 'new text'
+    assert to_plain(record)['metadata'] == {'total_chunks': 1, 'char_count': 8, 'word_count': 2}
+
+    with pytest.raises(KeyError):
+        record['source'] = 'arxiv'
+    with pytest.raises(KeyError):
+        record['source']
+    with pytest.raises(AttributeError):
+        record.source = 'arxiv'
+    with pytest.raises(TypeError):
+        ChunkMetadata(5, 15, 3)['word_count'] = 4
+
+
+def test_derived_chunk_ids_are_not_stored():
+    record = ChunkRecord.from_dict(chunk_dict())
+    assert record._chunk_id is None
+    assert record['chunk_id'] == 'doc1_chunk_2'
+
+    # Like a dict, changing the fields an id derives from leaves the id alone
+    record['doc_id'] = 'doc9'
+    record['chunk_index'] = 0
+    assert record['chunk_id'] == 'doc1_chunk_2'
+
+    record['chunk_id'] = 'doc9_chunk_0'
+    assert record._chunk_id is None and record['chunk_id'] == 'doc9_chunk_0'
+
+
+def test_chunk_ids_that_deviate_from_the_pattern_are_kept():
+    record = ChunkRecord.from_dict(chunk_dict(chunk_id='custom-id'))
+    assert record['chunk_id'] == 'custom-id'
+    assert record == chunk_dict(chunk_id='custom-id')
+
+    record['chunk_index'] = 7
+    assert record['chunk_id'] == 'custom-id'
+    assert to_plain(record)['chunk_id'] == 'custom-id'
+
+    # Non-string doc ids are kept as they are, and still derive ids
+    numeric = ChunkRecord(None, 17, 'Title', 0, 'text', ChunkMetadata(1, 4, 1))
+    assert numeric['doc_id'] == 17 and numeric['chunk_id'] == '17_chunk_0'
+
+
+def test_doc_ids_and_titles_are_shared_between_chunks():
+    # Strings built at runtime, as the loader does, are distinct objects until interned
+    first = ChunkRecord.from_dict(dict(chunk_dict(), doc_id=''.join(['doc', '1']), doc_title=' '.join(['Title', '1'])))
+    second = ChunkRecord.from_dict(dict(chunk_dict(), doc_id=''.join(['doc', '1']), doc_title=' '.join(['Title', '1'])))
+    assert first.doc_id is second.doc_id
+    assert first.doc_title is second.doc_title
@@ -0,0 +1,77 @@
+import asyncio
+
+from api.cache import InMemoryRedis, ResponseCache, create_response_cache
+
+BODY = {'answer': 'Attention weighs tokens.', 'sources': [], 'metadata': {'latency_ms': 900.0}}
+
+
+def key(cache, question='What is attention?', index_token='idx:0', **options):
+    return cache.key(question, 5, 'claude-3', index_token, options=options)
+
+
+def test_local_hit_after_set():
+    async def run():
+        cache = ResponseCache(InMemoryRedis())
+        cache_key = key(cache)
+        assert await cache.get(cache_key) == (None, None)
+        await cache.set(cache_key, BODY)
+        return await cache.get(cache_key), cache.stats()
+
+    (value, tier), stats = asyncio.run(run())
+    assert (value, tier) == (BODY, 'local')
+    assert stats['local_hits'] == 1 and stats['misses'] == 1 and stats['hit_rate'] == 0.5
+
+
+def test_redis_hit_is_shared_between_workers():
+    async def run():
+        redis = InMemoryRedis()
+        first, second = ResponseCache(redis), ResponseCache(redis)
+        await first.set(key(first), BODY)
+        return await second.get(key(second)), await second.get(key(second))
+
+    (value, tier), (_, next_tier) = asyncio.run(run())
+    assert value == BODY and tier == 'redis'
+    assert next_tier == 'local'
+
+
+def test_key_ignores_case_and_spacing_but_not_options():
+    cache = ResponseCache()
+    assert key(cache, '  what IS   attention? ') == key(cache)
+    assert key(cache, filters={'doc_id': 'a'}) != key(cache)
+    assert key(cache, ef_search=128) != key(cache)
+
+
+def test_index_change_drops_local_entries():
+    cache = ResponseCache(None)
+    old_key = key(cache)
+    asyncio.run(cache.set(old_key, BODY))
+    assert key(cache, index_token='idx:1') != old_key
+    assert cache.stats()['local_size'] == 0
+    assert asyncio.run(cache.get(old_key)) == (None, None)
+
+
+class BrokenRedis(InMemoryRedis):
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+def test_unavailable_redis_falls_back_to_local_tier():
+    async def run():
+        cache = ResponseCache(BrokenRedis())
+        await cache.set(key(cache), BODY)
+        hit = await cache.get(key(cache))
+        miss = await cache.get(key(cache, 'another question'))
+        return hit, miss, cache.stats()
+
+    hit, miss, stats = asyncio.run(run())
+    assert hit == (BODY, 'local')
+    assert miss == (None, None)
+    assert stats['redis'] is False
+
+
+def test_create_response_cache_backends():
+    assert create_response_cache(None).redis is None
+    assert isinstance(create_response_cache('memory').redis, InMemoryRedis)
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from api.scheduler import RetrievalBatcher
+
+
+class FakeVectorSearch:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def encode_queries(self, queries):
+        self.engine.record('encode', queries)
+        return np.array([[len(q)] for q in queries], dtype=np.float32)
+
+
+class FakeEngine:
+    """Records every batched call; each result echoes its question so callers can be matched"""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.vector_search = FakeVectorSearch(self)
+        self._lock = threading.Lock()
+
+    def record(self, operation, items, **params):
+        with self._lock:
+            self.calls.append((operation, list(items), params))
+
+    def search_batch_with_timings(self, queries, k, ef_search=None, nprobe=None, filters=None):
+        self.record('search', queries, k=k, filters=filters)
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [[({'content': q}, 1.0)] for q in queries], {'total_ms': 1.0}
+
+
+def run_with_batcher(engine, scenario, **options):
+    async def run():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            batcher = RetrievalBatcher(engine, executor, **options)
+            # A waiter left unresolved by a broken batch fails the test instead of hanging it
+            return await asyncio.wait_for(scenario(batcher), timeout=5), batcher.stats()
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_fill_batches_up_to_max_batch():
+    engine = FakeEngine(delay=0.05)
+
+    async def scenario(batcher):
+        return await asyncio.gather(*[batcher.search(f"q{i}", k=5) for i in range(10)])
+
+    results, stats = run_with_batcher(engine, scenario, max_batch=4, window_ms=20)
+    assert [len(items) for _, items, _ in engine.calls] == [4, 4, 2]
+    for i, (result, timings) in enumerate(results):
+        assert result == [({'content': f"q{i}"}, 1.0)]
+        assert timings['batch_size'] == (2 if i >= 8 else 4)
+    assert stats['requests'] == 10 and stats['batches'] == 3 and stats['in_flight'] == 0
+
+
+def test_idle_requests_dispatch_without_waiting_out_the_window():
+    engine = FakeEngine()
+
+    async def scenario(batcher):
+        start = time.perf_counter()
+        await batcher.search("q", k=5)
+        return time.perf_counter() - start
+
+    elapsed, stats = run_with_batcher(engine, scenario, window_ms=1000)
+    assert elapsed < 0.5
+    assert stats['batches'] == 1
+
+
+def test_queue_behind_a_running_batch_waits_at_most_the_window():
+    engine = FakeEngine(delay=0.5)
+    dispatched = []
+
+    async def scenario(batcher):
+        loop = asyncio.get_running_loop()
+        batcher.on_batch = lambda operation, size: dispatched.append((loop.time(), size))
+        first = asyncio.ensure_future(batcher.search("slow", k=5))
+        await asyncio.sleep(0.01)
+        queued_at = loop.time()
+        late = [asyncio.ensure_future(batcher.search(f"q{i}", k=5)) for i in range(3)]
+        await asyncio.gather(first, *late)
+        return queued_at
+
+    queued_at, _ = run_with_batcher(engine, scenario, window_ms=50)
+    assert [size for _, size in dispatched] == [1, 3]
+    # Dispatched by the 50 ms window, not when the 500 ms batch ahead of it finished
+    waited = dispatched[1][0] - queued_at
+    assert 0.04 <= waited < 0.3
+
+
+def test_requests_with_different_parameters_are_not_batched_together():
+    engine = FakeEngine(delay=0.05)
+
+    async def scenario(batcher):
+        return await asyncio.gather(
+            batcher.search("a", k=5),
+            batcher.search("b", k=10),
+            batcher.search("c", k=5, filters={'doc_id': 'doc1'}),
+            batcher.search("d", k=5, filters={'doc_id': 'doc2'}),
+            batcher.search("e", k=5),
+            # Same filter written in another key order is the same batch
+            batcher.search("f", k=5, filters={'doc_id': 'doc1', 'chunk_index': 0}),
+            batcher.search("g", k=5, filters={'chunk_index': 0, 'doc_id': 'doc1'}),
+            batcher.encode("h")
+        )
+
+    results, _ = run_with_batcher(engine, scenario, max_batch=32)
+    batches = sorted((sorted(items), params.get('k'), params.get('filters')) for _, items, params in engine.calls)
+    assert batches == [
+        (['a', 'e'], 5, None),
+        (['b'], 10, None),
+        (['c'], 5, {'doc_id': 'doc1'}),
+        (['d'], 5, {'doc_id': 'doc2'}),
+        (['f', 'g'], 5, {'chunk_index': 0, 'doc_id': 'doc1'}),
+        (['h'], None, None)
+    ]
+    assert [result[0][0]['content'] for result, _ in results[:7]] == list('abcdefg')
+    assert results[7][0] == 1.0
+
+
+def test_cancelled_waiter_does_not_break_its_batch():
+    engine = FakeEngine(delay=0.2)
+
+    async def scenario(batcher):
+        waiters = [asyncio.ensure_future(batcher.search(f"q{i}", k=5)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        waiters[1].cancel()
+        first, cancelled, last = await asyncio.gather(*waiters, return_exceptions=True)
+        # The batcher keeps serving afterwards
+        again = await batcher.search("again", k=5)
+        return first, cancelled, last, again
+
+    (first, cancelled, last, again), stats = run_with_batcher(engine, scenario)
+    assert [len(items) for _, items, _ in engine.calls] == [3, 1]
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert first[0] == [({'content': 'q0'}, 1.0)]
+    assert last[0] == [({'content': 'q2'}, 1.0)]
+    assert again[0] == [({'content': 'again'}, 1.0)]
+    assert stats['in_flight'] == 0
+
+
+def test_batch_error_reaches_every_waiter():
+    engine = FakeEngine(error=RuntimeError("index unavailable"))
+
+    async def scenario(batcher):
+        return await asyncio.gather(*[batcher.search(f"q{i}", k=5) for i in range(3)], return_exceptions=True)
+
+    results, stats = run_with_batcher(engine, scenario)
+    assert len(engine.calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert stats['in_flight'] == 0
+
+
+def test_max_batch_must_be_positive():
+    with pytest.raises(ValueError):
+        RetrievalBatcher(FakeEngine(), executor=None, max_batch=0)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from api.semantic_cache import SemanticAnswerCache
+from conftest import HashingEncoder
+
+SCOPE = '{"top_k": 5}'
+TOKEN = 'idx:0'
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def with_similarity(base, similarity):
+    """A unit vector at the given cosine similarity to base"""
+    other = np.zeros_like(base)
+    other[np.argmin(np.abs(base))] = 1.0
+    other = unit(other - (other @ base) * base)
+    return unit(similarity * base + np.sqrt(1 - similarity ** 2) * other)
+
+
+@pytest.fixture
+def base():
+    return unit(np.random.default_rng(0).normal(size=32))
+
+
+def test_paraphrase_hits_cached_answer(base):
+    cache = SemanticAnswerCache(dimension=32, threshold=0.9)
+    cache.add(base, SCOPE, TOKEN, {'answer': 'cached'})
+
+    response, similarity, result = cache.lookup(with_similarity(base, 0.95), SCOPE, TOKEN)
+    assert result == 'hit' and response == {'answer': 'cached'}
+    assert similarity == pytest.approx(0.95, abs=1e-4)
+
+    _, similarity, result = cache.lookup(with_similarity(base, 0.87), SCOPE, TOKEN)
+    assert result == 'near_miss' and similarity == pytest.approx(0.87, abs=1e-4)
+    assert cache.lookup(with_similarity(base, 0.5), SCOPE, TOKEN)[2] == 'miss'
+    assert cache.stats()['hits'] == 1 and cache.stats()['near_misses'] == 1
+
+
+def test_hashed_question_embeddings():
+    encoder = HashingEncoder()
+    question, reworded = encoder.encode(['what is multi head attention', 'attention multi head is what'])
+    cache = SemanticAnswerCache(dimension=32)
+    cache.add(question, SCOPE, TOKEN, {'answer': 'cached'})
+    assert cache.lookup(reworded, SCOPE, TOKEN)[2] == 'hit'
+
+
+def test_scope_and_index_changes_miss(base):
+    cache = SemanticAnswerCache(dimension=32)
+    cache.add(base, SCOPE, TOKEN, {'answer': 'cached'})
+    assert cache.lookup(base, '{"top_k": 10}', TOKEN) == (None, None, 'miss')
+    assert cache.lookup(base, SCOPE, TOKEN)[2] == 'hit'
+    assert cache.lookup(base, SCOPE, 'idx:1') == (None, None, 'miss')
+    # Entries for the old index are gone, not just hidden
+    assert cache.lookup(base, SCOPE, TOKEN) == (None, None, 'miss')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(dimension=32, max_entries=2)
+    vectors = np.eye(32, dtype=np.float32)[:3]
+    cache.add(vectors[0], SCOPE, TOKEN, {'answer': 0})
+    cache.add(vectors[1], SCOPE, TOKEN, {'answer': 1})
+    assert cache.lookup(vectors[0], SCOPE, TOKEN)[2] == 'hit'
+    cache.add(vectors[2], SCOPE, TOKEN, {'answer': 2})
+
+    assert cache.lookup(vectors[1], SCOPE, TOKEN)[0] is None
+    assert cache.lookup(vectors[0], SCOPE, TOKEN)[0] == {'answer': 0}
+    assert cache.lookup(vectors[2], SCOPE, TOKEN)[0] == {'answer': 2}
+    assert cache.stats()['size'] == 2
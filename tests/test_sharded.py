@@ -0,0 +1,111 @@
+import os
+import signal
+import numpy as np
+import pytest
+
+from conftest import HashingEncoder, make_chunks
+from retrieval.hybrid import HybridSearch
+from retrieval.keyword_search import KeywordSearch
+from retrieval.sharded import ShardedSearch, build_shards, shard_of
+
+NUM_SHARDS = 3
+FILTERS = {'chunk_index': {'range': [1, 2]}, 'doc_id': {'nin': ['doc1', 'doc2', 'doc3']}}
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return make_chunks(num_docs=60)
+
+
+@pytest.fixture(scope='module')
+def queries(corpus):
+    # Chunk texts, plus short queries that tie on BM25 and spread over many chunks
+    return [corpus[row]['content'] for row in range(0, len(corpus), 23)] + ['w3 w7', 'w1 w40 w90', 'w250']
+
+
+@pytest.fixture(scope='module')
+def indexes(corpus, tmp_path_factory):
+    """Sharded (local worker processes) and unsharded indexes over the same chunks"""
+    import retrieval.vector_search as vector_search
+    path = tmp_path_factory.mktemp('shards')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(vector_search, 'SentenceTransformer', HashingEncoder)
+        build_shards(corpus, str(path), NUM_SHARDS)
+        single = HybridSearch()
+        single.build_index(corpus)
+        sharded = ShardedSearch()
+        sharded.load(str(path))
+    yield path, single, sharded
+    sharded.close()
+
+
+def assert_same_results(got, want):
+    """Same ids best first and same scores; chunks tied at the cut-off may be swapped"""
+    got_scores, want_scores = [s for _, s in got], [s for _, s in want]
+    np.testing.assert_allclose(got_scores, want_scores, rtol=1e-5)
+    cutoff = want_scores[-1] if want_scores else None
+    untied = lambda results: [c['chunk_id'] for c, s in results if not np.isclose(s, cutoff, rtol=1e-5)]
+    assert untied(got) == untied(want)
+
+
+def test_shards_partition_by_document(corpus, indexes):
+    path, _, sharded = indexes
+    assert len(sharded.chunks) == len(corpus)
+    for shard, store in enumerate(sharded.chunks.stores):
+        assert len(store) > 0
+        assert all(shard_of(chunk['doc_id'], NUM_SHARDS) == shard for chunk in store)
+
+
+@pytest.mark.parametrize('filters', [None, FILTERS])
+def test_sharded_top_k_matches_single_index(indexes, queries, filters):
+    _, single, sharded = indexes
+    expected = single.search_batch(queries, k=10, filters=filters)
+    results, timings = sharded.search_batch_with_timings(queries, k=10, filters=filters)
+    assert timings['dropped_shards'] == []
+
+    for want, got in zip(expected, results):
+        assert len(got) == 10
+        assert_same_results(got, want)
+        if filters:
+            assert all(1 <= chunk['chunk_index'] <= 2 for chunk, _ in got)
+            assert not {chunk['doc_id'] for chunk, _ in got} & {'doc1', 'doc2', 'doc3'}
+
+
+def test_shard_bm25_scores_use_global_corpus_stats(indexes, queries):
+    # Each shard's own BM25 scores equal the unsharded scores for the same chunks
+    path, single, _ = indexes
+    expected = [
+        {single.chunks[int(row)]['chunk_id']: score for row, score in zip(ids, scores)}
+        for ids, scores in single.keyword_search.search_ids_batch(queries, k=len(single.chunks))
+    ]
+    compared = 0
+    for shard in range(NUM_SHARDS):
+        keyword = KeywordSearch()
+        keyword.load(str(path / f'shard_{shard}'))
+        for want, (ids, scores) in zip(expected, keyword.search_ids_batch(queries, k=20)):
+            compared += len(ids)
+            got = {keyword.chunks[int(row)]['chunk_id']: score for row, score in zip(ids, scores)}
+            assert got == pytest.approx({chunk_id: want[chunk_id] for chunk_id in got}, rel=1e-5)
+    assert compared > len(queries) * NUM_SHARDS
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGSTOP'), reason="needs POSIX job control signals")
+def test_shard_missing_the_deadline_is_dropped(indexes, queries):
+    _, _, sharded = indexes
+    stalled = 1
+    sharded.deadline = 0.5
+    os.kill(sharded._processes[stalled].pid, signal.SIGSTOP)
+    try:
+        results, timings = sharded.search_batch_with_timings(queries[:2], k=10)
+    finally:
+        os.kill(sharded._processes[stalled].pid, signal.SIGCONT)
+        sharded.deadline = None
+
+    assert timings['dropped_shards'] == [stalled]
+    for result in results:
+        assert len(result) > 0
+        assert all(shard_of(chunk['doc_id'], NUM_SHARDS) != stalled for chunk, _ in result)
+
+    # The stalled shard's late answer is discarded and it serves the next query
+    _, timings = sharded.search_batch_with_timings(queries[:2], k=10)
+    assert timings['dropped_shards'] == []
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from conftest import HashingEncoder
+from retrieval.hybrid import HybridSearch
+from retrieval.row_filter import RowFilter
+from retrieval.vector_search import INDEX_TYPES, VectorSearch
+
+# The test encoder has 32 dimensions, which the default pq_m doesn't divide
+INDEX_PARAMS = {'ivf_pq': {'pq_m': 8}}
+
+
+def build(index_type, chunks):
+    vector_search = VectorSearch(index_type=index_type, **INDEX_PARAMS.get(index_type, {}))
+    vector_search.build_index(chunks)
+    return vector_search
+
+
+def doc_mask(chunks, doc_ids):
+    return np.array([chunk['doc_id'] in doc_ids for chunk in chunks])
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+@pytest.mark.parametrize('num_docs', [60, 3])
+def test_filtered_search_returns_only_allowed_rows(index_type, num_docs, chunks):
+    # 60 of 120 documents go through the FAISS ID selector, 3 through the exact path
+    vector_search = build(index_type, chunks)
+    mask = doc_mask(chunks, {f"doc{i}" for i in range(0, 2 * num_docs, 2)})
+    allowed = RowFilter(mask)
+    assert allowed.selective == (num_docs == 3)
+
+    queries = [chunks[row]['content'] for row in np.flatnonzero(mask)[:5]]
+    for ids, scores in vector_search.search_ids_batch(queries, k=10, allowed=allowed):
+        assert len(ids) > 0
+        assert mask[ids].all()
+        assert np.all(np.diff(scores) <= 1e-6)
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'sq8', 'sq_fp16'])
+def test_filtered_search_finds_the_query_chunk(index_type, chunks):
+    vector_search = build(index_type, chunks)
+    mask = doc_mask(chunks, {f"doc{i}" for i in range(0, 120, 2)})
+    rows = np.flatnonzero(mask)[:5]
+    results = vector_search.search_ids_batch([chunks[row]['content'] for row in rows], k=3, allowed=RowFilter(mask))
+    assert [ids[0] for ids, _ in results] == list(rows)
+
+
+@pytest.mark.parametrize('index_type', ['hnsw', 'ivf_flat', 'ivf_pq'])
+def test_search_knobs(index_type, chunks):
+    vector_search = build(index_type, chunks)
+    queries = [chunks[row]['content'] for row in range(0, 50, 10)]
+    knobs = {'ef_search': 128} if index_type == 'hnsw' else {'nprobe': 4}
+    for ids, _ in vector_search.search_ids_batch(queries, k=5, **knobs):
+        assert len(ids) == 5
+
+
+def test_ivf_with_every_list_probed_is_exact(chunks):
+    flat, ivf = build('flat', chunks), build('ivf_flat', chunks)
+    nlist = ivf._base_index().nlist
+    queries = [chunks[row]['content'] for row in range(0, 100, 7)]
+    exact = flat.search_ids_batch(queries, k=5)
+    probed = ivf.search_ids_batch(queries, k=5, nprobe=nlist)
+    for (exact_ids, exact_scores), (ids, scores) in zip(exact, probed):
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+def test_search_after_delete_skips_deleted_documents(index_type, chunks):
+    hybrid = HybridSearch(index_type=index_type, index_params=INDEX_PARAMS.get(index_type))
+    hybrid.build_index(chunks)
+    assert hybrid.delete_documents(['doc0', 'doc1']) == 10
+
+    query = chunks[0]['content']
+    for chunk, _ in hybrid.search(query, k=10):
+        assert chunk['doc_id'] not in ('doc0', 'doc1')
+    for ids, _ in hybrid.vector_search.search_ids_batch([query], k=10, allowed=hybrid._live_filter):
+        assert len(ids) == 10
+        assert not hybrid.deleted[ids].any()
+
+
+class CountingEncoder(HashingEncoder):
+    loads = 0
+
+    def __init__(self, model_name: str = 'hashing'):
+        super().__init__(model_name)
+        CountingEncoder.loads += 1
+
+
+class FakeOnnxEncoder(HashingEncoder):
+    """Records exports; load() only succeeds for a directory exported before"""
+    exported = set()
+    parity_cosine = 0.999
+
+    @classmethod
+    def from_sentence_transformer(cls, model, export_dir, parity_texts):
+        assert model is not None
+        cls.exported.add(str(export_dir))
+        return cls()
+
+    @classmethod
+    def load(cls, export_dir):
+        return cls() if str(export_dir) in cls.exported else None
+
+
+def test_onnx_backend_does_not_keep_the_torch_model(monkeypatch, tmp_path, chunks):
+    import retrieval.vector_search as vector_search
+    monkeypatch.setattr(vector_search, 'SentenceTransformer', CountingEncoder)
+    monkeypatch.setattr(vector_search, 'OnnxQueryEncoder', FakeOnnxEncoder)
+    CountingEncoder.loads = 0
+
+    # First start exports and parity-checks, then lets the PyTorch model go
+    exporting = VectorSearch(query_backend='onnx', onnx_dir=tmp_path)
+    assert CountingEncoder.loads == 1
+    assert exporting.model is None
+    assert isinstance(exporting.query_encoder, FakeOnnxEncoder)
+
+    # Later starts serve straight from the export
+    serving = VectorSearch(query_backend='onnx', onnx_dir=tmp_path)
+    assert CountingEncoder.loads == 1
+    assert serving.model is None and serving.dimension == 32
+    assert serving.encode_queries(["w1 w2"]).shape == (1, 32)
+
+    # Building still works, loading the model on demand
+    serving.build_index(chunks[:20])
+    assert CountingEncoder.loads == 2
+    assert serving.search_ids_batch([chunks[3]['content']], k=1)[0][0][0] == 3